@@ -0,0 +1,264 @@
+"""Re-announcing to every tracker tier for the life of a download."""
+
+from __future__ import annotations
+
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from peers import Peer
+from tracker import AnnounceResponse, Transfer, announce
+
+# A tier on which every tracker failed is tried again after this many seconds.
+RETRY_INTERVAL = 120.0
+# How often the swarm is asked whether it needs peers sooner than planned.
+POLL_INTERVAL = 30.0
+# The best-effort "stopped" announce sent on close gives up after this long.
+STOP_TIMEOUT = 5.0
+# A UDP tracker still silent after this long (the first two BEP 15 attempts)
+# is given up on for the next tracker in its tier. HTTP requests are already
+# bounded by tracker.TIMEOUT.
+UDP_TIMEOUT = 45.0
+
+Announce = Callable[..., AnnounceResponse]
+
+
+@dataclass
+class Tier:
+    """One announce-list tier: trackers tried in order until one answers."""
+
+    urls: List[str]
+    last: Optional[float] = None
+    interval: float = 0.0
+    min_interval: Optional[float] = None
+    # Set while an announce to the tier is outstanding.
+    busy: bool = False
+
+    def due(self, now: float, starving: bool) -> bool:
+        if self.busy:
+            return False
+        if self.last is None:
+            return True
+        elapsed = now - self.last
+        if elapsed >= self.interval:
+            return True
+        if not starving or self.min_interval is None:
+            return False
+        return elapsed >= self.min_interval
+
+    def next_due(self) -> float:
+        if self.busy:
+            return math.inf
+        return 0.0 if self.last is None else self.last + self.interval
+
+
+class Announcer:
+    """Announces to every tier concurrently and keeps doing so on schedule.
+
+    Within a tier trackers are tried in order and the first to answer moves
+    to the front (BEP 12); tiers themselves are all queried, and their peers
+    merged, since each may know a different part of the swarm. The download
+    starts with the first tier to return peers; the rest report through
+    ``on_peers`` when they answer. A tier is announced to again after its
+    tracker's ``interval``, or after ``min interval`` while the swarm
+    reports it is starving for peers.
+    """
+
+    def __init__(
+        self,
+        tiers: Sequence[Sequence[str]],
+        info_hash: bytes,
+        peer_id: bytes,
+        port: int,
+        announce: Announce = announce,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.tiers: List[Tier] = []
+        for urls in tiers:
+            shuffled = list(urls)
+            random.shuffle(shuffled)
+            self.tiers.append(Tier(shuffled))
+        self.info_hash = info_hash
+        self.peer_id = peer_id
+        self.port = port
+        self.announce = announce
+        self.clock = clock
+        self._stats: Callable[[], Transfer] = Transfer
+        self._lock = threading.Lock()
+        self._event = ""
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Initial announces still outstanding when announce_all() returned.
+        self._late: List[Future[Optional[List[Peer]]]] = []
+
+    def _announce_tier(
+        self, tier: Tier, transfer: Transfer, event: str, timeout: Optional[float]
+    ) -> Optional[List[Peer]]:
+        tier.last = self.clock()
+        tier.busy = True
+        try:
+            return self._try_trackers(tier, transfer, event, timeout)
+        finally:
+            tier.busy = False
+
+    def _try_trackers(
+        self, tier: Tier, transfer: Transfer, event: str, timeout: Optional[float]
+    ) -> Optional[List[Peer]]:
+        for url in list(tier.urls):
+            if self._stop.is_set() and event != "stopped":
+                return None
+            bound = timeout
+            if bound is None and url.startswith("udp://"):
+                bound = UDP_TIMEOUT
+            try:
+                res = self.announce(
+                    url,
+                    self.info_hash,
+                    self.peer_id,
+                    self.port,
+                    transfer,
+                    event,
+                    bound,
+                )
+            except (OSError, ValueError) as exc:
+                logging.warning("Announce to %s failed: %s", url, exc)
+                continue
+            tier.urls.remove(url)
+            tier.urls.insert(0, url)
+            tier.interval = res.interval
+            tier.min_interval = res.min_interval
+            logging.info("Tracker %s returned %d peers", url, len(res.peers))
+            return res.peers
+        tier.interval = RETRY_INTERVAL
+        tier.min_interval = None
+        return None
+
+    def announce_tiers(
+        self,
+        tiers: Sequence[Tier],
+        transfer: Transfer,
+        event: str = "",
+        timeout: Optional[float] = None,
+    ) -> Optional[List[Peer]]:
+        """Announce to *tiers* at once; returns their merged peers, or None
+        if no tracker answered."""
+        if not tiers:
+            return []
+        with ThreadPoolExecutor(max_workers=len(tiers)) as pool:
+            results = list(
+                pool.map(
+                    lambda tier: self._announce_tier(tier, transfer, event, timeout),
+                    tiers,
+                )
+            )
+        if all(peers is None for peers in results):
+            return None
+        merged: Dict[Peer, None] = {}
+        for peers in results:
+            merged.update(dict.fromkeys(peers or ()))
+        return list(merged)
+
+    def _announce_detached(
+        self, tier: Tier, transfer: Transfer, event: str
+    ) -> Future[Optional[List[Peer]]]:
+        """Announce to *tier* on a daemon thread, which unlike an executor's
+        threads does not hold up interpreter exit while a tracker is silent."""
+        future: Future[Optional[List[Peer]]] = Future()
+
+        def run() -> None:
+            try:
+                future.set_result(self._announce_tier(tier, transfer, event, None))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def announce_all(self, transfer: Transfer) -> List[Peer]:
+        """Send the initial ``started`` announce to every tier.
+
+        Returns the peers of the first tier that has some, without waiting
+        for slower tiers; their peers go to ``on_peers`` once :meth:`start`
+        is called.
+        """
+        if not self.tiers:
+            return []
+        futures = [
+            self._announce_detached(tier, transfer, "started") for tier in self.tiers
+        ]
+        answered = False
+        for future in as_completed(futures):
+            peers = future.result()
+            answered = answered or peers is not None
+            if peers:
+                self._late = [f for f in futures if f is not future]
+                return peers
+        if not answered:
+            raise ValueError("No tracker answered the announce")
+        return []
+
+    def start(
+        self,
+        stats: Callable[[], Transfer],
+        on_peers: Callable[[List[Peer]], None],
+        needs_peers: Callable[[], bool] = lambda: False,
+    ) -> "Announcer":
+        """Re-announce in the background, passing new peer lists to *on_peers*."""
+        self._stats = stats
+        late, self._late = self._late, []
+        for future in late:
+            future.add_done_callback(lambda f: self._deliver(f, on_peers))
+        self._thread = threading.Thread(
+            target=self._run, args=(on_peers, needs_peers), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _deliver(
+        self,
+        future: Future[Optional[List[Peer]]],
+        on_peers: Callable[[List[Peer]], None],
+    ) -> None:
+        peers = future.result()
+        if peers and not self._stop.is_set():
+            on_peers(peers)
+
+    def _run(
+        self, on_peers: Callable[[List[Peer]], None], needs_peers: Callable[[], bool]
+    ) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                event, self._event = self._event, ""
+            now = self.clock()
+            starving = needs_peers()
+            due = [t for t in self.tiers if event or t.due(now, starving)]
+            if due:
+                peers = self.announce_tiers(due, self._stats(), event)
+                if peers:
+                    on_peers(peers)
+            now = self.clock()
+            wait = min((t.next_due() for t in self.tiers), default=now) - now
+            self._wake.wait(min(max(wait, 0.0), POLL_INTERVAL))
+            self._wake.clear()
+
+    def completed(self) -> None:
+        """Tell every tier the download finished, right away."""
+        with self._lock:
+            self._event = "completed"
+        self._wake.set()
+
+    def close(self) -> None:
+        """Stop re-announcing and send a best-effort ``stopped``."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        self.announce_tiers(self.tiers, self._stats(), "stopped", STOP_TIMEOUT)
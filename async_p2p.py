@@ -0,0 +1,547 @@
+"""asyncio download engine driving every peer from a single thread."""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import struct
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from bitfield import BitField
+from choker import Choker
+from connections import ConnectionManager
+from handshake import Handshake
+from hasher import HashPool
+from listener import HANDSHAKE_TIMEOUT, LISTEN_BACKLOG
+from message import (
+    BLOCK_FRAME,
+    Message,
+    MessageID,
+    max_frame_length,
+    pack_block_frames,
+    serialize_have,
+    serialize_keep_alive,
+)
+from p2p import (
+    PeerScheduler,
+    PieceBuffers,
+    PieceProgress,
+    PieceResult,
+    Torrent,
+    log_hash_stats,
+    rechoke,
+)
+from peers import Peer
+from picker import PiecePicker
+from resume import ResumeJournal
+from storage import FileRange, Storage
+from tracker import Transfer
+from upload import PieceServer, piece_header
+from wire import MAX_FRAME_LENGTH
+
+
+async def read_message(
+    reader: asyncio.StreamReader, max_length: int = MAX_FRAME_LENGTH
+) -> Optional[Message]:
+    length_raw = await reader.readexactly(4)
+    (length,) = struct.unpack(">I", length_raw)
+    if length == 0:
+        return None
+    if length > max_length:
+        raise ValueError(
+            f"Frame of {length} bytes exceeds the {max_length}-byte limit"
+        )
+    payload = await reader.readexactly(length)
+    return Message(msg_id=MessageID(payload[0]), payload=payload[1:])
+
+
+async def read_handshake(reader: asyncio.StreamReader) -> Handshake:
+    length_raw = await reader.readexactly(1)
+    if length_raw[0] == 0:
+        raise ValueError("pstrlen cannot be 0")
+    payload = await reader.readexactly(48 + length_raw[0])
+    return Handshake.read(io.BytesIO(length_raw + payload))
+
+
+@dataclass
+class AsyncClient:
+    """Stream-backed counterpart of :class:`client.Client`."""
+
+    peer: Peer
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    bitfield: BitField
+    choked: bool = True
+    # Set once the peer sent a piece that failed verification.
+    corrupt: bool = False
+    # Longest frame the peer may send; see message.max_frame_length.
+    max_frame: int = MAX_FRAME_LENGTH
+    # A first message that was not a BITFIELD, returned by the next read().
+    pending: Optional[Message] = None
+
+    @classmethod
+    async def connect(
+        cls,
+        peer: Peer,
+        peer_id: bytes,
+        info_hash: bytes,
+        have: Optional[BitField] = None,
+        num_pieces: int = 0,
+    ) -> "AsyncClient":
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(*peer.address()), timeout=3
+        )
+        try:
+            writer.write(Handshake.create(info_hash, peer_id).serialize())
+            res = await asyncio.wait_for(read_handshake(reader), timeout=3)
+            if res.info_hash != info_hash:
+                raise ValueError("Peer info hash mismatch")
+            return await cls._exchange_bitfields(
+                peer, reader, writer, have, num_pieces
+            )
+        except BaseException:
+            writer.close()
+            raise
+
+    @classmethod
+    async def accept(
+        cls,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        peer_id: bytes,
+        info_hash: bytes,
+        have: Optional[BitField] = None,
+        num_pieces: int = 0,
+    ) -> "AsyncClient":
+        """Answer the handshake of a peer that dialed us."""
+        host, port = writer.get_extra_info("peername")[:2]
+        try:
+            res = await asyncio.wait_for(read_handshake(reader), HANDSHAKE_TIMEOUT)
+            if res.info_hash != info_hash:
+                raise ValueError("Peer info hash mismatch")
+            if res.peer_id == peer_id:
+                raise ValueError("Connected to ourselves")
+            writer.write(Handshake.create(info_hash, peer_id).serialize())
+            return await cls._exchange_bitfields(
+                Peer(host, port), reader, writer, have, num_pieces
+            )
+        except BaseException:
+            writer.close()
+            raise
+
+    @classmethod
+    async def _exchange_bitfields(
+        cls,
+        peer: Peer,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        have: Optional[BitField],
+        num_pieces: int,
+    ) -> "AsyncClient":
+        """Swap bitfields; a peer with no pieces may skip its own (BEP 3)."""
+        if have is not None:
+            writer.write(Message(MessageID.BITFIELD, have.raw()).serialize())
+        max_frame = max_frame_length(num_pieces)
+        msg = await asyncio.wait_for(read_message(reader, max_frame), timeout=5)
+        if msg is not None and msg.msg_id == MessageID.BITFIELD:
+            return cls(
+                peer=peer,
+                reader=reader,
+                writer=writer,
+                bitfield=BitField.from_bytes(msg.payload),
+                max_frame=max_frame,
+            )
+        return cls(
+            peer=peer,
+            reader=reader,
+            writer=writer,
+            bitfield=BitField(bytearray((num_pieces + 7) // 8)),
+            max_frame=max_frame,
+            pending=msg,
+        )
+
+    async def read(self) -> Optional[Message]:
+        if self.pending is not None:
+            msg, self.pending = self.pending, None
+            return msg
+        return await read_message(self.reader, self.max_frame)
+
+    def send(self, msg: Message) -> None:
+        self.writer.write(msg.serialize())
+
+    def send_choke(self) -> None:
+        self.send(Message(MessageID.CHOKE))
+
+    def send_unchoke(self) -> None:
+        self.send(Message(MessageID.UNCHOKE))
+
+    def send_requests(
+        self,
+        requests: Sequence[Tuple[int, int, int]],
+        cancels: Sequence[Tuple[int, int, int]] = (),
+    ) -> None:
+        """Queue CANCEL then REQUEST frames as a single transport write."""
+        buf = bytearray(BLOCK_FRAME.size * (len(requests) + len(cancels)))
+        if not buf:
+            return
+        offset = pack_block_frames(buf, 0, MessageID.CANCEL, cancels)
+        pack_block_frames(buf, offset, MessageID.REQUEST, requests)
+        self.writer.write(buf)
+
+    async def send_block(self, index: int, begin: int, ranges: List[FileRange]) -> None:
+        """Answer a REQUEST: queue the PIECE header, then sendfile the block."""
+        loop = asyncio.get_running_loop()
+        self.writer.write(piece_header(index, begin, sum(n for _, _, n in ranges)))
+        for fd, offset, count in ranges:
+            # loop.sendfile wants a file object; wrap the storage's descriptor
+            # without taking ownership of it.
+            with open(fd, "rb", buffering=0, closefd=False) as handle:
+                await loop.sendfile(self.writer.transport, handle, offset, count)
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+@dataclass
+class _Swarm:
+    """State shared by every peer session of one download."""
+
+    torrent: Torrent
+    picker: PiecePicker
+    hasher: HashPool
+    results: "asyncio.Queue[PieceResult | None]"
+    manager: ConnectionManager
+    server: PieceServer
+    buffers: Optional[PieceBuffers] = None
+    wakeups: Set[asyncio.Event] = field(default_factory=set)
+    verifying: Set["asyncio.Task[None]"] = field(default_factory=set)
+    schedulers: Dict[Peer, PeerScheduler] = field(default_factory=dict)
+    sessions: Set["asyncio.Task[None]"] = field(default_factory=set)
+
+    def have(self) -> Optional[BitField]:
+        return self.server.have if self.server.has_any() else None
+
+    def track(self, task: "asyncio.Task[None]") -> None:
+        self.sessions.add(task)
+        task.add_done_callback(self.sessions.discard)
+
+
+async def _finish_piece(
+    swarm: _Swarm, client: AsyncClient, progress: PieceProgress
+) -> None:
+    """Hash *progress* on the pool and publish it without stalling the session."""
+    ok = await asyncio.wrap_future(swarm.hasher.verify(progress.work, progress.buf))
+    if not ok:
+        logging.warning(
+            "Piece #%d from %s failed integrity check", progress.index, client.peer
+        )
+        swarm.picker.requeue(progress.work)
+        client.corrupt = True
+        # Dropping the connection ends the session at its next read.
+        client.writer.close()
+        return
+    if not swarm.picker.complete(progress.index):
+        return
+    await swarm.results.put(PieceResult(index=progress.index, data=progress.buf))
+
+
+async def _peer_session(swarm: _Swarm, peer: Peer) -> None:
+    """Dial a peer reserved with the connection manager and report back."""
+    torrent, manager = swarm.torrent, swarm.manager
+    try:
+        client = await AsyncClient.connect(
+            peer,
+            torrent.peer_id,
+            torrent.info_hash,
+            swarm.have(),
+            len(torrent.piece_hashes),
+        )
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+        logging.warning("Handshake with %s failed: %s", peer, exc)
+        manager.failed(peer)
+        return
+    except BaseException:
+        manager.failed(peer)
+        raise
+    logging.info("Connected to %s", peer)
+    manager.connected(peer)
+    downloaded = 0
+    try:
+        downloaded = await _run_session(swarm, client)
+    finally:
+        manager.closed(peer, downloaded)
+
+
+async def _dial_peers(
+    swarm: _Swarm, changed: asyncio.Event, more_peers: bool
+) -> None:
+    """Keep dialing candidates until the download is done.
+
+    Unless *more_peers* can still arrive (from a listener or announcer),
+    gives up once every candidate has failed for good and signals that on
+    the results queue.
+    """
+    torrent, picker, manager = swarm.torrent, swarm.picker, swarm.manager
+    while True:
+        # Once complete, a seed still reaches every peer once but no longer
+        # redials ones that left.
+        done = picker.done
+        if done and not (torrent.seed and manager.untried):
+            return
+        changed.clear()
+        peer = manager.next_dial(fresh_only=done)
+        if peer is not None:
+            swarm.track(asyncio.create_task(_peer_session(swarm, peer)))
+            continue
+        if manager.exhausted and not more_peers:
+            # Sessions are gone, so no new verifications can start.
+            await asyncio.gather(*swarm.verifying, return_exceptions=True)
+            await swarm.results.put(None)
+            return
+        retry = manager.next_retry()
+        try:
+            await asyncio.wait_for(changed.wait(), min(retry or 1.0, 1.0))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _accept_session(
+    swarm: _Swarm, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """asyncio.start_server callback for a peer that dialed us."""
+    torrent = swarm.torrent
+    swarm.track(asyncio.current_task())  # type: ignore[arg-type]
+    if not swarm.manager.accept():
+        logging.info(
+            "Rejecting %s: too many connections", writer.get_extra_info("peername")
+        )
+        writer.close()
+        return
+    try:
+        try:
+            client = await AsyncClient.accept(
+                reader,
+                writer,
+                torrent.peer_id,
+                torrent.info_hash,
+                swarm.have(),
+                len(torrent.piece_hashes),
+            )
+        except (
+            OSError,
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            ValueError,
+        ) as exc:
+            logging.warning(
+                "Inbound handshake from %s failed: %s",
+                writer.get_extra_info("peername"),
+                exc,
+            )
+            return
+        logging.info("Accepted %s", client.peer)
+        await _run_session(swarm, client)
+    except asyncio.CancelledError:
+        # Sessions still open are cancelled when the download ends; raising
+        # would make start_server's callback log it as an error.
+        pass
+    finally:
+        swarm.manager.release()
+
+
+async def _listen(swarm: _Swarm, port: int) -> Optional[asyncio.AbstractServer]:
+    try:
+        server = await asyncio.start_server(
+            partial(_accept_session, swarm), port=port, backlog=LISTEN_BACKLOG
+        )
+    except OSError as exc:
+        logging.warning("Cannot listen on port %d: %s", port, exc)
+        return None
+    logging.info("Listening for peers on port %d", port)
+    return server
+
+
+async def _run_session(swarm: _Swarm, client: AsyncClient) -> int:
+    """Exchange pieces with *client*; returns the bytes it gave us."""
+    torrent, picker, peer = swarm.torrent, swarm.picker, client.peer
+    wakeup = asyncio.Event()
+    swarm.wakeups.add(wakeup)
+    picker.add_peer(client.bitfield)
+    scheduler = PeerScheduler(
+        client, picker, torrent.new_pipeline(), swarm.buffers  # type: ignore[arg-type]
+    )
+    swarm.schedulers[peer] = scheduler
+    # Reads are never cancelled part-way, which would desynchronise the
+    # stream; a pending read carries over while we wait for other events.
+    reading: Optional["asyncio.Task[Optional[Message]]"] = None
+    try:
+        client.send(Message(MessageID.INTERESTED))
+        while True:
+            # Clear before picking so a change that lands in between is not lost.
+            wakeup.clear()
+            if picker.done:
+                if not torrent.seed or torrent.is_seed(client.bitfield):
+                    break
+            elif scheduler.idle:
+                work = picker.pick(client.bitfield)
+                if work is not None:
+                    scheduler.adopt(work)
+            for index in scheduler.take_haves():
+                client.writer.write(serialize_have(index))
+            cancels = scheduler.cancellations()
+            client.send_requests(scheduler.next_requests(), cancels)
+            await client.writer.drain()
+            if reading is None:
+                reading = asyncio.ensure_future(client.read())
+            if scheduler.idle and not picker.done:
+                # Nothing to fetch: keep serving the peer until it sends
+                # something or the picker or a new HAVE wakes us.
+                woken = asyncio.ensure_future(wakeup.wait())
+                await asyncio.wait(
+                    {reading, woken}, timeout=5, return_when=asyncio.FIRST_COMPLETED
+                )
+                woken.cancel()
+                if not reading.done():
+                    continue
+            else:
+                try:
+                    await asyncio.wait_for(asyncio.shield(reading), timeout=30)
+                except asyncio.TimeoutError:
+                    # A quiet leecher is fine once we only seed.
+                    if not picker.done:
+                        raise
+                    client.writer.write(serialize_keep_alive())
+                    continue
+            msg, reading = reading.result(), None
+            for progress in scheduler.handle(msg):
+                task = asyncio.create_task(_finish_piece(swarm, client, progress))
+                swarm.verifying.add(task)
+                task.add_done_callback(swarm.verifying.discard)
+            for index, begin, length in scheduler.take_uploads():
+                ranges = swarm.server.block_ranges(index, begin, length)
+                if ranges is not None:
+                    await client.send_block(index, begin, ranges)
+                    scheduler.uploaded += length
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+        logging.warning("Download from %s failed: %s", peer, exc)
+    finally:
+        if reading is not None:
+            reading.cancel()
+        del swarm.schedulers[peer]
+        scheduler.release()
+        swarm.wakeups.discard(wakeup)
+        picker.remove_peer(client.bitfield)
+        await client.close()
+    # Data that failed verification does not count in the peer's favour.
+    return 0 if client.corrupt else scheduler.downloaded
+
+
+async def _run_choker(swarm: _Swarm) -> None:
+    choker: Choker[PeerScheduler] = Choker()
+    while True:
+        await asyncio.sleep(swarm.torrent.choke_interval)
+        rechoke(choker, swarm.schedulers, seeding=swarm.picker.done)
+
+
+async def download_async(
+    torrent: Torrent, storage: Storage, journal: Optional[ResumeJournal] = None
+) -> None:
+    """asyncio equivalent of :meth:`p2p.Torrent.download`."""
+    missing = torrent.missing_work(journal)
+    if not missing and not torrent.seed:
+        return
+    server = torrent.piece_server(storage, journal)
+    transfer = Transfer(left=sum(work.length for work in missing))
+    loop = asyncio.get_running_loop()
+    with HashPool(torrent.hash_workers) as hasher:
+        wakeups: Set[asyncio.Event] = set()
+        dialable = asyncio.Event()
+
+        def wake_sessions() -> None:
+            for event in wakeups:
+                event.set()
+
+        swarm = _Swarm(
+            torrent=torrent,
+            picker=PiecePicker(
+                missing, len(torrent.piece_hashes), on_change=wake_sessions
+            ),
+            hasher=hasher,
+            results=asyncio.Queue(maxsize=max(len(torrent.peers), 1)),
+            manager=torrent.connection_manager(on_change=dialable.set),
+            server=server,
+            buffers=torrent.piece_buffers(storage),
+            wakeups=wakeups,
+        )
+        listener = None
+        if torrent.port is not None:
+            listener = await _listen(swarm, torrent.port)
+        announcer = torrent.announce_in_background(
+            transfer,
+            server,
+            swarm.manager,
+            # Announces run on their own thread.
+            on_peers=lambda peers: loop.call_soon_threadsafe(swarm.manager.add, peers),
+        )
+        dialer = asyncio.create_task(
+            _dial_peers(
+                swarm,
+                dialable,
+                more_peers=listener is not None or announcer is not None,
+            )
+        )
+        choking = asyncio.create_task(_run_choker(swarm))
+        total_pieces = len(torrent.piece_hashes)
+        completed = total_pieces - len(missing)
+        try:
+            while completed < total_pieces:
+                result = await swarm.results.get()
+                if result is None:
+                    raise RuntimeError(
+                        "All peers disconnected before the download finished"
+                    )
+                completed += 1
+                torrent.store_result(
+                    storage,
+                    journal,
+                    result,
+                    completed,
+                    server,
+                    transfer,
+                    swarm.schedulers.values(),
+                )
+                # Idle sessions send the queued HAVEs when woken.
+                wake_sessions()
+            if missing and announcer is not None:
+                announcer.completed()
+            if torrent.seed:
+                logging.info("Download complete; seeding until peers disconnect")
+                await dialer
+                while swarm.sessions:
+                    await asyncio.gather(*swarm.sessions, return_exceptions=True)
+                logging.info("Uploaded %d bytes", server.uploaded)
+        finally:
+            if listener is not None:
+                listener.close()
+            pending = [dialer, choking, *swarm.sessions, *swarm.verifying]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if listener is not None:
+                await listener.wait_closed()
+            if announcer is not None:
+                await asyncio.to_thread(announcer.close)
+        log_hash_stats(hasher)
+
+
+def download(
+    torrent: Torrent, storage: Storage, journal: Optional[ResumeJournal] = None
+) -> None:
+    asyncio.run(download_async(torrent, storage, journal))
@@ -2,7 +2,40 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, Tuple
+import mmap
+from operator import itemgetter
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+SearchableBuffer = Union[bytes, bytearray, mmap.mmap]
+
+# Token bytes, compared as ints since indexing a buffer yields ints.
+_INT = ord("i")
+_LIST = ord("l")
+_DICT = ord("d")
+_END = ord("e")
+_DIGIT_0 = ord("0")
+_DIGIT_9 = ord("9")
+
+# Default nesting limit; real torrents and tracker replies need a handful.
+MAX_DEPTH = 64
+# Longest accepted integer (sign included) and string length prefix, so
+# terminator searches and int() conversions stay cheap on hostile input.
+_MAX_INT_DIGITS = 64
+_MAX_LENGTH_DIGITS = 19
+_NO_KEY = object()
+# dump() hands data to its sink in chunks of about this size.
+FLUSH_SIZE = 64 * 1024
 
 
 class BencodeError(ValueError):
@@ -17,107 +50,332 @@ def _ensure_bytes(value: Any) -> bytes:
     raise TypeError(f"Expected bytes or str, got {type(value)!r}")
 
 
+class _Encoder:
+    """Appends bencoded values to one buffer, optionally draining it to *sink*.
+
+    Every value is written in place instead of being built as its own
+    ``bytes`` and joined into its parent, so encoding costs one copy per
+    string. With a sink the buffer is flushed whenever it grows past
+    :data:`FLUSH_SIZE`, and strings at least that large bypass it entirely.
+    """
+
+    def __init__(self, out: bytearray, sink: Optional[BinaryIO] = None) -> None:
+        self.out = out
+        self.sink = sink
+
+    def flush(self) -> None:
+        if self.sink is not None and self.out:
+            self.sink.write(self.out)
+            del self.out[:]
+
+    def _write_string(self, data: bytes | bytearray | memoryview) -> None:
+        out = self.out
+        out += b"%d:" % len(data)
+        if self.sink is not None and len(data) >= FLUSH_SIZE:
+            self.flush()
+            self.sink.write(data)
+            return
+        out += data
+        if self.sink is not None and len(out) >= FLUSH_SIZE:
+            self.flush()
+
+    def write(self, value: Any) -> None:
+        out = self.out
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            self._write_string(value)
+        elif isinstance(value, str):
+            self._write_string(value.encode("utf-8"))
+        elif isinstance(value, int):
+            # int() turns bools into 0/1 rather than "True"/"False".
+            out += b"i%de" % int(value)
+        elif isinstance(value, (list, tuple)):
+            out += b"l"
+            for item in value:
+                self.write(item)
+            out += b"e"
+        elif isinstance(value, Mapping):
+            out += b"d"
+            if all(type(key) is bytes for key in value):
+                for key in sorted(value):
+                    self._write_string(key)
+                    self.write(value[key])
+            else:
+                items = sorted(
+                    ((_ensure_bytes(key), val) for key, val in value.items()),
+                    key=itemgetter(0),
+                )
+                for key, val in items:
+                    self._write_string(key)
+                    self.write(val)
+            out += b"e"
+        else:
+            raise TypeError(f"Cannot bencode value of type {type(value)!r}")
+
+
 def encode(value: Any) -> bytes:
     """Encode a Python object into bencode."""
-    if isinstance(value, bool):
-        # bool is a subclass of int, but we treat explicitly for clarity.
-        value = int(value)
+    out = bytearray()
+    _Encoder(out).write(value)
+    return bytes(out)
 
-    if isinstance(value, int):
-        return b"i" + str(value).encode("ascii") + b"e"
 
-    if isinstance(value, (bytes, bytearray, memoryview, str)):
-        data = _ensure_bytes(bytes(value))
-        return str(len(data)).encode("ascii") + b":" + data
+def encode_into(value: Any, out: bytearray) -> None:
+    """Append the encoding of *value* to *out*, e.g. a reused scratch buffer."""
+    _Encoder(out).write(value)
 
-    if isinstance(value, (list, tuple)):
-        return b"l" + b"".join(encode(item) for item in value) + b"e"
 
-    if isinstance(value, dict):
-        items: Iterable[Tuple[bytes, Any]] = (
-            (_ensure_bytes(key), val) for key, val in value.items()
-        )
-        encoded_items = sorted(items, key=lambda kv: kv[0])
-        buf = bytearray(b"d")
-        for key, val in encoded_items:
-            buf.extend(encode(key))
-            buf.extend(encode(val))
-        buf.extend(b"e")
-        return bytes(buf)
+def dump(value: Any, sink: BinaryIO) -> None:
+    """Stream the encoding of *value* to a binary file-like *sink*.
 
-    raise TypeError(f"Cannot bencode value of type {type(value)!r}")
+    Memory use stays bounded by :data:`FLUSH_SIZE` plus the value itself,
+    which suits writing large .torrent files.
+    """
+    encoder = _Encoder(bytearray(), sink)
+    encoder.write(value)
+    encoder.flush()
 
 
-def decode(data: bytes | bytearray | memoryview) -> Any:
-    """Decode bencoded bytes into Python objects."""
-    buf = memoryview(data).tobytes()
+def _as_buffer(data: Buffer) -> SearchableBuffer:
+    """Return *data* as something with ``find``; only foreign views are copied."""
+    if isinstance(data, (bytes, bytearray, mmap.mmap)):
+        return data
+    return memoryview(data).tobytes()
 
-    value, next_index = _decode_value(buf, 0)
+
+def decode(
+    data: Buffer, max_depth: int = MAX_DEPTH, max_size: Optional[int] = None
+) -> Any:
+    """Decode bencoded bytes into Python objects.
+
+    Payloads nested deeper than *max_depth* or longer than *max_size* bytes
+    are rejected with :class:`BencodeError` before any work is spent on
+    them, so untrusted input (tracker responses) can be decoded safely.
+    """
+    if max_size is not None and len(data) > max_size:
+        raise BencodeError(f"Payload of {len(data)} bytes exceeds {max_size}")
+    buf = _as_buffer(data)
+    with memoryview(buf) as view:
+        value, next_index = _decode_value(buf, view, 0, max_depth)
     if next_index != len(buf):
         raise BencodeError("Extra data after valid bencode payload")
     return value
 
 
-def _decode_value(buf: bytes, index: int) -> Tuple[Any, int]:
-    if index >= len(buf):
-        raise BencodeError("Unexpected end of data")
-
-    token = buf[index : index + 1]
-
-    if token == b"i":
-        end = buf.find(b"e", index)
-        if end == -1:
-            raise BencodeError("Integer value missing terminator")
-        number = int(buf[index + 1 : end])
-        return number, end + 1
-
-    if token == b"l":
-        index += 1
-        items = []
-        while True:
-            if index >= len(buf):
-                raise BencodeError("List value missing terminator")
-            if buf[index : index + 1] == b"e":
-                return items, index + 1
-            item, index = _decode_value(buf, index)
-            items.append(item)
-
-    if token == b"d":
-        index += 1
-        mapping: Dict[bytes, Any] = {}
-        previous_key = None
-        while True:
-            if index >= len(buf):
-                raise BencodeError("Dictionary value missing terminator")
-            if buf[index : index + 1] == b"e":
-                return mapping, index + 1
-
-            key, index = _decode_value(buf, index)
-            if not isinstance(key, (bytes, bytearray)):
-                raise BencodeError("Dictionary keys must be byte strings")
-            key_bytes = bytes(key)
-            if previous_key is not None and previous_key > key_bytes:
-                # Dictionaries must be sorted; we allow unsorted but keep value.
-                previous_key = key_bytes
+def _decode_value(
+    buf: SearchableBuffer, view: memoryview, index: int, max_depth: int = MAX_DEPTH
+) -> Tuple[Any, int]:
+    """Decode the value at *index* with an explicit stack instead of recursion."""
+    try:
+        return _decode_loop(buf, view, index, max_depth)
+    except IndexError:
+        raise BencodeError("Unexpected end of data") from None
+
+
+def _decode_loop(
+    buf: SearchableBuffer, view: memoryview, index: int, max_depth: int
+) -> Tuple[Any, int]:
+    # Running past the end raises IndexError from buf[index], which saves a
+    # bounds check per token; the caller reports it as truncated input.
+    size = len(buf)
+    find = buf.find
+    # Slicing bytes or mmap yields bytes directly; bytearray needs a view.
+    slices_to_bytes = not isinstance(buf, bytearray)
+    # Open containers, and for each the dict key awaiting its value
+    # (_NO_KEY while a key is expected, None for lists).
+    containers: List[Any] = []
+    keys: List[Any] = []
+    while True:
+        token = buf[index]
+        if _DIGIT_0 <= token <= _DIGIT_9:
+            colon = find(b":", index, index + _MAX_LENGTH_DIGITS + 1)
+            if colon == -1:
+                raise BencodeError("String length missing delimiter")
+            start = colon + 1
+            index = start + _parse_int(buf, index, colon)
+            if index > size:
+                raise BencodeError("Declared string length exceeds buffer")
+            if slices_to_bytes:
+                value: Any = buf[start:index]
             else:
-                previous_key = key_bytes
-            value, index = _decode_value(buf, index)
-            mapping[key_bytes] = value
-
-    if b"0" <= token <= b"9":
-        colon = buf.find(b":", index)
-        if colon == -1:
-            raise BencodeError("String length missing delimiter")
-        try:
-            length = int(buf[index:colon])
-        except ValueError as exc:
-            raise BencodeError("Invalid string length") from exc
-        start = colon + 1
-        end = start + length
-        if end > len(buf):
-            raise BencodeError("Declared string length exceeds buffer")
-        return buf[start:end], end
-
-    raise BencodeError(f"Unknown token: {token!r}")
+                value = view[start:index].tobytes()
+            is_string = True
+        elif token == _INT:
+            end = find(b"e", index, index + _MAX_INT_DIGITS + 2)
+            if end == -1:
+                raise BencodeError("Integer value missing terminator")
+            value = _parse_int(buf, index + 1, end)
+            index = end + 1
+            is_string = False
+        elif token == _LIST or token == _DICT:
+            if len(containers) >= max_depth:
+                raise BencodeError(f"Nesting deeper than {max_depth} levels")
+            if token == _LIST:
+                containers.append([])
+                keys.append(None)
+            else:
+                containers.append({})
+                keys.append(_NO_KEY)
+            index += 1
+            continue
+        elif token == _END and containers:
+            if keys.pop() not in (None, _NO_KEY):
+                raise BencodeError("Dictionary key missing its value")
+            value = containers.pop()
+            index += 1
+            is_string = False
+        else:
+            raise BencodeError(f"Unknown token: {bytes([token])!r}")
+
+        if not containers:
+            return value, index
+        key = keys[-1]
+        if key is None:
+            containers[-1].append(value)
+        elif key is _NO_KEY:
+            if not is_string:
+                raise BencodeError("Dictionary keys must be byte strings")
+            keys[-1] = value
+        else:
+            # Unsorted keys are tolerated; the last duplicate wins.
+            containers[-1][key] = value
+            keys[-1] = _NO_KEY
+
+
+def _parse_int(buf: SearchableBuffer, start: int, end: int) -> int:
+    try:
+        return int(buf[start:end])
+    except ValueError as exc:
+        raise BencodeError(f"Invalid integer at offset {start}") from exc
 
 
+def _string_bounds(buf: SearchableBuffer, index: int) -> Tuple[int, int]:
+    """Return the ``(start, end)`` of the string payload whose length is at *index*."""
+    colon = buf.find(b":", index, index + _MAX_LENGTH_DIGITS + 1)
+    if colon == -1:
+        raise BencodeError("String length missing delimiter")
+    try:
+        length = int(buf[index:colon])
+    except ValueError as exc:
+        raise BencodeError("Invalid string length") from exc
+    start = colon + 1
+    end = start + length
+    if end > len(buf):
+        raise BencodeError("Declared string length exceeds buffer")
+    return start, end
+
+
+def _skip(buf: SearchableBuffer, index: int, max_depth: int = MAX_DEPTH) -> int:
+    """Return the index just past the value at *index* without building it."""
+    depth = 0
+    size = len(buf)
+    while True:
+        if index >= size:
+            raise BencodeError("Unexpected end of data")
+        token = buf[index]
+        if token == _LIST or token == _DICT:
+            if depth >= max_depth:
+                raise BencodeError(f"Nesting deeper than {max_depth} levels")
+            depth += 1
+            index += 1
+            continue
+        if token == _END and depth:
+            depth -= 1
+            index += 1
+        elif token == _INT:
+            end = buf.find(b"e", index, index + _MAX_INT_DIGITS + 2)
+            if end == -1:
+                raise BencodeError("Integer value missing terminator")
+            index = end + 1
+        elif _DIGIT_0 <= token <= _DIGIT_9:
+            index = _string_bounds(buf, index)[1]
+        else:
+            raise BencodeError(f"Unknown token: {bytes([token])!r}")
+        if depth == 0:
+            return index
+
+
+def find_span(data: Buffer, *keys: bytes) -> Tuple[int, int]:
+    """Return the ``(start, end)`` byte span of the value at dict path *keys*.
+
+    Only the keys along the path are looked at; sibling values are skipped
+    without decoding, so ``sha1(data[slice(*find_span(raw, b"info"))])`` is
+    the info hash exactly as the file encodes it.
+    """
+    buf = _as_buffer(data)
+    start, end = 0, _skip(buf, 0)
+    for key in keys:
+        start, end = _dict_spans(buf, start, end).get(key, (-1, -1))
+        if start < 0:
+            raise KeyError(key)
+    return start, end
+
+
+def _dict_spans(
+    buf: SearchableBuffer, start: int, end: int
+) -> Dict[bytes, Tuple[int, int]]:
+    """Map each key of the dict spanning ``[start, end)`` to its value's span."""
+    if buf[start] != _DICT:
+        raise BencodeError("Expected a dictionary")
+    spans: Dict[bytes, Tuple[int, int]] = {}
+    index = start + 1
+    while index < end - 1:
+        if not _DIGIT_0 <= buf[index] <= _DIGIT_9:
+            raise BencodeError("Dictionary keys must be byte strings")
+        key_start, key_end = _string_bounds(buf, index)
+        value_end = _skip(buf, key_end)
+        spans[bytes(buf[key_start:key_end])] = (key_end, value_end)
+        index = value_end
+    return spans
+
+
+class LazyDict(Mapping[bytes, Any]):
+    """Read-only view of a bencoded dict that decodes values on access.
+
+    Construction only records where each value starts and ends. Strings are
+    returned as memoryview slices of the original buffer, nested dicts as
+    further :class:`LazyDict` views, and lists and integers are decoded
+    eagerly when looked up. :meth:`raw` gives a value's exact encoding.
+    """
+
+    def __init__(self, buf: SearchableBuffer, start: int, end: int) -> None:
+        self._buf = buf
+        self._view = memoryview(buf)
+        self._spans = _dict_spans(buf, start, end)
+
+    def span(self, key: bytes) -> Tuple[int, int]:
+        return self._spans[key]
+
+    def raw(self, key: bytes) -> memoryview:
+        start, end = self._spans[key]
+        return self._view[start:end]
+
+    def __getitem__(self, key: bytes) -> Any:
+        start, end = self._spans[key]
+        token = self._buf[start]
+        if token == _DICT:
+            return LazyDict(self._buf, start, end)
+        if _DIGIT_0 <= token <= _DIGIT_9:
+            string_start, string_end = _string_bounds(self._buf, start)
+            return self._view[string_start:string_end]
+        return _decode_value(self._buf, self._view, start)[0]
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self._spans)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+
+def decode_lazy(data: Buffer, max_depth: int = MAX_DEPTH) -> Any:
+    """Like :func:`decode`, but a top-level dict comes back as a :class:`LazyDict`.
+
+    The whole payload is still checked for well-formed structure up front;
+    the returned strings reference *data*, which must not change meanwhile.
+    """
+    buf = _as_buffer(data)
+    end = _skip(buf, 0, max_depth)
+    if end != len(buf):
+        raise BencodeError("Extra data after valid bencode payload")
+    if buf[0] == _DICT:
+        return LazyDict(buf, 0, end)
+    return decode(buf, max_depth)
@@ -0,0 +1,85 @@
+"""Tit-for-tat choking: which peers we upload to."""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import Dict, Generic, Hashable, List, Mapping, Optional, Set, Tuple, TypeVar
+
+# Regular upload slots, re-evaluated every CHOKE_INTERVAL seconds.
+UNCHOKE_SLOTS = 4
+CHOKE_INTERVAL = 10.0
+# The optimistic slot moves to a new peer every this many rounds.
+OPTIMISTIC_ROUNDS = 3
+
+K = TypeVar("K", bound=Hashable)
+
+
+@dataclass
+class PeerStats:
+    """Cumulative counters for one connection, sampled every round."""
+
+    interested: bool
+    downloaded: int
+    uploaded: int
+
+
+class Choker(Generic[K]):
+    """Decides which peers to unchoke each round.
+
+    The *slots* interested peers that gave us the most data since the last
+    round are unchoked; once we are seeding, the ones taking the most from
+    us are preferred instead, since nobody can reciprocate. One more
+    interested peer, picked at random and rotated every *optimistic_rounds*
+    rounds, is unchoked optimistically so that newcomers get a chance to
+    prove themselves. Sans-IO: callers send the resulting CHOKE/UNCHOKE.
+    """
+
+    def __init__(
+        self,
+        slots: int = UNCHOKE_SLOTS,
+        optimistic_rounds: int = OPTIMISTIC_ROUNDS,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.slots = slots
+        self.optimistic_rounds = optimistic_rounds
+        self.unchoked: Set[K] = set()
+        self.optimistic: Optional[K] = None
+        self._rng = rng or random.Random()
+        self._round = 0
+        self._last: Dict[K, Tuple[int, int]] = {}
+
+    def rechoke(
+        self, peers: Mapping[K, PeerStats], seeding: bool = False
+    ) -> Tuple[List[K], List[K]]:
+        """Run one round; returns the peers to unchoke and to choke now."""
+        rates: Dict[K, int] = {}
+        for key, stats in peers.items():
+            downloaded, uploaded = self._last.get(key, (0, 0))
+            rates[key] = (
+                stats.uploaded - uploaded if seeding else stats.downloaded - downloaded
+            )
+        self._last = {key: (s.downloaded, s.uploaded) for key, s in peers.items()}
+
+        interested = [key for key, stats in peers.items() if stats.interested]
+        # Shuffle first so equally fast peers (e.g. all idle) rotate fairly.
+        self._rng.shuffle(interested)
+        interested.sort(key=rates.__getitem__, reverse=True)
+        regular = set(interested[: self.slots])
+
+        if (
+            self.optimistic not in interested
+            or self.optimistic in regular
+            or self._round % self.optimistic_rounds == 0
+        ):
+            choked = [key for key in interested if key not in regular]
+            self.optimistic = self._rng.choice(choked) if choked else None
+        self._round += 1
+
+        target = set(regular)
+        if self.optimistic is not None:
+            target.add(self.optimistic)
+        unchoke = [key for key in target if key not in self.unchoked]
+        choke = [key for key in self.unchoked if key not in target and key in peers]
+        self.unchoked = target
+        return unchoke, choke
@@ -3,12 +3,28 @@
 from __future__ import annotations
 
 import socket
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
 
 from bitfield import BitField
 from handshake import Handshake
-from message import Message, MessageID, format_have, format_request, read_message
+from message import (
+    BLOCK_FRAME,
+    Message,
+    MessageID,
+    format_cancel,
+    format_request,
+    max_frame_length,
+    pack_block_frames,
+    read_buffered_message,
+    serialize_have,
+    serialize_keep_alive,
+)
 from peers import Peer
+from storage import FileRange
+from upload import send_block
+from wire import BlockSink, FrameReader
 
 
 @dataclass
@@ -16,12 +32,37 @@ class Client:
     peer: Peer
     peer_id: bytes
     info_hash: bytes
+    # An accepted connection whose handshake was already answered (see
+    # listener.answer_handshake); the peer is dialed when this is None.
+    sock: Optional[socket.socket] = field(default=None, repr=False)
+    # Our pieces, announced before waiting for the peer's bitfield.
+    have: Optional[BitField] = field(default=None, repr=False)
+    # Pieces in the torrent; bounds the frames the peer may send.
+    num_pieces: int = 0
 
     def __post_init__(self) -> None:
-        self.conn = socket.create_connection(self.peer.address(), timeout=3)
-        self.conn.settimeout(3)
-        self._complete_handshake()
-        self.bitfield = self._recv_bitfield()
+        if self.sock is None:
+            self.conn = socket.create_connection(self.peer.address(), timeout=3)
+            self.conn.settimeout(3)
+            self._complete_handshake()
+        else:
+            self.conn = self.sock
+        self.reader = FrameReader(
+            self.conn, max_frame=max_frame_length(self.num_pieces)
+        )
+        self._send_buf = bytearray()
+        # CHOKE/UNCHOKE are sent from the choker thread, so writes are
+        # serialized to keep frames from interleaving.
+        self._send_lock = threading.Lock()
+        # A first message that was not a BITFIELD, returned by the next read().
+        self._pending: Message | None = None
+        try:
+            if self.have is not None:
+                self.send_bitfield(self.have)
+            self.bitfield = self._recv_bitfield()
+        except BaseException:
+            self.close()
+            raise
         self.choked = True
 
     def _complete_handshake(self) -> None:
@@ -33,32 +74,89 @@ class Client:
         self.conn.settimeout(None)
 
     def _recv_bitfield(self) -> BitField:
+        """Return the peer's BITFIELD, or an empty one if it skipped it.
+
+        A peer with no pieces may go straight to its next message (BEP 3);
+        that message is kept for the following :meth:`read`.
+        """
         self.conn.settimeout(5)
-        msg = read_message(self.conn)
-        if msg is None:
-            raise ValueError("Expected bitfield message, got keep-alive")
-        if msg.msg_id != MessageID.BITFIELD:
-            raise ValueError(f"Expected bitfield, got {msg.msg_id}")
+        msg = self.read()
         self.conn.settimeout(None)
-        return BitField.from_bytes(msg.payload)
-
-    def read(self) -> Message | None:
-        return read_message(self.conn)
+        if msg is not None and msg.msg_id == MessageID.BITFIELD:
+            return BitField.from_bytes(msg.payload)
+        self._pending = msg
+        return BitField(bytearray((self.num_pieces + 7) // 8))
+
+    def _sendall(self, data: bytes | memoryview) -> None:
+        with self._send_lock:
+            self.conn.sendall(data)
+
+    def read(self, sink: BlockSink | None = None) -> Message | None:
+        """Read the next message; its payload is only valid until the next read."""
+        if self._pending is not None:
+            msg, self._pending = self._pending, None
+            return msg
+        return read_buffered_message(self.reader, sink)
 
     def send_request(self, index: int, begin: int, length: int) -> None:
-        self.conn.sendall(format_request(index, begin, length).serialize())
+        self._sendall(format_request(index, begin, length).serialize())
+
+    def send_cancel(self, index: int, begin: int, length: int) -> None:
+        self._sendall(format_cancel(index, begin, length).serialize())
+
+    def send_requests(
+        self,
+        requests: Sequence[Tuple[int, int, int]],
+        cancels: Sequence[Tuple[int, int, int]] = (),
+    ) -> None:
+        """Send CANCEL then REQUEST frames for ``(index, begin, length)`` blocks.
+
+        All frames are packed into one reusable buffer and flushed with a
+        single ``sendall``, so a deep pipeline refill costs one syscall.
+        """
+        size = BLOCK_FRAME.size * (len(requests) + len(cancels))
+        if not size:
+            return
+        with self._send_lock:
+            if len(self._send_buf) < size:
+                self._send_buf = bytearray(size)
+            offset = pack_block_frames(self._send_buf, 0, MessageID.CANCEL, cancels)
+            pack_block_frames(self._send_buf, offset, MessageID.REQUEST, requests)
+            with memoryview(self._send_buf) as view:
+                self.conn.sendall(view[:size])
 
     def send_interested(self) -> None:
-        self.conn.sendall(Message(MessageID.INTERESTED).serialize())
+        self._sendall(Message(MessageID.INTERESTED).serialize())
 
     def send_not_interested(self) -> None:
-        self.conn.sendall(Message(MessageID.NOT_INTERESTED).serialize())
+        self._sendall(Message(MessageID.NOT_INTERESTED).serialize())
+
+    def send_choke(self) -> None:
+        self._sendall(Message(MessageID.CHOKE).serialize())
 
     def send_unchoke(self) -> None:
-        self.conn.sendall(Message(MessageID.UNCHOKE).serialize())
+        self._sendall(Message(MessageID.UNCHOKE).serialize())
 
     def send_have(self, index: int) -> None:
-        self.conn.sendall(format_have(index).serialize())
+        self._sendall(serialize_have(index))
+
+    def send_bitfield(self, bitfield: BitField) -> None:
+        self._sendall(Message(MessageID.BITFIELD, bitfield.raw()).serialize())
+
+    def send_keep_alive(self) -> None:
+        self._sendall(serialize_keep_alive())
+
+    def send_block(self, index: int, begin: int, ranges: List[FileRange]) -> None:
+        """Answer a REQUEST with a PIECE frame whose body is sent with sendfile."""
+        with self._send_lock:
+            send_block(self.conn, index, begin, ranges)
+
+    def shutdown(self) -> None:
+        """Make a read blocked in another thread fail; :meth:`close` still follows."""
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
     def close(self) -> None:
         try:
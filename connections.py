@@ -0,0 +1,272 @@
+"""Choosing which peers to dial, and when to try them again."""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from socket import AddressFamily
+from typing import Callable, Dict, Iterable, Optional
+
+from peers import Peer
+
+# Live connections (dialed or accepted) kept per download.
+MAX_CONNECTIONS = 50
+# Caps simultaneous TCP dials so a large peer list does not exhaust file
+# descriptors or trip connection-rate limits all at once.
+MAX_DIALS = 16
+# A peer that failed n times in a row is retried after
+# min(BACKOFF_BASE * 2 ** (n - 1), BACKOFF_MAX) seconds.
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+# Peers that failed this many times in a row are not tried again.
+MAX_FAILURES = 8
+
+
+@dataclass
+class PeerRecord:
+    """What we have learned about one candidate peer."""
+
+    peer: Peer
+    order: int
+    attempts: int = 0
+    failures: int = 0
+    retry_at: float = 0.0
+    downloaded: int = 0
+    connected_for: float = 0.0
+    dialing: bool = False
+    connected_at: Optional[float] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.dialing or self.connected_at is not None
+
+    def rate(self) -> float:
+        """Bytes per second the peer gave us over all past connections."""
+        if self.connected_for <= 0:
+            return 0.0
+        return self.downloaded / self.connected_for
+
+
+class ConnectionManager:
+    """Bounded dialing with exponential backoff and throughput ranking.
+
+    Candidates are dialed best first: the highest measured download rate
+    discounted by consecutive failures, then address family, then tracker
+    order. Until a dial succeeds IPv4 and IPv6 candidates are alternated;
+    afterwards the family that connected first is preferred, in the spirit
+    of Happy Eyeballs (RFC 8305). A connection
+    that ended without giving us any data counts as a failure, so dead or
+    useless peers back off exponentially and are eventually dropped, while
+    productive ones are redialed straight away.
+
+    All methods are thread-safe. Threaded code blocks in :meth:`wait_dial`;
+    event-loop code calls :meth:`next_dial` and uses *on_change* to learn
+    when a retry might succeed.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        max_dials: int = MAX_DIALS,
+        on_change: Optional[Callable[[], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_connections = max_connections
+        self.max_dials = max_dials
+        self._records: Dict[Peer, PeerRecord] = {}
+        self._dialing = 0
+        self._live = 0
+        # The family that connected first, else the one dialed last.
+        self._family: Optional[AddressFamily] = None
+        self._last_family: Optional[AddressFamily] = None
+        self._cond = threading.Condition()
+        self._on_change = on_change
+        self._clock = clock
+
+    def _changed(self) -> None:
+        self._cond.notify_all()
+        if self._on_change is not None:
+            self._on_change()
+
+    def add(self, peers: Iterable[Peer]) -> int:
+        """Add new candidates; returns how many were not already known."""
+        added = 0
+        with self._cond:
+            for peer in peers:
+                if peer not in self._records:
+                    self._records[peer] = PeerRecord(peer, order=len(self._records))
+                    added += 1
+            if added:
+                self._changed()
+        return added
+
+    def record(self, peer: Peer) -> Optional[PeerRecord]:
+        with self._cond:
+            return self._records.get(peer)
+
+    @property
+    def live(self) -> int:
+        """Connections currently being dialed or open."""
+        with self._cond:
+            return self._dialing + self._live
+
+    @property
+    def exhausted(self) -> bool:
+        """True when nothing is connected and no candidate is left to try."""
+        with self._cond:
+            return not self._dialing and not self._live and not any(
+                r.failures < MAX_FAILURES for r in self._records.values()
+            )
+
+    @property
+    def wants_peers(self) -> bool:
+        """True when known candidates could fill under half the connection slots."""
+        with self._cond:
+            usable = sum(
+                1
+                for r in self._records.values()
+                if not r.busy and r.failures < MAX_FAILURES
+            )
+            return self._dialing + self._live + usable < self.max_connections // 2
+
+    @property
+    def untried(self) -> bool:
+        """True while some candidate has never been dialed."""
+        with self._cond:
+            return any(r.attempts == 0 for r in self._records.values())
+
+    def _best(self, now: float, fresh_only: bool) -> Optional[PeerRecord]:
+        best = None
+        for rec in self._records.values():
+            if rec.busy or rec.failures >= MAX_FAILURES or rec.retry_at > now:
+                continue
+            if fresh_only and rec.attempts:
+                continue
+            key = (
+                -rec.rate() / (1 + rec.failures),
+                rec.failures,
+                self._family_rank(rec.peer),
+                rec.order,
+            )
+            if best is None or key < best[0]:
+                best = (key, rec)
+        return best[1] if best is not None else None
+
+    def _family_rank(self, peer: Peer) -> int:
+        if self._family is not None:
+            return 0 if peer.family == self._family else 1
+        return 1 if peer.family == self._last_family else 0
+
+    @property
+    def preferred_family(self) -> Optional[AddressFamily]:
+        """The address family of the first successful dial, if any."""
+        with self._cond:
+            return self._family
+
+    def _full(self) -> bool:
+        return (
+            self._dialing >= self.max_dials
+            or self._dialing + self._live >= self.max_connections
+        )
+
+    def next_dial(self, fresh_only: bool = False) -> Optional[Peer]:
+        """Reserve a dial slot for the best eligible candidate, if any.
+
+        With *fresh_only*, peers that were dialed before are skipped.
+        """
+        with self._cond:
+            if self._full():
+                return None
+            rec = self._best(self._clock(), fresh_only)
+            if rec is None:
+                return None
+            rec.attempts += 1
+            rec.dialing = True
+            self._last_family = rec.peer.family
+            self._dialing += 1
+            return rec.peer
+
+    def next_retry(self) -> Optional[float]:
+        """Seconds until a backed-off candidate becomes eligible, if any."""
+        with self._cond:
+            waiting = [
+                r.retry_at
+                for r in self._records.values()
+                if not r.busy and r.failures < MAX_FAILURES
+            ]
+            if not waiting:
+                return None
+            return max(0.0, min(waiting) - self._clock())
+
+    def wait_dial(self, timeout: float, fresh_only: bool = False) -> Optional[Peer]:
+        """Like :meth:`next_dial`, but wait up to *timeout* for a candidate."""
+        deadline = self._clock() + timeout
+        with self._cond:
+            while True:
+                peer = self.next_dial(fresh_only)
+                if peer is not None:
+                    return peer
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    return None
+                retry = self.next_retry()
+                if retry is not None:
+                    remaining = min(remaining, retry)
+                self._cond.wait(remaining)
+
+    def connected(self, peer: Peer) -> None:
+        """The dial to *peer* completed its handshake."""
+        with self._cond:
+            rec = self._records[peer]
+            rec.dialing = False
+            rec.connected_at = self._clock()
+            if self._family is None:
+                self._family = peer.family
+            self._dialing -= 1
+            self._live += 1
+
+    def failed(self, peer: Peer) -> None:
+        """The dial to *peer* or its handshake failed."""
+        with self._cond:
+            rec = self._records[peer]
+            rec.dialing = False
+            self._dialing -= 1
+            self._back_off(rec)
+            self._changed()
+
+    def closed(self, peer: Peer, downloaded: int) -> None:
+        """A connection to *peer* ended after receiving *downloaded* bytes."""
+        with self._cond:
+            rec = self._records[peer]
+            now = self._clock()
+            if rec.connected_at is not None:
+                rec.connected_for += now - rec.connected_at
+                rec.connected_at = None
+            self._live -= 1
+            rec.downloaded += downloaded
+            if downloaded:
+                rec.failures = 0
+                rec.retry_at = now
+            else:
+                self._back_off(rec)
+            self._changed()
+
+    def _back_off(self, rec: PeerRecord) -> None:
+        rec.failures += 1
+        delay = min(BACKOFF_BASE * 2 ** (rec.failures - 1), BACKOFF_MAX)
+        rec.retry_at = self._clock() + delay
+
+    def accept(self) -> bool:
+        """Reserve a slot for an inbound connection; False when full."""
+        with self._cond:
+            if self._dialing + self._live >= self.max_connections:
+                return False
+            self._live += 1
+            return True
+
+    def release(self) -> None:
+        """An inbound connection reserved with :meth:`accept` ended."""
+        with self._cond:
+            self._live -= 1
+            self._changed()
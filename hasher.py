@@ -0,0 +1,92 @@
+"""SHA-1 verification of completed pieces on a dedicated thread pool."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle with p2p
+    from p2p import PieceWork
+
+# hashlib releases the GIL while hashing, but a couple of threads already
+# outpace most network links; more only add contention.
+DEFAULT_HASH_WORKERS = min(4, os.cpu_count() or 1)
+
+
+@dataclass
+class HashStats:
+    pieces: int
+    bytes_hashed: int
+    busy_seconds: float
+    queue_depth: int
+    max_queue_depth: int
+
+    def throughput(self) -> float:
+        """Hashing speed in MB/s of busy hashing time."""
+        if self.busy_seconds <= 0:
+            return 0.0
+        return self.bytes_hashed / self.busy_seconds / 1e6
+
+
+class HashPool:
+    """Verifies finished pieces off the network threads/event loop.
+
+    :meth:`verify` returns a future resolving to whether the piece matched
+    its hash; callers fan the outcome back to their scheduler with
+    ``add_done_callback`` or ``asyncio.wrap_future``.
+    """
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or DEFAULT_HASH_WORKERS, thread_name_prefix="hash"
+        )
+        self._lock = threading.Lock()
+        self._pieces = 0
+        self._bytes = 0
+        self._busy = 0.0
+        self._depth = 0
+        self._max_depth = 0
+
+    def _hash(self, work: "PieceWork", data: bytes | bytearray | memoryview) -> bool:
+        started = time.perf_counter()
+        digest = hashlib.sha1(data).digest()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._depth -= 1
+            self._pieces += 1
+            self._bytes += len(data)
+            self._busy += elapsed
+        return digest == work.hash_bytes
+
+    def verify(
+        self, work: "PieceWork", data: bytes | bytearray | memoryview
+    ) -> "Future[bool]":
+        """Queue *data* for hashing; the caller must not modify it meanwhile."""
+        with self._lock:
+            self._depth += 1
+            self._max_depth = max(self._max_depth, self._depth)
+        return self._executor.submit(self._hash, work, data)
+
+    def stats(self) -> HashStats:
+        with self._lock:
+            return HashStats(
+                pieces=self._pieces,
+                bytes_hashed=self._bytes,
+                busy_seconds=self._busy,
+                queue_depth=self._depth,
+                max_queue_depth=self._max_depth,
+            )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "HashPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
@@ -0,0 +1,130 @@
+"""Accepting inbound peer connections on the announced port."""
+
+from __future__ import annotations
+
+import logging
+import selectors
+import socket
+import threading
+from typing import Callable, List, Optional
+
+from handshake import Handshake
+from peers import Peer
+
+LISTEN_BACKLOG = 64
+# An accepted connection must complete its handshake within this many seconds.
+HANDSHAKE_TIMEOUT = 5.0
+
+PeerHandler = Callable[[socket.socket, Peer], None]
+
+
+def answer_handshake(sock: socket.socket, info_hash: bytes, peer_id: bytes) -> Handshake:
+    """Read a dialing peer's handshake and answer it if it is for our torrent."""
+    res = Handshake.read(sock)
+    if res.info_hash != info_hash:
+        raise ValueError("Peer info hash mismatch")
+    if res.peer_id == peer_id:
+        raise ValueError("Connected to ourselves")
+    sock.sendall(Handshake.create(info_hash, peer_id).serialize())
+    return res
+
+
+class Listener:
+    """Accepts peers on *port* and hands each handshaken socket to *on_peer*.
+
+    The accept loop waits on a selector so :meth:`close` can stop it
+    promptly. Every accepted connection gets its own thread, which answers
+    the handshake and then runs *on_peer* until the peer is done.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        info_hash: bytes,
+        peer_id: bytes,
+        on_peer: PeerHandler,
+        host: str = "",
+    ) -> None:
+        self.info_hash = info_hash
+        self.peer_id = peer_id
+        self.on_peer = on_peer
+        if not host and socket.has_dualstack_ipv6():
+            # One socket for both families; IPv4 peers show up as mapped
+            # addresses, which Peer folds back to IPv4.
+            self.sock = socket.create_server(
+                (host, port),
+                family=socket.AF_INET6,
+                backlog=LISTEN_BACKLOG,
+                dualstack_ipv6=True,
+            )
+        else:
+            self.sock = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.sessions: List[threading.Thread] = []
+
+    def start(self) -> "Listener":
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        logging.info("Listening for peers on port %d", self.port)
+        return self
+
+    def _serve(self) -> None:
+        while not self._stop.is_set():
+            if not self._selector.select(timeout=0.5):
+                continue
+            try:
+                conn, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    return
+                raise
+            thread = threading.Thread(
+                target=self._handle, args=(conn, Peer(addr[0], addr[1])), daemon=True
+            )
+            with self._lock:
+                self.sessions = [t for t in self.sessions if t.is_alive()]
+                self.sessions.append(thread)
+            thread.start()
+
+    def _handle(self, conn: socket.socket, peer: Peer) -> None:
+        try:
+            conn.setblocking(True)
+            conn.settimeout(HANDSHAKE_TIMEOUT)
+            answer_handshake(conn, self.info_hash, self.peer_id)
+        except (OSError, ValueError) as exc:
+            logging.warning("Inbound handshake from %s failed: %s", peer, exc)
+            conn.close()
+            return
+        logging.info("Accepted %s", peer)
+        self.on_peer(conn, peer)
+
+    def join_sessions(self) -> None:
+        """Wait until every accepted peer so far has disconnected."""
+        while True:
+            with self._lock:
+                alive = [t for t in self.sessions if t.is_alive()]
+            if not alive:
+                return
+            for thread in alive:
+                thread.join()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._selector.close()
+        self.sock.close()
+
+    def __enter__(self) -> "Listener":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
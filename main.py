@@ -1,28 +1,90 @@
 from __future__ import annotations
 
 import argparse
+import logging
 import sys
 
 from console import configure_logging
-from torrentfile import open_torrent
+from torrentfile import ENGINES, STORAGE_BACKENDS, TorrentFile, open_torrent
 
 
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(description="Download a file via BitTorrent")
     parser.add_argument("torrent", help=".torrent file to read")
-    parser.add_argument("output", help="Path to write the downloaded contents to")
+    parser.add_argument(
+        "output",
+        help="Path to write the downloaded contents to (a directory for multi-file torrents)",
+    )
     parser.add_argument(
         "-q", "--quiet", action="store_true", help="Reduce logging verbosity"
     )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="threads",
+        help="Download engine: one thread per peer, or a single asyncio event loop",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=STORAGE_BACKENDS,
+        default="pwrite",
+        help="Write pieces with positional writes, or receive them into a memory map",
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Leave the output sparse instead of reserving its disk space up front",
+    )
+    parser.add_argument(
+        "--seed",
+        action="store_true",
+        help="Keep uploading to peers after the download completes",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check an existing output file against the piece hashes instead of downloading",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of hashing threads for --verify (default: CPU count)",
+    )
     args = parser.parse_args(argv)
 
     configure_logging(verbose=not args.quiet)
 
     torrent = open_torrent(args.torrent)
-    torrent.download_to_file(args.output)
+    if args.verify:
+        return _verify(torrent, args.output, args.jobs)
+    torrent.download_to_file(
+        args.output,
+        engine=args.engine,
+        storage=args.storage,
+        sparse=args.sparse,
+        seed=args.seed,
+    )
     return 0
 
 
+def _verify(torrent: TorrentFile, path: str, jobs: int | None) -> int:
+    report = torrent.verify(path, workers=jobs)
+    for missing in report.missing_files:
+        logging.error("Cannot read %s", missing)
+    for index in report.bad_pieces:
+        logging.warning("Piece #%d failed integrity check", index)
+    logging.info(
+        "Verified %d pieces (%d bad) in %.2fs at %.1f MiB/s",
+        report.total_pieces,
+        len(report.bad_pieces),
+        report.elapsed,
+        report.throughput() / (1024 * 1024),
+    )
+    return 0 if report.ok else 1
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
 
@@ -5,9 +5,9 @@ from __future__ import annotations
 import struct
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Iterable, Optional, Tuple
 
-from wire import read_exact
+from wire import MAX_FRAME_LENGTH, BlockSink, FrameReader, read_exact
 
 
 class MessageID(IntEnum):
@@ -25,7 +25,9 @@ class MessageID(IntEnum):
 @dataclass
 class Message:
     msg_id: MessageID
-    payload: bytes = b""
+    # Messages read through a wire.FrameReader carry a memoryview into the
+    # connection's receive buffer, valid until the next read.
+    payload: bytes | memoryview = b""
 
     def serialize(self) -> bytes:
         length = len(self.payload) + 1
@@ -49,18 +51,69 @@ class Message:
         return f"{self.name()} [{len(self.payload)}]"
 
 
+# Pre-compiled frames for the fixed-size messages sent on the hot path:
+# length prefix, ID and the big-endian integer fields.
+BLOCK_FRAME = struct.Struct(">IBIII")
+HAVE_FRAME = struct.Struct(">IBI")
+
+
+def max_frame_length(num_pieces: int) -> int:
+    """Longest frame a peer may send: a full block or a BITFIELD for *num_pieces*."""
+    return max(MAX_FRAME_LENGTH, 1 + (num_pieces + 7) // 8)
+
+
 def serialize_keep_alive() -> bytes:
     return b"\x00\x00\x00\x00"
 
 
+def serialize_have(index: int) -> bytes:
+    return HAVE_FRAME.pack(HAVE_FRAME.size - 4, MessageID.HAVE, index)
+
+
+def pack_block_frames(
+    buf: bytearray,
+    offset: int,
+    msg_id: MessageID,
+    blocks: Iterable[Tuple[int, int, int]],
+) -> int:
+    """Pack REQUEST/CANCEL frames for *blocks* into *buf* at *offset*.
+
+    *buf* must have room for every frame. Returns the offset just past the
+    last frame written.
+    """
+    for index, begin, length in blocks:
+        BLOCK_FRAME.pack_into(
+            buf, offset, BLOCK_FRAME.size - 4, msg_id, index, begin, length
+        )
+        offset += BLOCK_FRAME.size
+    return offset
+
+
+def parse_message(frame: bytes | memoryview) -> Message:
+    """Build a message from a frame body (ID byte followed by the payload)."""
+    return Message(msg_id=MessageID(frame[0]), payload=frame[1:])
+
+
 def read_message(stream: BinaryIO) -> Optional[Message]:
     length_raw = read_exact(stream, 4)
     (length,) = struct.unpack(">I", length_raw)
     if length == 0:
         return None
-    payload = read_exact(stream, length)
-    msg_id = MessageID(payload[0])
-    return Message(msg_id=msg_id, payload=payload[1:])
+    return parse_message(read_exact(stream, length))
+
+
+def read_buffered_message(
+    reader: FrameReader, sink: Optional[BlockSink] = None
+) -> Optional[Message]:
+    """Read a message whose payload is a view into *reader*'s buffer.
+
+    PIECE blocks accepted by *sink* bypass the Message entirely and are
+    reported as None; see :meth:`wire.FrameReader.read_frame`.
+    """
+    frame = reader.read_frame(sink)
+    if frame is None:
+        return None
+    return parse_message(frame)
 
 
 def format_request(index: int, begin: int, length: int) -> Message:
@@ -68,18 +121,23 @@ def format_request(index: int, begin: int, length: int) -> Message:
     return Message(msg_id=MessageID.REQUEST, payload=payload)
 
 
+def format_cancel(index: int, begin: int, length: int) -> Message:
+    payload = struct.pack(">III", index, begin, length)
+    return Message(msg_id=MessageID.CANCEL, payload=payload)
+
+
 def format_have(index: int) -> Message:
     payload = struct.pack(">I", index)
     return Message(msg_id=MessageID.HAVE, payload=payload)
 
 
-def parse_piece(index: int, buf: bytearray, msg: Message) -> int:
+def parse_piece(index: int, buf: bytearray | memoryview, msg: Message) -> int:
     if msg.msg_id != MessageID.PIECE:
         raise ValueError(f"Expected PIECE (ID {MessageID.PIECE}), got {msg.msg_id}")
     if len(msg.payload) < 8:
         raise ValueError("Payload too short")
 
-    parsed_index, begin = struct.unpack(">II", msg.payload[:8])
+    parsed_index, begin = struct.unpack_from(">II", msg.payload)
     if parsed_index != index:
         raise ValueError(f"Expected index {index}, got {parsed_index}")
     if begin >= len(buf):
@@ -93,6 +151,15 @@ def parse_piece(index: int, buf: bytearray, msg: Message) -> int:
     return len(data)
 
 
+def parse_request(msg: Message) -> Tuple[int, int, int]:
+    """Return ``(index, begin, length)`` of a REQUEST or CANCEL message."""
+    if msg.msg_id not in (MessageID.REQUEST, MessageID.CANCEL):
+        raise ValueError(f"Expected REQUEST or CANCEL, got {msg.msg_id}")
+    if len(msg.payload) != 12:
+        raise ValueError("Expected payload length 12")
+    return struct.unpack(">III", msg.payload)
+
+
 def parse_have(msg: Message) -> int:
     if msg.msg_id != MessageID.HAVE:
         raise ValueError("Expected HAVE message")
@@ -2,20 +2,41 @@
 
 from __future__ import annotations
 
-import hashlib
 import logging
 import queue
+import socket
+import struct
 import threading
-from dataclasses import dataclass
-from typing import List
+from collections import deque
+from concurrent.futures import Future
+from contextlib import ExitStack
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Callable, Deque, Dict, Iterable, List, Mapping, Optional, Set, Tuple
 
+from announcer import Announcer
+from bitfield import BitField
+from choker import CHOKE_INTERVAL, Choker, PeerStats
 from client import Client
+from connections import MAX_CONNECTIONS, MAX_DIALS, ConnectionManager
 from console import colorize
-from message import MessageID, parse_have, parse_piece
+from hasher import HashPool
+from listener import Listener, PeerHandler
+from message import Message, MessageID, parse_have, parse_piece, parse_request
 from peers import Peer
+from picker import PiecePicker
+from pipeline import MAX_BACKLOG, MAX_BLOCK_SIZE, MIN_BACKLOG, RequestPipeline
+from resume import ResumeJournal
+from storage import MmapStorage, Storage
+from tracker import Transfer
+from upload import PieceServer
 
-MAX_BLOCK_SIZE = 16384
-MAX_BACKLOG = 5
+
+# Further REQUESTs from a peer are dropped while this many are unanswered.
+MAX_QUEUED_UPLOADS = 256
+# A connection with nothing to download re-checks the picker this often
+# while it keeps reading the peer's messages.
+IDLE_POLL = 1.0
 
 
 @dataclass
@@ -28,68 +49,332 @@ class PieceWork:
 @dataclass
 class PieceResult:
     index: int
-    data: bytes
+    data: bytes | bytearray | memoryview
+
+
+# Supplies the buffer a piece is assembled in, e.g. its place in a mapping.
+PieceBuffers = Callable[[PieceWork], memoryview]
 
 
 @dataclass
 class PieceProgress:
-    index: int
-    client: Client
-    length: int
-    buf: bytearray
+    work: PieceWork
+    buf: bytearray | memoryview
     downloaded: int = 0
     requested: int = 0
-    backlog: int = 0
+    retry: List[int] = field(default_factory=list)
+    received: Set[int] = field(default_factory=set)
+
+    @classmethod
+    def start(
+        cls, work: PieceWork, buf: bytearray | memoryview | None = None
+    ) -> "PieceProgress":
+        return cls(work=work, buf=bytearray(work.length) if buf is None else buf)
+
+    @property
+    def index(self) -> int:
+        return self.work.index
+
+    @property
+    def length(self) -> int:
+        return self.work.length
+
+    @property
+    def complete(self) -> bool:
+        return self.downloaded >= self.length
+
+    @property
+    def shared(self) -> bool:
+        """True when blocks land in memory owned by the storage, not a private copy."""
+        return not isinstance(self.buf, bytearray)
+
+    def next_block(self) -> Optional[Tuple[int, int]]:
+        """Return the ``(begin, length)`` of the next block to request."""
+        while self.retry:
+            begin = self.retry.pop()
+            if begin not in self.received:
+                return begin, min(MAX_BLOCK_SIZE, self.length - begin)
+        if self.requested >= self.length:
+            return None
+        begin = self.requested
+        self.requested += MAX_BLOCK_SIZE
+        return begin, min(MAX_BLOCK_SIZE, self.length - begin)
+
+    def on_piece(self, begin: int, msg: Message) -> int:
+        """Copy a PIECE payload into the buffer; duplicates are ignored."""
+        if begin in self.received:
+            return 0
+        n = parse_piece(self.index, self.buf, msg)
+        self.mark_received(begin, n)
+        return n
+
+    def target(self, begin: int, length: int) -> Optional[memoryview]:
+        """Writable view for a block, or None if it is unexpected or a duplicate."""
+        if begin in self.received or begin < 0 or begin + length > self.length:
+            return None
+        return memoryview(self.buf)[begin : begin + length]
+
+    def mark_received(self, begin: int, length: int) -> None:
+        self.received.add(begin)
+        self.downloaded += length
+
+
+class PeerScheduler:
+    """Request scheduling for one connection across several pieces at once.
+
+    Requests for the next piece are issued while the previous one is still
+    arriving, so the pipeline stays full across piece boundaries instead of
+    draining to zero, idling through the hash check and refilling.
+
+    Pieces are assembled in buffers from *buffers* when given. Endgame
+    duplicates always get a private buffer so two peers never write the
+    same shared memory, and a shared buffer stops taking blocks once
+    another peer's copy of the piece has been verified.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        picker: PiecePicker,
+        pipeline: RequestPipeline,
+        buffers: Optional[PieceBuffers] = None,
+    ) -> None:
+        self.client = client
+        self.picker = picker
+        self.pipeline = pipeline
+        self.buffers = buffers
+        self.pieces: Dict[int, PieceProgress] = {}
+        self.inflight: Dict[Tuple[int, int], int] = {}
+        self.peer_interested = False
+        # Whether we refuse to upload to this peer; see choker.Choker.
+        self.am_choking = True
+        self.downloaded = 0
+        self.uploaded = 0
+        self._completed: List[PieceProgress] = []
+        # Blocks the peer asked us for, answered by the caller.
+        self._uploads: List[Tuple[int, int, int]] = []
+        # Pieces verified since the last take_haves(); appended from the
+        # thread that stores results, so a deque rather than a list swap.
+        self._haves: Deque[int] = deque()
+
+    @property
+    def idle(self) -> bool:
+        return not self.pieces
+
+    def adopt(self, work: PieceWork) -> None:
+        buf = None
+        if self.buffers is not None and not self.picker.in_endgame:
+            buf = self.buffers(work)
+        self.pieces[work.index] = PieceProgress.start(work, buf)
+
+    def _next_block(self) -> Optional[Tuple[int, int, int]]:
+        for progress in self.pieces.values():
+            block = progress.next_block()
+            if block is not None:
+                return (progress.index, *block)
+        work = self.picker.pick(self.client.bitfield, exclude=self.pieces)
+        if work is None:
+            return None
+        self.adopt(work)
+        return self._next_block()
+
+    def cancellations(self) -> List[Tuple[int, int, int]]:
+        """Drop pieces another peer finished first and return blocks to CANCEL.
+
+        Only happens in endgame, when the same piece is fetched from several
+        peers at once.
+        """
+        if not self.picker.in_endgame:
+            return []
+        cancels = []
+        for index in [i for i in self.pieces if self.picker.is_complete(i)]:
+            del self.pieces[index]
+            for key in [key for key in self.inflight if key[0] == index]:
+                length = self.inflight.pop(key)
+                self.pipeline.on_cancel(*key)
+                cancels.append((index, key[1], length))
+        return cancels
 
-    def read_message(self) -> None:
-        msg = self.client.read()
+    def _accepts(self, progress: PieceProgress) -> bool:
+        # Late blocks for a piece a duplicate already finished would land
+        # on top of the verified data in storage.
+        return not progress.shared or not self.picker.is_complete(progress.index)
+
+    def next_requests(self) -> List[Tuple[int, int, int]]:
+        """Blocks to request now to keep the pipeline at its target depth."""
+        if self.client.choked:
+            return []
+        requests = []
+        while len(self.inflight) < self.pipeline.depth:
+            block = self._next_block()
+            if block is None:
+                break
+            index, begin, length = block
+            self.inflight[(index, begin)] = length
+            self.pipeline.on_request(index, begin)
+            requests.append(block)
+        return requests
+
+    def block_target(self, index: int, begin: int, length: int) -> Optional[memoryview]:
+        """:class:`wire.BlockSink` hook: where an incoming block should land."""
+        progress = self.pieces.get(index)
+        if progress is None or not self._accepts(progress):
+            return None
+        return progress.target(begin, length)
+
+    def block_received(self, index: int, begin: int, length: int) -> None:
+        """:class:`wire.BlockSink` hook: a block was written to its target."""
+        progress = self.pieces[index]
+        progress.mark_received(begin, length)
+        self._block_done(progress, begin, length)
+
+    def _block_done(self, progress: PieceProgress, begin: int, length: int) -> None:
+        self.downloaded += length
+        if length:
+            self.picker.block_received(progress.index)
+        if self.inflight.pop((progress.index, begin), None) is not None:
+            self.pipeline.on_block(progress.index, begin, length)
+        if progress.complete:
+            del self.pieces[progress.index]
+            self._completed.append(progress)
+
+    def handle(self, msg: Message | None) -> List[PieceProgress]:
+        """Apply *msg* and return pieces completed since the last call.
+
+        Blocks that arrived through the :class:`wire.BlockSink` hooks are
+        included, so call this after every read even if it returned None.
+        """
         if msg is None:
-            return
-        if msg.msg_id == MessageID.UNCHOKE:
+            pass
+        elif msg.msg_id == MessageID.UNCHOKE:
             self.client.choked = False
         elif msg.msg_id == MessageID.CHOKE:
+            # A choking peer discards our queued requests; ask again later.
             self.client.choked = True
+            for index, begin in self.inflight:
+                progress = self.pieces.get(index)
+                if progress is not None:
+                    progress.retry.append(begin)
+            self.inflight.clear()
+            self.pipeline.reset()
+        elif msg.msg_id == MessageID.INTERESTED:
+            self.peer_interested = True
+        elif msg.msg_id == MessageID.NOT_INTERESTED:
+            self.peer_interested = False
+        elif msg.msg_id == MessageID.REQUEST:
+            block = parse_request(msg)
+            # Requests made while choked are void under the protocol.
+            if not self.am_choking and len(self._uploads) < MAX_QUEUED_UPLOADS:
+                self._uploads.append(block)
+        elif msg.msg_id == MessageID.CANCEL:
+            block = parse_request(msg)
+            if block in self._uploads:
+                self._uploads.remove(block)
         elif msg.msg_id == MessageID.HAVE:
             index = parse_have(msg)
-            self.client.bitfield.set_piece(index)
+            if not self.client.bitfield.has_piece(index):
+                self.client.bitfield.set_piece(index)
+                self.picker.add_have(index)
         elif msg.msg_id == MessageID.PIECE:
-            n = parse_piece(self.index, self.buf, msg)
-            self.downloaded += n
-            self.backlog -= 1
+            if len(msg.payload) < 8:
+                raise ValueError("Payload too short")
+            index, begin = struct.unpack_from(">II", msg.payload)
+            progress = self.pieces.get(index)
+            if progress is not None and self._accepts(progress):
+                n = progress.on_piece(begin, msg)
+                self._block_done(progress, begin, n)
+        completed, self._completed = self._completed, []
+        return completed
 
+    def announce(self, index: int) -> None:
+        """Queue a HAVE for *index*, which we can now serve."""
+        self._haves.append(index)
 
-def attempt_download_piece(client: Client, piece: PieceWork) -> bytes:
-    progress = PieceProgress(
-        index=piece.index,
-        client=client,
-        length=piece.length,
-        buf=bytearray(piece.length),
-    )
-    client.conn.settimeout(30)
-    try:
-        while progress.downloaded < piece.length:
-            if not client.choked:
-                while (
-                    progress.backlog < MAX_BACKLOG and progress.requested < piece.length
-                ):
-                    block_size = min(
-                        MAX_BLOCK_SIZE, piece.length - progress.requested
-                    )
-                    client.send_request(
-                        piece.index, progress.requested, block_size
-                    )
-                    progress.backlog += 1
-                    progress.requested += block_size
-            progress.read_message()
-        return bytes(progress.buf)
-    finally:
-        client.conn.settimeout(None)
+    def take_haves(self) -> List[int]:
+        """Pieces to announce to the peer since the last call."""
+        haves = []
+        while self._haves:
+            haves.append(self._haves.popleft())
+        return haves
+
+    def take_uploads(self) -> List[Tuple[int, int, int]]:
+        """Blocks requested by the peer since the last call, oldest first.
+
+        Empty while we choke the peer; choking discards its queued requests.
+        """
+        uploads, self._uploads = self._uploads, []
+        return [] if self.am_choking else uploads
+
+    def stats(self) -> PeerStats:
+        return PeerStats(self.peer_interested, self.downloaded, self.uploaded)
 
+    def release(self) -> None:
+        """Hand every unfinished piece back to the picker."""
+        for progress in self.pieces.values():
+            self.picker.requeue(progress.work)
+        self.pieces.clear()
+        self.inflight.clear()
 
-def check_integrity(piece: PieceWork, data: bytes) -> None:
-    digest = hashlib.sha1(data).digest()
-    if digest != piece.hash_bytes:
-        raise ValueError(f"Piece #{piece.index} failed integrity check")
+
+class PeerTable:
+    """Live connections by peer, shared between worker threads and the choker."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._schedulers: Dict[Peer, PeerScheduler] = {}
+
+    def add(self, peer: Peer, scheduler: PeerScheduler) -> None:
+        with self._lock:
+            self._schedulers[peer] = scheduler
+
+    def remove(self, peer: Peer) -> None:
+        with self._lock:
+            self._schedulers.pop(peer, None)
+
+    def snapshot(self) -> Dict[Peer, PeerScheduler]:
+        with self._lock:
+            return dict(self._schedulers)
+
+    def disconnect(self) -> None:
+        """Shut down every live connection so its worker stops reading."""
+        for scheduler in self.snapshot().values():
+            scheduler.client.shutdown()
+
+
+def rechoke(
+    choker: Choker[PeerScheduler],
+    schedulers: Mapping[Peer, PeerScheduler],
+    seeding: bool,
+) -> None:
+    """Run one choking round over live connections and notify affected peers.
+
+    The choker is keyed by connection rather than address, so a peer that
+    reconnects starts out choked with fresh counters.
+    """
+    stats = {scheduler: scheduler.stats() for scheduler in schedulers.values()}
+    unchoke, choke = choker.rechoke(stats, seeding)
+    for scheduler in choke:
+        scheduler.am_choking = True
+        try:
+            scheduler.client.send_choke()
+        except OSError:
+            pass
+    for scheduler in unchoke:
+        scheduler.am_choking = False
+        try:
+            scheduler.client.send_unchoke()
+        except OSError:
+            pass
+
+
+def log_hash_stats(hasher: HashPool) -> None:
+    stats = hasher.stats()
+    logging.info(
+        "Hashed %d pieces at %.1f MB/s (peak hash queue depth %d)",
+        stats.pieces,
+        stats.throughput(),
+        stats.max_queue_depth,
+    )
 
 
 @dataclass
@@ -101,6 +386,21 @@ class Torrent:
     piece_length: int
     length: int
     name: str
+    min_backlog: int = MIN_BACKLOG
+    max_backlog: int = MAX_BACKLOG
+    hash_workers: Optional[int] = None
+    # Keep serving peers after the download completes.
+    seed: bool = False
+    choke_interval: float = CHOKE_INTERVAL
+    # Accept inbound peers on this port; None to only dial out.
+    port: Optional[int] = None
+    max_connections: int = MAX_CONNECTIONS
+    max_dials: int = MAX_DIALS
+    # Re-announces during the download, feeding new peers to the swarm.
+    announcer: Optional[Announcer] = None
+
+    def new_pipeline(self) -> RequestPipeline:
+        return RequestPipeline(floor=self.min_backlog, ceiling=self.max_backlog)
 
     def _piece_bounds(self, index: int) -> tuple[int, int]:
         begin = index * self.piece_length
@@ -111,90 +411,389 @@ class Torrent:
         begin, end = self._piece_bounds(index)
         return end - begin
 
+    def piece_buffers(self, storage: Storage) -> Optional[PieceBuffers]:
+        """Buffers inside *storage* itself when it is memory mapped."""
+        if not isinstance(storage, MmapStorage):
+            return None
+
+        def buffer(work: PieceWork) -> memoryview:
+            return storage.piece_view(work.index * self.piece_length, work.length)
+
+        return buffer
+
     def _start_worker(
         self,
         peer: Peer,
-        work_queue: "queue.Queue[PieceWork | None]",
+        picker: PiecePicker,
+        hasher: HashPool,
         results: "queue.Queue[PieceResult]",
+        buffers: Optional[PieceBuffers] = None,
+        server: Optional[PieceServer] = None,
+        table: Optional[PeerTable] = None,
+        sock: Optional[socket.socket] = None,
+        manager: Optional[ConnectionManager] = None,
+        stopped: Optional[threading.Event] = None,
     ) -> None:
+        """Run one peer connection: dial *peer*, or adopt an accepted *sock*.
+
+        The outcome of a dial reserved with *manager* is reported back to it.
+        Once *stopped* is set the connection winds down, and verified pieces
+        are dropped instead of queued, since nothing drains *results* after
+        the download loop has exited.
+        """
         try:
-            client = Client(peer=peer, peer_id=self.peer_id, info_hash=self.info_hash)
+            client = Client(
+                peer=peer,
+                peer_id=self.peer_id,
+                info_hash=self.info_hash,
+                sock=sock,
+                have=server.have if server is not None and server.has_any() else None,
+                num_pieces=len(self.piece_hashes),
+            )
         except Exception as exc:  # pragma: no cover - network errors
             logging.warning("Handshake with %s failed: %s", peer, exc)
+            if manager is not None:
+                manager.failed(peer)
             return
 
-        with client:
-            logging.info("Connected to %s", peer)
-            client.send_unchoke()
-            client.send_interested()
+        if manager is not None:
+            manager.connected(peer)
+        downloaded = 0
+        picker.add_peer(client.bitfield)
+        pipeline = self.new_pipeline()
+        # Set by a hashing thread when this peer sent a corrupt piece.
+        bad_piece = threading.Event()
 
-            while True:
+        def on_verified(progress: PieceProgress, future: "Future[bool]") -> None:
+            if not future.result():
+                logging.warning(
+                    "Piece #%d from %s failed integrity check", progress.index, peer
+                )
+                picker.requeue(progress.work)
+                bad_piece.set()
+                return
+            if not picker.complete(progress.index):
+                return
+            result = PieceResult(index=progress.index, data=progress.buf)
+            while stopped is None or not stopped.is_set():
                 try:
-                    work = work_queue.get(timeout=5)
-                except queue.Empty:
-                    return
-                if work is None:
-                    work_queue.put(None)
+                    results.put(result, timeout=1)
                     return
-                if not client.bitfield.has_piece(work.index):
-                    work_queue.put(work)
+                except queue.Full:
                     continue
+
+        try:
+            with client:
+                logging.info("Connected to %s", peer)
+                client.send_interested()
+
+                scheduler = PeerScheduler(client, picker, pipeline, buffers)
+                if table is not None:
+                    table.add(peer, scheduler)
                 try:
-                    data = attempt_download_piece(client, work)
-                    check_integrity(work, data)
+                    while not bad_piece.is_set():
+                        if stopped is not None and stopped.is_set():
+                            break
+                        if picker.done:
+                            if not self.seed or self.is_seed(client.bitfield):
+                                break
+                        elif scheduler.idle:
+                            work = picker.pick(client.bitfield)
+                            if work is not None:
+                                scheduler.adopt(work)
+                        for index in scheduler.take_haves():
+                            client.send_have(index)
+                        cancels = scheduler.cancellations()
+                        client.send_requests(scheduler.next_requests(), cancels)
+                        # With nothing to fetch, keep serving the peer's
+                        # requests while polling the picker for new work.
+                        waiting = scheduler.idle and not picker.done
+                        client.conn.settimeout(IDLE_POLL if waiting else 30)
+                        try:
+                            msg = client.read(scheduler)
+                        except socket.timeout:
+                            if waiting:
+                                continue
+                            # A quiet leecher is fine once we only seed.
+                            if not picker.done:
+                                raise
+                            client.send_keep_alive()
+                            continue
+                        for progress in scheduler.handle(msg):
+                            future = hasher.verify(progress.work, progress.buf)
+                            future.add_done_callback(partial(on_verified, progress))
+                        if server is not None:
+                            for index, begin, length in scheduler.take_uploads():
+                                ranges = server.block_ranges(index, begin, length)
+                                if ranges is not None:
+                                    client.send_block(index, begin, ranges)
+                                    scheduler.uploaded += length
                 except Exception as exc:
-                    logging.warning(
-                        "Piece #%d failed from %s: %s", work.index, peer, exc
-                    )
-                    work_queue.put(work)
-                    return
+                    # A connection shut down by the stopping download is not news.
+                    if stopped is None or not stopped.is_set():
+                        logging.warning("Download from %s failed: %s", peer, exc)
+                finally:
+                    if table is not None:
+                        table.remove(peer)
+                    scheduler.release()
+                # Data that failed verification does not count in the peer's favour.
+                if not bad_piece.is_set():
+                    downloaded = scheduler.downloaded
+        finally:
+            picker.remove_peer(client.bitfield)
+            if manager is not None:
+                manager.closed(peer, downloaded)
 
-                client.send_have(work.index)
-                results.put(PieceResult(index=work.index, data=data))
+    def connection_manager(
+        self, on_change: Optional[Callable[[], None]] = None
+    ) -> ConnectionManager:
+        manager = ConnectionManager(self.max_connections, self.max_dials, on_change)
+        manager.add(self.peers)
+        return manager
 
-    def download(self) -> bytes:
-        if not self.peers:
-            raise ValueError("No peers available to download from")
-        work_queue: "queue.Queue[PieceWork | None]" = queue.Queue()
-        results: "queue.Queue[PieceResult]" = queue.Queue()
-        for index, hash_bytes in enumerate(self.piece_hashes):
-            length = self._piece_size(index)
-            work_queue.put(PieceWork(index=index, hash_bytes=hash_bytes, length=length))
+    def announce_in_background(
+        self,
+        transfer: Transfer,
+        server: PieceServer,
+        manager: ConnectionManager,
+        on_peers: Optional[Callable[[List[Peer]], None]] = None,
+    ) -> Optional[Announcer]:
+        """Keep :attr:`announcer` announcing; new peers go to *manager*
+        (through *on_peers*, if given)."""
+        if self.announcer is None:
+            return None
+        return self.announcer.start(
+            stats=lambda: replace(transfer, uploaded=server.uploaded),
+            on_peers=on_peers or manager.add,
+            needs_peers=lambda: manager.wants_peers,
+        )
 
-        threads = []
-        for peer in self.peers:
-            thread = threading.Thread(
-                target=self._start_worker, args=(peer, work_queue, results), daemon=True
-            )
-            thread.start()
-            threads.append(thread)
+    def listen(self, on_peer: PeerHandler) -> Optional[Listener]:
+        """Start accepting peers on :attr:`port`, or return None if it is taken."""
+        assert self.port is not None
+        try:
+            listener = Listener(self.port, self.info_hash, self.peer_id, on_peer)
+        except OSError as exc:
+            logging.warning("Cannot listen on port %d: %s", self.port, exc)
+            return None
+        return listener.start()
 
-        buf = bytearray(self.length)
-        completed = 0
+    def is_seed(self, bitfield: BitField) -> bool:
+        """True if *bitfield* has every piece, i.e. the peer needs nothing from us."""
+        return all(bitfield.has_piece(i) for i in range(len(self.piece_hashes)))
+
+    def piece_server(
+        self, storage: Storage, journal: Optional[ResumeJournal] = None
+    ) -> PieceServer:
+        """Serve the pieces already in *journal*, and others as they land."""
+        if journal is not None:
+            have = BitField(bytearray(journal.bitfield.raw()))
+        else:
+            have = BitField(bytearray((len(self.piece_hashes) + 7) // 8))
+        return PieceServer(storage, self.piece_length, self.length, have)
+
+    def missing_work(self, journal: Optional[ResumeJournal] = None) -> List[PieceWork]:
+        """Return the pieces that still need downloading."""
+        work = []
+        for index, hash_bytes in enumerate(self.piece_hashes):
+            if journal is not None and journal.has_piece(index):
+                continue
+            length = self._piece_size(index)
+            work.append(PieceWork(index=index, hash_bytes=hash_bytes, length=length))
         total_pieces = len(self.piece_hashes)
-        while completed < total_pieces:
-            result = results.get()
-            begin, end = self._piece_bounds(result.index)
-            buf[begin:end] = result.data
-            completed += 1
-            percent = (completed / total_pieces) * 100
-            bar = self._format_progress_bar(percent)
-            colored_percent = colorize(f"{percent:05.2f}%", "cyan" if percent < 100 else "green", bold=True)
+        if len(work) < total_pieces:
             logging.info(
-                "%s %s Downloaded piece #%d (%d/%d)",
-                colored_percent,
-                bar,
-                result.index,
-                completed,
+                "Resuming with %d/%d pieces on disk",
+                total_pieces - len(work),
                 total_pieces,
             )
+        if work and not self.peers and self.port is None and self.announcer is None:
+            raise ValueError("No peers available to download from")
+        return work
 
-        for _ in threads:
-            work_queue.put(None)
-        for thread in threads:
-            thread.join(timeout=1)
+    def store_result(
+        self,
+        storage: Storage,
+        journal: Optional[ResumeJournal],
+        result: PieceResult,
+        completed: int,
+        server: Optional[PieceServer] = None,
+        transfer: Optional[Transfer] = None,
+        schedulers: Iterable[PeerScheduler] = (),
+    ) -> None:
+        """Persist a verified piece and report progress; *completed* includes it.
+
+        Once the piece can be served, a HAVE is queued on every connection
+        in *schedulers*.
+        """
+        begin, _ = self._piece_bounds(result.index)
+        storage.write(begin, result.data)
+        if journal is not None:
+            journal.mark(result.index, storage.paths(begin, len(result.data)))
+        if server is not None:
+            server.add_piece(result.index)
+        for scheduler in schedulers:
+            scheduler.announce(result.index)
+        if transfer is not None:
+            transfer.downloaded += len(result.data)
+            transfer.left -= len(result.data)
+        total_pieces = len(self.piece_hashes)
+        percent = (completed / total_pieces) * 100
+        bar = self._format_progress_bar(percent)
+        colored_percent = colorize(f"{percent:05.2f}%", "cyan" if percent < 100 else "green", bold=True)
+        logging.info(
+            "%s %s Downloaded piece #%d (%d/%d)",
+            colored_percent,
+            bar,
+            result.index,
+            completed,
+            total_pieces,
+        )
+
+    def download(
+        self, storage: Storage, journal: Optional[ResumeJournal] = None
+    ) -> None:
+        """Download every piece, writing each one to *storage* once verified.
+
+        Pieces already recorded in *journal* are skipped, and every newly
+        written piece is marked there so an interrupted run can resume.
+        Verified pieces are uploaded to peers that request them; with
+        :attr:`seed` set, this keeps going after the download completes
+        until every peer has disconnected. Peers are dialed through a
+        :class:`connections.ConnectionManager`, which redials dropped ones.
+        """
+        missing = self.missing_work(journal)
+        if not missing and not self.seed:
+            return
+        picker = PiecePicker(missing, len(self.piece_hashes))
+        # Bounded so that slow disks apply backpressure to the workers rather
+        # than letting finished pieces pile up in memory.
+        results: "queue.Queue[PieceResult]" = queue.Queue(
+            maxsize=max(len(self.peers), 1)
+        )
+
+        buffers = self.piece_buffers(storage)
+        server = self.piece_server(storage, journal)
+        transfer = Transfer(left=sum(work.length for work in missing))
+        table = PeerTable()
+        stop_choking = threading.Event()
+
+        def run_choker() -> None:
+            choker: Choker[PeerScheduler] = Choker()
+            while not stop_choking.wait(self.choke_interval):
+                rechoke(choker, table.snapshot(), seeding=picker.done)
+
+        # Set before the hash pool shuts down, so that no hashing thread is
+        # left blocked on a full results queue.
+        stopped = threading.Event()
+        with HashPool(self.hash_workers) as hasher, ExitStack() as stack:
+            stack.callback(stopped.set)
+            choker_thread = threading.Thread(
+                target=run_choker, name="choker", daemon=True
+            )
+            choker_thread.start()
+            stack.callback(choker_thread.join)
+            stack.callback(stop_choking.set)
+            run_peer = partial(
+                self._start_worker,
+                picker=picker,
+                hasher=hasher,
+                results=results,
+                buffers=buffers,
+                server=server,
+                table=table,
+                stopped=stopped,
+            )
+            manager = self.connection_manager()
+
+            def accept_peer(sock: socket.socket, peer: Peer) -> None:
+                if not manager.accept():
+                    logging.info("Rejecting %s: too many connections", peer)
+                    sock.close()
+                    return
+                try:
+                    run_peer(peer, sock=sock)
+                finally:
+                    manager.release()
+
+            listener = None
+            if self.port is not None:
+                listener = self.listen(accept_peer)
+                if listener is not None:
+                    stack.enter_context(listener)
+            announcer = self.announce_in_background(transfer, server, manager)
+            if announcer is not None:
+                stack.callback(announcer.close)
+            threads: List[threading.Thread] = []
+
+            def run_dialer() -> None:
+                while not stopped.is_set():
+                    # Once complete, a seed still reaches every peer once but
+                    # no longer redials ones that left.
+                    done = picker.done
+                    if done and not (self.seed and manager.untried):
+                        return
+                    peer = manager.wait_dial(timeout=1, fresh_only=done)
+                    if peer is None:
+                        continue
+                    thread = threading.Thread(
+                        target=run_peer,
+                        name=f"peer {peer}",
+                        args=(peer,),
+                        kwargs={"manager": manager},
+                    )
+                    thread.daemon = True
+                    thread.start()
+                    threads.append(thread)
+
+            dialer = threading.Thread(target=run_dialer, name="dialer", daemon=True)
+            dialer.start()
+
+            def stop_peers() -> None:
+                # Also runs when the download raised: without it the dialer
+                # keeps redialing peers into workers that fail at once.
+                stopped.set()
+                dialer.join()
+                table.disconnect()
+                for thread in threads:
+                    thread.join()
+
+            stack.callback(stop_peers)
+
+            total_pieces = len(self.piece_hashes)
+            completed = total_pieces - len(missing)
+            while completed < total_pieces:
+                try:
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    # Without a listener or announcer no new peers can turn up.
+                    if listener is None and announcer is None and manager.exhausted:
+                        raise RuntimeError(
+                            "All peers disconnected before the download finished"
+                        ) from None
+                    continue
+                completed += 1
+                self.store_result(
+                    storage,
+                    journal,
+                    result,
+                    completed,
+                    server,
+                    transfer,
+                    table.snapshot().values(),
+                )
 
-        return bytes(buf)
+            if missing and announcer is not None:
+                announcer.completed()
+            dialer.join()
+            if self.seed:
+                logging.info("Download complete; seeding until peers disconnect")
+                for thread in threads:
+                    thread.join()
+                if listener is not None:
+                    listener.join_sessions()
+                logging.info("Uploaded %d bytes", server.uploaded)
+            log_hash_stats(hasher)
 
     def _format_progress_bar(self, percent: float, width: int = 30) -> str:
         filled = int(width * percent / 100)
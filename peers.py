@@ -3,34 +3,89 @@
 from __future__ import annotations
 
 import ipaddress
+import logging
+import socket
 import struct
 from dataclasses import dataclass
 from typing import Iterable, List
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, init=False)
 class Peer:
-    ip: str
+    """A peer address: its IPv4 or IPv6 address packed to 4 or 16 bytes.
+
+    Constructed from either the packed bytes or a textual IP. IPv4-mapped
+    IPv6 addresses (as reported by dual-stack sockets) are stored as IPv4,
+    so one peer compares equal however it reached us.
+    """
+
+    __slots__ = ("packed", "port")
+
+    packed: bytes
     port: int
 
+    def __init__(self, ip: str | bytes, port: int) -> None:
+        addr = ipaddress.ip_address(ip)
+        if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped is not None:
+            addr = addr.ipv4_mapped
+        object.__setattr__(self, "packed", addr.packed)
+        object.__setattr__(self, "port", port)
+
+    @property
+    def ip(self) -> str:
+        return str(ipaddress.ip_address(self.packed))
+
+    @property
+    def family(self) -> socket.AddressFamily:
+        return socket.AF_INET if len(self.packed) == 4 else socket.AF_INET6
+
     def address(self) -> tuple[str, int]:
         return self.ip, self.port
 
     def __str__(self) -> str:  # pragma: no cover - trivial
+        if self.family == socket.AF_INET6:
+            return f"[{self.ip}]:{self.port}"
         return f"{self.ip}:{self.port}"
 
 
-def parse_compact_peers(peers_bin: bytes) -> List[Peer]:
-    peer_size = 6
+def _parse_compact(peers_bin: bytes, addr_size: int) -> List[Peer]:
+    peer_size = addr_size + 2
     if len(peers_bin) % peer_size != 0:
         raise ValueError("Received malformed peers")
     peers: List[Peer] = []
     for offset in range(0, len(peers_bin), peer_size):
-        ip_raw = peers_bin[offset : offset + 4]
-        port_raw = peers_bin[offset + 4 : offset + peer_size]
-        ip_addr = str(ipaddress.IPv4Address(ip_raw))
-        (port,) = struct.unpack(">H", port_raw)
-        peers.append(Peer(ip=ip_addr, port=port))
+        (port,) = struct.unpack_from(">H", peers_bin, offset + addr_size)
+        peers.append(Peer(peers_bin[offset : offset + addr_size], port))
     return peers
 
 
+def parse_compact_peers(peers_bin: bytes) -> List[Peer]:
+    """Parse a BEP 23 ``peers`` string of 6-byte IPv4 entries."""
+    return _parse_compact(peers_bin, 4)
+
+
+def parse_compact_peers6(peers_bin: bytes) -> List[Peer]:
+    """Parse a BEP 7 ``peers6`` string of 18-byte IPv6 entries."""
+    return _parse_compact(peers_bin, 16)
+
+
+def parse_peer_dicts(entries: Iterable[object]) -> List[Peer]:
+    """Parse the original, non-compact list of ``{ip, port}`` dictionaries.
+
+    Entries naming a host rather than an IP address are skipped, as are
+    malformed ones.
+    """
+    peers: List[Peer] = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        ip, port = entry.get(b"ip"), entry.get(b"port")
+        if not isinstance(ip, bytes) or not isinstance(port, int):
+            continue
+        if not 0 < port < 65536:
+            continue
+        try:
+            peers.append(Peer(ip.decode("ascii"), port))
+        except ValueError:
+            logging.debug("Skipping non-IP peer address %r", ip)
+    return peers
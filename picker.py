@@ -0,0 +1,203 @@
+"""Rarest-first assignment of pending pieces to peers."""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+from typing import TYPE_CHECKING, Callable, Collection, Dict, Iterable, List, Optional
+
+from bitfield import BitField
+from pipeline import MAX_BLOCK_SIZE
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle with p2p
+    from p2p import PieceWork
+
+# Endgame starts once every piece is assigned and no more than this many
+# blocks are still to be received; from then on idle peers duplicate
+# in-flight pieces.
+ENDGAME_BLOCKS = 64
+
+
+def _block_count(work: "PieceWork") -> int:
+    return -(-work.length // MAX_BLOCK_SIZE)
+
+
+class PiecePicker:
+    """Tracks swarm availability and hands each peer its rarest useful piece.
+
+    All methods are thread-safe. Threaded callers may block in
+    :meth:`wait_pick`; event-loop code calls :meth:`pick` and uses
+    *on_change* to learn when a retry might succeed.
+
+    Near the end of the download the picker enters endgame: pieces already
+    assigned to one peer are handed to others too, and whichever copy
+    verifies first wins (see :meth:`complete`).
+    """
+
+    def __init__(
+        self,
+        work: Iterable["PieceWork"],
+        piece_count: int,
+        on_change: Optional[Callable[[], None]] = None,
+        endgame_blocks: int = ENDGAME_BLOCKS,
+    ) -> None:
+        self._pending: Dict[int, "PieceWork"] = {w.index: w for w in work}
+        # Assigned pieces and how many peers are currently fetching each.
+        self._active: Dict[int, "PieceWork"] = {}
+        self._holders: Dict[int, int] = {}
+        # Blocks received so far for each assigned piece.
+        self._received: Dict[int, int] = {}
+        self._availability: List[int] = [0] * piece_count
+        self._remaining = len(self._pending)
+        self._remaining_blocks = sum(_block_count(w) for w in self._pending.values())
+        self._endgame_blocks = endgame_blocks
+        self._endgame = False
+        self._cond = threading.Condition()
+        self._on_change = on_change
+
+    @property
+    def done(self) -> bool:
+        with self._cond:
+            return self._remaining == 0
+
+    @property
+    def in_endgame(self) -> bool:
+        with self._cond:
+            return self._endgame
+
+    def availability(self, index: int) -> int:
+        with self._cond:
+            return self._availability[index]
+
+    def is_complete(self, index: int) -> bool:
+        """True once *index* is verified, so duplicate fetches can stop."""
+        with self._cond:
+            return index not in self._pending and index not in self._active
+
+    def _changed(self) -> None:
+        self._cond.notify_all()
+        if self._on_change is not None:
+            self._on_change()
+
+    def add_peer(self, bitfield: BitField) -> None:
+        with self._cond:
+            for index in range(len(self._availability)):
+                if bitfield.has_piece(index):
+                    self._availability[index] += 1
+            self._changed()
+
+    def remove_peer(self, bitfield: BitField) -> None:
+        with self._cond:
+            for index in range(len(self._availability)):
+                if bitfield.has_piece(index):
+                    self._availability[index] -= 1
+
+    def add_have(self, index: int) -> None:
+        """Count a HAVE announcement; the caller filters duplicates."""
+        with self._cond:
+            if 0 <= index < len(self._availability):
+                self._availability[index] += 1
+                self._changed()
+
+    def pick(
+        self, bitfield: BitField, exclude: Collection[int] = ()
+    ) -> Optional["PieceWork"]:
+        """Assign the rarest pending piece *bitfield* has, if any.
+
+        In endgame an already assigned piece not in *exclude* may be
+        returned, preferring the one with the fewest peers on it.
+        """
+        with self._cond:
+            best = self._rarest(self._pending, bitfield, self._availability)
+            if best is not None:
+                work = self._pending.pop(best)
+                self._active[best] = work
+                self._holders[best] = 1
+                self._received[best] = 0
+                return work
+            if not self._endgame:
+                if self._pending or self._remaining_blocks > self._endgame_blocks:
+                    return None
+                self._endgame = True
+                logging.info(
+                    "Entering endgame with %d pieces outstanding", len(self._active)
+                )
+            candidates = {i: w for i, w in self._active.items() if i not in exclude}
+            best = self._rarest(candidates, bitfield, self._holders)
+            if best is None:
+                return None
+            self._holders[best] += 1
+            return self._active[best]
+
+    @staticmethod
+    def _rarest(
+        pieces: Dict[int, "PieceWork"],
+        bitfield: BitField,
+        counts: List[int] | Dict[int, int],
+    ) -> Optional[int]:
+        best: Optional[int] = None
+        best_count = 0
+        ties = 0
+        for index in pieces:
+            if not bitfield.has_piece(index):
+                continue
+            count = counts[index]
+            if best is None or count < best_count:
+                best, best_count, ties = index, count, 1
+            elif count == best_count:
+                # Reservoir sample among equally rare pieces so peers
+                # with identical bitfields do not all chase one piece.
+                ties += 1
+                if random.randrange(ties) == 0:
+                    best = index
+        return best
+
+    def wait_pick(self, bitfield: BitField, timeout: float) -> Optional["PieceWork"]:
+        """Block until :meth:`pick` succeeds, the download ends or *timeout*."""
+        with self._cond:
+            work: Optional["PieceWork"] = None
+
+            def ready() -> bool:
+                nonlocal work
+                if self._remaining == 0:
+                    return True
+                work = self.pick(bitfield)
+                return work is not None
+
+            self._cond.wait_for(ready, timeout=timeout)
+            return work
+
+    def block_received(self, index: int) -> None:
+        """Count a newly received block of the assigned piece *index*."""
+        with self._cond:
+            work = self._active.get(index)
+            if work is not None and self._received[index] < _block_count(work):
+                self._received[index] += 1
+                self._remaining_blocks -= 1
+
+    def requeue(self, work: "PieceWork") -> None:
+        """Return an assigned piece after a failed or abandoned attempt."""
+        with self._cond:
+            if work.index not in self._active:
+                return
+            self._holders[work.index] -= 1
+            if self._holders[work.index] == 0:
+                del self._active[work.index]
+                del self._holders[work.index]
+                # Whatever was received is discarded with the attempt.
+                self._remaining_blocks += self._received.pop(work.index)
+                self._pending[work.index] = work
+            self._changed()
+
+    def complete(self, index: int) -> bool:
+        """Mark *index* verified; False if another peer's copy won already."""
+        with self._cond:
+            work = self._active.pop(index, None)
+            if work is None:
+                return False
+            del self._holders[index]
+            self._remaining -= 1
+            self._remaining_blocks -= _block_count(work) - self._received.pop(index)
+            self._changed()
+            return True
@@ -0,0 +1,146 @@
+"""Adaptive request pipelining sized to each connection's bandwidth-delay product."""
+
+from __future__ import annotations
+
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+MAX_BLOCK_SIZE = 16384
+MIN_BACKLOG = 5
+MAX_BACKLOG = 250
+
+# The target depth is this multiple of the measured bandwidth-delay product,
+# so the link stays busy while the rate estimate lags. The surplus queues at
+# the peer and inflates every RTT sample taken meanwhile, which is why the
+# path delay is only re-measured after a drain (see MIN_RTT_LIFETIME).
+BDP_GAIN = 2.0
+# Shortest interval over which arrival rate is sampled.
+MIN_RATE_WINDOW = 0.1
+# When the path-delay estimate has not been matched for this long, the
+# pipeline drains to its floor and re-measures it, as BBR's ProbeRTT does,
+# so route changes are seen without adopting our own queueing delay.
+MIN_RTT_LIFETIME = 10.0
+# A drain samples round trips for at least this long (or one min_rtt).
+PROBE_RTT_DURATION = 0.2
+RATE_SMOOTHING = 0.5
+
+
+class RequestPipeline:
+    """Tracks outstanding requests on one connection and picks a queue depth.
+
+    Every block's round trip is timed from REQUEST to PIECE. The lowest
+    sample approximates the path delay; together with the smoothed block
+    arrival rate it gives the bandwidth-delay product that :attr:`depth`
+    follows, clamped to ``[floor, ceiling]``. A minimum that has stood for
+    :data:`MIN_RTT_LIFETIME` is refreshed by briefly dropping to the floor
+    and timing requests sent once the queue has drained.
+    """
+
+    def __init__(
+        self,
+        floor: int = MIN_BACKLOG,
+        ceiling: int = MAX_BACKLOG,
+        block_size: int = MAX_BLOCK_SIZE,
+    ) -> None:
+        if not 1 <= floor <= ceiling:
+            raise ValueError("Pipeline floor must be between 1 and ceiling")
+        self.floor = floor
+        self.ceiling = ceiling
+        self.block_size = block_size
+        self.depth = floor
+        self.rate = 0.0
+        self.min_rtt: Optional[float] = None
+        self._min_rtt_at = 0.0
+        self._sent: Dict[Tuple[int, int], float] = {}
+        self._window_start: Optional[float] = None
+        self._window_bytes = 0
+        # Set while draining to re-measure min_rtt.
+        self._probing = False
+        self._drained_at: Optional[float] = None
+        self._probe_rtt: Optional[float] = None
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._sent)
+
+    def on_request(self, index: int, begin: int, now: Optional[float] = None) -> None:
+        self._sent[(index, begin)] = time.monotonic() if now is None else now
+
+    def on_block(
+        self, index: int, begin: int, length: int, now: Optional[float] = None
+    ) -> None:
+        now = time.monotonic() if now is None else now
+        sent = self._sent.pop((index, begin), None)
+        if sent is not None:
+            rtt = now - sent
+            if self.min_rtt is None or rtt <= self.min_rtt:
+                self.min_rtt = rtt
+                self._min_rtt_at = now
+            elif self._drained_at is not None and sent >= self._drained_at:
+                self._probe_rtt = min(rtt, self._probe_rtt or rtt)
+        if self._probing:
+            self._probe(now)
+            return
+        if self.min_rtt is not None and now - self._min_rtt_at > MIN_RTT_LIFETIME:
+            self._start_probe(now)
+            return
+
+        if self._window_start is None:
+            self._window_start = now
+            return
+        self._window_bytes += length
+        elapsed = now - self._window_start
+        if elapsed < max(self.min_rtt or 0.0, MIN_RATE_WINDOW):
+            return
+        sample = self._window_bytes / elapsed
+        if self.rate:
+            self.rate += RATE_SMOOTHING * (sample - self.rate)
+        else:
+            self.rate = sample
+        self._window_start = now
+        self._window_bytes = 0
+        self._update_depth()
+
+    def on_cancel(self, index: int, begin: int) -> None:
+        self._sent.pop((index, begin), None)
+
+    def _start_probe(self, now: float) -> None:
+        self._probing = True
+        self._drained_at = None
+        self._probe_rtt = None
+        self.depth = self.floor
+        self._probe(now)
+
+    def _probe(self, now: float) -> None:
+        """Advance a drain: wait for the queue to empty, then sample for a while."""
+        if self._drained_at is None:
+            if len(self._sent) <= self.floor:
+                self._drained_at = now
+            return
+        refreshed = self._min_rtt_at >= self._drained_at
+        if not refreshed and self._probe_rtt is None:
+            return
+        if now - self._drained_at < max(PROBE_RTT_DURATION, self.min_rtt or 0.0):
+            return
+        if not refreshed:
+            self.min_rtt = self._probe_rtt
+        self._min_rtt_at = now
+        self._probing = False
+        self._drained_at = None
+        self._window_start = None
+        self._window_bytes = 0
+        self._update_depth()
+
+    def reset(self) -> None:
+        """Forget outstanding requests, e.g. after the peer choked us."""
+        self._sent.clear()
+        self._window_start = None
+        self._window_bytes = 0
+
+    def _update_depth(self) -> None:
+        if self.min_rtt is None:
+            return
+        bdp = self.rate * self.min_rtt / self.block_size
+        target = math.ceil(BDP_GAIN * bdp)
+        self.depth = max(self.floor, min(self.ceiling, target))
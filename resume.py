@@ -0,0 +1,180 @@
+"""Fast-resume journal recording which pieces are already on disk."""
+
+from __future__ import annotations
+
+import logging
+import os
+import struct
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from bitfield import BitField
+
+JOURNAL_SUFFIX = ".resume"
+
+_MAGIC = b"PTRJ"
+_VERSION = 1
+# magic, version, info_hash, total data size, newest data file mtime (ns)
+_HEADER = struct.Struct(">4sB20sQQ")
+
+
+def _bitfield_size(piece_count: int) -> int:
+    return (piece_count + 7) // 8
+
+
+def _stamp(stats: Dict[str, Tuple[int, int]]) -> Tuple[int, int]:
+    """Combine per-file ``(size, mtime_ns)`` into the pair stored in the header."""
+    return (
+        sum(size for size, _ in stats.values()),
+        max((mtime for _, mtime in stats.values()), default=0),
+    )
+
+
+def _stat(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _parse_journal(
+    raw: bytes,
+    data_files: Sequence[str],
+    info_hash: bytes,
+    piece_count: int,
+    check_mtime: bool = True,
+) -> Optional[BitField]:
+    """Return the stored bitfield if *raw* still describes *data_files*."""
+    if len(raw) != _HEADER.size + _bitfield_size(piece_count):
+        return None
+    magic, version, stored_hash, size, mtime_ns = _HEADER.unpack_from(raw)
+    if magic != _MAGIC or version != _VERSION or stored_hash != info_hash:
+        return None
+    try:
+        stats = {path: _stat(path) for path in data_files}
+    except OSError:
+        return None
+    current_size, current_mtime_ns = _stamp(stats)
+    if current_size != size or (check_mtime and current_mtime_ns != mtime_ns):
+        return None
+    return BitField.from_bytes(raw[_HEADER.size :])
+
+
+@dataclass
+class ResumeJournal:
+    """Completed-piece bitfield persisted next to the output file.
+
+    The journal is only trusted while the output files keep the total size
+    and newest mtime recorded alongside the bitfield, so edits made to them
+    outside the client invalidate it. *data_path* is the output file, or
+    the directory of a multi-file torrent whose files are *data_files*.
+
+    Storage that writes in place, such as a memory mapping, dirties the
+    file between marks, so its journal is loaded with ``check_mtime=False``
+    and only the size is compared.
+    """
+
+    path: str
+    data_path: str
+    info_hash: bytes
+    piece_count: int
+    bitfield: BitField
+    data_files: Sequence[str] = ()
+
+    @classmethod
+    def load(
+        cls,
+        data_path: str,
+        info_hash: bytes,
+        piece_count: int,
+        data_files: Optional[Sequence[str]] = None,
+        check_mtime: bool = True,
+    ) -> "ResumeJournal":
+        data_files = list(data_files) if data_files is not None else [data_path]
+        path = data_path + JOURNAL_SUFFIX
+        try:
+            with open(path, "rb") as handle:
+                raw = handle.read()
+        except FileNotFoundError:
+            raw = b""
+        bitfield = _parse_journal(
+            raw, data_files, info_hash, piece_count, check_mtime
+        )
+        if bitfield is None:
+            if raw:
+                logging.warning("Ignoring stale resume journal %s", path)
+            bitfield = BitField(bytearray(_bitfield_size(piece_count)))
+        return cls(
+            path=path,
+            data_path=data_path,
+            info_hash=info_hash,
+            piece_count=piece_count,
+            bitfield=bitfield,
+            data_files=data_files,
+        )
+
+    def __post_init__(self) -> None:
+        if not self.data_files:
+            self.data_files = [self.data_path]
+        self._fd: Optional[int] = None
+        self._stats: Dict[str, Tuple[int, int]] = {}
+
+    def has_piece(self, index: int) -> bool:
+        return self.bitfield.has_piece(index)
+
+    def completed(self) -> int:
+        return sum(1 for index in range(self.piece_count) if self.has_piece(index))
+
+    def _header(self, touched: Sequence[str] = ()) -> bytes:
+        # Only files just written can have changed, so a piece restats the
+        # one or two files it landed in rather than every file.
+        paths = touched if touched and self._stats else self.data_files
+        for path in paths:
+            self._stats[path] = _stat(path)
+        size, mtime_ns = _stamp(self._stats)
+        return _HEADER.pack(_MAGIC, _VERSION, self.info_hash, size, mtime_ns)
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def save(self) -> None:
+        """Rewrite the whole journal against the current state of the data files."""
+        fd = self._open()
+        payload = self._header(self.data_files) + self.bitfield.raw()
+        os.pwrite(fd, payload, 0)
+        os.ftruncate(fd, len(payload))
+
+    def mark(self, index: int, touched: Sequence[str] = ()) -> None:
+        """Record piece *index* as written; call after the data hits storage.
+
+        *touched* names the files the piece was written to; by default all
+        data files are checked again.
+        """
+        self.bitfield.set_piece(index)
+        fd = self._open()
+        byte_index = index // 8
+        chunk = self.bitfield.data[byte_index : byte_index + 1]
+        os.pwrite(fd, chunk, _HEADER.size + byte_index)
+        os.pwrite(fd, self._header(touched), 0)
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._fd = None
+
+    def remove(self) -> None:
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "ResumeJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
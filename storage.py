@@ -0,0 +1,287 @@
+"""Storage backends that write verified pieces straight to disk."""
+
+from __future__ import annotations
+
+import errno
+import logging
+import mmap
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import List, Protocol, Sequence, Tuple
+
+# (file descriptor, offset within that file, length)
+FileRange = Tuple[int, int, int]
+
+
+class Storage(Protocol):
+    """Destination for torrent payload addressed by absolute byte offset."""
+
+    length: int
+
+    def write(self, offset: int, data: bytes | bytearray | memoryview) -> None:
+        ...  # pragma: no cover - protocol definition
+
+    def read(self, offset: int, length: int) -> bytes:
+        ...  # pragma: no cover - protocol definition
+
+    def paths(self, offset: int, length: int) -> List[str]:
+        """Files on disk holding the given range."""
+        ...  # pragma: no cover - protocol definition
+
+    def file_ranges(self, offset: int, length: int) -> List[FileRange]:
+        """``(fd, file offset, length)`` parts of the range, e.g. for sendfile."""
+        ...  # pragma: no cover - protocol definition
+
+    def close(self) -> None:
+        ...  # pragma: no cover - protocol definition
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    """One file of a torrent, placed at *offset* in the concatenated payload."""
+
+    path: str
+    length: int
+    offset: int
+
+
+@dataclass(frozen=True)
+class FileSpan:
+    """The part of a payload range that falls inside ``files[file]``."""
+
+    file: int
+    offset: int
+    length: int
+
+
+class SpanMapper:
+    """Translates payload byte ranges to per-file spans.
+
+    File start offsets are kept sorted, so the first file of a range is
+    found by bisection and a range crossing *n* files yields *n* spans.
+    Empty files never hold data and are left out of the index.
+    """
+
+    def __init__(self, files: Sequence[FileEntry]) -> None:
+        self.files = list(files)
+        self.length = sum(entry.length for entry in self.files)
+        self._indexes = [i for i, entry in enumerate(self.files) if entry.length]
+        self._starts = [self.files[i].offset for i in self._indexes]
+
+    def spans(self, offset: int, length: int) -> List[FileSpan]:
+        _check_range(offset, length, self.length)
+        spans: List[FileSpan] = []
+        slot = bisect_right(self._starts, offset) - 1
+        end = offset + length
+        while offset < end:
+            entry = self.files[self._indexes[slot]]
+            within = offset - entry.offset
+            size = min(entry.length - within, end - offset)
+            spans.append(FileSpan(self._indexes[slot], within, size))
+            offset += size
+            slot += 1
+        return spans
+
+
+def preallocate(fd: int, length: int, sparse: bool = False) -> None:
+    """Size *fd* to exactly *length* bytes and reserve its blocks if possible.
+
+    Existing contents below *length* are preserved so partially downloaded
+    files can be resumed. With *sparse*, or on filesystems without
+    ``posix_fallocate`` support, the file is left sparse.
+    """
+    os.ftruncate(fd, length)
+    if sparse or length == 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, 0, length)
+    except OSError as exc:
+        if exc.errno not in (errno.EINVAL, errno.EOPNOTSUPP, errno.ENOSYS):
+            raise
+
+
+def _check_range(offset: int, size: int, length: int) -> None:
+    if offset < 0 or offset + size > length:
+        raise ValueError(f"Range {offset}+{size} outside storage of {length} bytes")
+
+
+@dataclass
+class FileStorage:
+    """Single preallocated file written with positional I/O."""
+
+    path: str
+    length: int
+    sparse: bool = False
+
+    def __post_init__(self) -> None:
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            preallocate(self.fd, self.length, self.sparse)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def write(self, offset: int, data: bytes | bytearray | memoryview) -> None:
+        view = memoryview(data).cast("B")
+        _check_range(offset, len(view), self.length)
+        while view:
+            written = os.pwrite(self.fd, view, offset)
+            view = view[written:]
+            offset += written
+
+    def read(self, offset: int, length: int) -> bytes:
+        _check_range(offset, length, self.length)
+        chunks = bytearray()
+        while len(chunks) < length:
+            chunk = os.pread(self.fd, length - len(chunks), offset + len(chunks))
+            if not chunk:
+                raise EOFError("Unexpected EOF while reading from storage")
+            chunks.extend(chunk)
+        return bytes(chunks)
+
+    def paths(self, offset: int, length: int) -> List[str]:
+        return [self.path]
+
+    def file_ranges(self, offset: int, length: int) -> List[FileRange]:
+        _check_range(offset, length, self.length)
+        return [(self.fd, offset, length)]
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "FileStorage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MmapStorage:
+    """Single preallocated file accessed through a shared memory mapping.
+
+    :meth:`piece_view` exposes a writable window onto the file, so the
+    download engines can receive blocks straight into their final place and
+    hash them there; :meth:`write` recognises such views and skips the copy.
+    Data written this way is only trusted once the resume journal marks it.
+    """
+
+    def __init__(self, path: str, length: int, sparse: bool = False) -> None:
+        self.path = path
+        self.length = length
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            preallocate(self.fd, length, sparse)
+            # mmap cannot map an empty file; there is nothing to hold anyway.
+            self._map = mmap.mmap(self.fd, length) if length else None
+        except OSError:
+            os.close(self.fd)
+            raise
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    def piece_view(self, offset: int, length: int) -> memoryview:
+        _check_range(offset, length, self.length)
+        return self._view[offset : offset + length]
+
+    def write(self, offset: int, data: bytes | bytearray | memoryview) -> None:
+        if isinstance(data, memoryview) and data.obj is self._map:
+            # Came from piece_view for this very range: already in place.
+            return
+        view = memoryview(data).cast("B")
+        _check_range(offset, len(view), self.length)
+        self._view[offset : offset + len(view)] = view
+
+    def read(self, offset: int, length: int) -> bytes:
+        return bytes(self.piece_view(offset, length))
+
+    def paths(self, offset: int, length: int) -> List[str]:
+        return [self.path]
+
+    def file_ranges(self, offset: int, length: int) -> List[FileRange]:
+        # Stores through the mapping land in the same page cache that
+        # sendfile reads, so the descriptor sees them immediately.
+        _check_range(offset, length, self.length)
+        return [(self.fd, offset, length)]
+
+    def close(self) -> None:
+        if self._map is not None and not self._map.closed:
+            self._view.release()
+            try:
+                self._map.flush()
+                self._map.close()
+            except BufferError:
+                # A piece view is still referenced somewhere; the mapping
+                # is unmapped when the last one is garbage collected.
+                logging.debug("Deferring unmap of %s: views still exported", self.path)
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "MmapStorage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MultiFileStorage:
+    """The files of a multi-file torrent under *root*, written piece by piece.
+
+    Writes are split at file boundaries by a :class:`SpanMapper` and each
+    part goes to its file with positional I/O, so a piece spanning files
+    needs one ``pwrite`` per file and no payload-sized buffer.
+    """
+
+    def __init__(
+        self, root: str, files: Sequence[FileEntry], sparse: bool = False
+    ) -> None:
+        self.root = root
+        self.mapper = SpanMapper(files)
+        self.length = self.mapper.length
+        self._files: List[FileStorage] = []
+        try:
+            for entry in self.mapper.files:
+                path = os.path.join(root, entry.path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._files.append(FileStorage(path, entry.length, sparse))
+        except OSError:
+            self.close()
+            raise
+
+    def write(self, offset: int, data: bytes | bytearray | memoryview) -> None:
+        view = memoryview(data).cast("B")
+        position = 0
+        for span in self.mapper.spans(offset, len(view)):
+            self._files[span.file].write(
+                span.offset, view[position : position + span.length]
+            )
+            position += span.length
+
+    def read(self, offset: int, length: int) -> bytes:
+        return b"".join(
+            self._files[span.file].read(span.offset, span.length)
+            for span in self.mapper.spans(offset, length)
+        )
+
+    def paths(self, offset: int, length: int) -> List[str]:
+        return [self._files[span.file].path for span in self.mapper.spans(offset, length)]
+
+    def file_ranges(self, offset: int, length: int) -> List[FileRange]:
+        return [
+            (self._files[span.file].fd, span.offset, span.length)
+            for span in self.mapper.spans(offset, length)
+        ]
+
+    def close(self) -> None:
+        for storage in self._files:
+            storage.close()
+
+    def __enter__(self) -> "MultiFileStorage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
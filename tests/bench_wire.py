@@ -0,0 +1,130 @@
+"""Benchmark the peer wire receive path: read_exact, FrameReader and BlockSink.
+
+Run from the repository root with ``python -m tests.bench_wire``. Reports
+receive syscalls, user-space bytes copied and wall time per 16 KiB block.
+"""
+
+from __future__ import annotations
+
+import struct
+import time
+
+from message import (
+    Message,
+    MessageID,
+    parse_piece,
+    read_buffered_message,
+    read_message,
+)
+from wire import FrameReader
+
+BLOCK = 16384
+PIECE_LENGTH = 256 * 1024
+BLOCKS = 4096
+# Bytes the simulated kernel has ready per receive call.
+SOCKET_CHUNK = 64 * 1024
+
+
+class SimulatedSocket:
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.offset = 0
+        self.syscalls = 0
+
+    def recv(self, size: int) -> bytes:
+        self.syscalls += 1
+        size = min(size, SOCKET_CHUNK, len(self.data) - self.offset)
+        chunk = bytes(self.data[self.offset : self.offset + size])
+        self.offset += size
+        return chunk
+
+    def recv_into(self, buffer: memoryview) -> int:
+        self.syscalls += 1
+        size = min(len(buffer), SOCKET_CHUNK, len(self.data) - self.offset)
+        buffer[:size] = self.data[self.offset : self.offset + size]
+        self.offset += size
+        return size
+
+
+def build_stream() -> bytes:
+    block = bytes(range(256)) * (BLOCK // 256)
+    out = bytearray()
+    per_piece = PIECE_LENGTH // BLOCK
+    for n in range(BLOCKS):
+        payload = struct.pack(">II", n // per_piece, (n % per_piece) * BLOCK) + block
+        out += Message(MessageID.PIECE, payload).serialize()
+    return bytes(out)
+
+
+def bench_legacy(stream: bytes) -> tuple[int, int, float]:
+    sock = SimulatedSocket(stream)
+    buf = bytearray(PIECE_LENGTH)
+    copied = 0
+    started = time.perf_counter()
+    for _ in range(BLOCKS):
+        msg = read_message(sock)  # type: ignore[arg-type]
+        assert msg is not None
+        index = struct.unpack_from(">I", msg.payload)[0]
+        parse_piece(index, buf, msg)
+        body = len(msg.payload) + 1
+        # read_exact extends a bytearray and converts it to bytes for both
+        # the length prefix and the body, read_message slices off the ID,
+        # and parse_piece slices the data before copying it in.
+        copied += 2 * 4 + 2 * body + (body - 1) + 2 * (body - 9)
+    return sock.syscalls, copied, time.perf_counter() - started
+
+
+def bench_frame_reader(stream: bytes) -> tuple[int, int, float]:
+    sock = SimulatedSocket(stream)
+    reader = FrameReader(sock)  # type: ignore[arg-type]
+    buf = bytearray(PIECE_LENGTH)
+    copied = 0
+    started = time.perf_counter()
+    for _ in range(BLOCKS):
+        msg = read_buffered_message(reader)
+        assert msg is not None
+        index = struct.unpack_from(">I", msg.payload)[0]
+        copied += parse_piece(index, buf, msg)
+    return sock.syscalls, copied + reader.bytes_copied, time.perf_counter() - started
+
+
+class PieceSink:
+    def __init__(self) -> None:
+        self.buf = bytearray(PIECE_LENGTH)
+
+    def block_target(self, index: int, begin: int, length: int) -> memoryview:
+        return memoryview(self.buf)[begin : begin + length]
+
+    def block_received(self, index: int, begin: int, length: int) -> None:
+        pass
+
+
+def bench_block_sink(stream: bytes) -> tuple[int, int, float]:
+    sock = SimulatedSocket(stream)
+    reader = FrameReader(sock)  # type: ignore[arg-type]
+    sink = PieceSink()
+    started = time.perf_counter()
+    for _ in range(BLOCKS):
+        assert read_buffered_message(reader, sink) is None
+    # bytes_copied covers buffer-to-destination copies; blocks received
+    # straight into the destination are not copied in user space at all.
+    return sock.syscalls, reader.bytes_copied, time.perf_counter() - started
+
+
+def main() -> None:
+    stream = build_stream()
+    for name, bench in (
+        ("read_exact", bench_legacy),
+        ("FrameReader", bench_frame_reader),
+        ("BlockSink", bench_block_sink),
+    ):
+        syscalls, copied, elapsed = bench(stream)
+        print(
+            f"{name:>12}: {syscalls / BLOCKS:5.2f} syscalls/block, "
+            f"{copied / BLOCKS / 1024:6.1f} KiB copied/block, "
+            f"{elapsed / BLOCKS * 1e6:6.2f} us/block"
+        )
+
+
+if __name__ == "__main__":
+    main()
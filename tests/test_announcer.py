@@ -0,0 +1,168 @@
+import threading
+import unittest
+
+from announcer import RETRY_INTERVAL, UDP_TIMEOUT, Announcer
+from peers import Peer
+from tracker import AnnounceResponse, Transfer
+
+INFO_HASH = bytes(20)
+PEER_ID = bytes(range(20))
+
+
+class FakeTrackers:
+    """Answers announces from a table of URL -> response (or exception).
+
+    A URL listed in *gates* does not answer until its event is set.
+    """
+
+    def __init__(self, responses: dict, gates: dict | None = None) -> None:
+        self.responses = responses
+        self.gates = gates or {}
+        self.calls: list = []
+        self.timeouts: dict = {}
+        # (url, event) -> whether the announce ran on a daemon thread.
+        self.daemon: dict = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, url, info_hash, peer_id, port, transfer, event, timeout):
+        with self.lock:
+            self.calls.append((url, transfer, event))
+            self.timeouts[url] = timeout
+            self.daemon[url, event] = threading.current_thread().daemon
+        if url in self.gates:
+            self.gates[url].wait(5)
+        res = self.responses[url]
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def peer(n: int) -> Peer:
+    return Peer(f"10.0.0.{n}", 6881)
+
+
+class AnnouncerTests(unittest.TestCase):
+    def _announcer(self, tiers, responses, gates=None) -> Announcer:
+        self.trackers = FakeTrackers(responses, gates)
+        self.clock = FakeClock()
+        announcer = Announcer(
+            tiers, INFO_HASH, PEER_ID, 6881, self.trackers, clock=self.clock
+        )
+        # Keep tracker order deterministic.
+        for tier, urls in zip(announcer.tiers, tiers):
+            tier.urls = list(urls)
+        return announcer
+
+    def test_starts_with_first_tier_and_reports_the_rest_later(self) -> None:
+        slow = threading.Event()
+        announcer = self._announcer(
+            [["http://a"], ["udp://b"]],
+            {
+                "http://a": AnnounceResponse([peer(1), peer(2)]),
+                "udp://b": AnnounceResponse([peer(2), peer(3)]),
+            },
+            gates={"udp://b": slow},
+        )
+        peers = announcer.announce_all(Transfer(left=100))
+        self.assertEqual(peers, [peer(1), peer(2)])
+
+        received = []
+        done = threading.Event()
+
+        def on_peers(peers) -> None:
+            received.append(peers)
+            done.set()
+
+        announcer.start(Transfer, on_peers)
+        slow.set()
+        self.assertTrue(done.wait(5))
+        # A silent tracker must not hold up interpreter exit.
+        self.assertTrue(self.trackers.daemon["udp://b", "started"])
+        announcer.close()
+        self.assertEqual(received, [[peer(2), peer(3)]])
+        # Only the "started" to the slow tier and the "stopped" on close.
+        self.assertEqual(
+            [event for url, _, event in self.trackers.calls if url == "udp://b"],
+            ["started", "stopped"],
+        )
+
+    def test_udp_announces_are_bounded(self) -> None:
+        announcer = self._announcer(
+            [["udp://a", "http://b"]],
+            {
+                "udp://a": TimeoutError("silent"),
+                "http://b": AnnounceResponse([peer(1)]),
+            },
+        )
+        self.assertEqual(announcer.announce_all(Transfer()), [peer(1)])
+        self.assertEqual(
+            self.trackers.timeouts, {"udp://a": UDP_TIMEOUT, "http://b": None}
+        )
+
+    def test_tier_falls_back_and_promotes_working_tracker(self) -> None:
+        announcer = self._announcer(
+            [["http://down", "http://up"]],
+            {
+                "http://down": OSError("refused"),
+                "http://up": AnnounceResponse([peer(1)], interval=600),
+            },
+        )
+        self.assertEqual(announcer.announce_all(Transfer()), [peer(1)])
+        self.assertEqual(announcer.tiers[0].urls, ["http://up", "http://down"])
+        self.assertEqual(announcer.tiers[0].interval, 600)
+
+    def test_raises_when_no_tracker_answers(self) -> None:
+        announcer = self._announcer([["http://a"]], {"http://a": OSError("down")})
+        with self.assertRaises(ValueError):
+            announcer.announce_all(Transfer())
+        self.assertEqual(announcer.tiers[0].interval, RETRY_INTERVAL)
+
+    def test_honours_interval_and_min_interval(self) -> None:
+        announcer = self._announcer(
+            [["http://a"]],
+            {"http://a": AnnounceResponse([], interval=900, min_interval=60)},
+        )
+        announcer.announce_all(Transfer())
+        tier = announcer.tiers[0]
+        self.clock.now = 59
+        self.assertFalse(tier.due(self.clock(), starving=True))
+        self.clock.now = 60
+        self.assertTrue(tier.due(self.clock(), starving=True))
+        self.assertFalse(tier.due(self.clock(), starving=False))
+        self.clock.now = 900
+        self.assertTrue(tier.due(self.clock(), starving=False))
+
+    def test_background_announces_report_progress(self) -> None:
+        announcer = self._announcer(
+            [["http://a"]], {"http://a": AnnounceResponse([peer(1)], interval=900)}
+        )
+        announcer.announce_all(Transfer(left=100))
+        received: list = []
+        done = threading.Event()
+
+        def on_peers(peers) -> None:
+            received.extend(peers)
+            done.set()
+
+        transfer = Transfer(uploaded=5, downloaded=100, left=0)
+        announcer.start(lambda: transfer, on_peers)
+        announcer.completed()
+        self.assertTrue(done.wait(5))
+        announcer.close()
+        self.assertEqual(received, [peer(1)])
+        events = [(event, t) for _, t, event in self.trackers.calls]
+        self.assertEqual(
+            events[1:], [("completed", transfer), ("stopped", transfer)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 import bencode
@@ -18,9 +19,76 @@ class BencodeTests(unittest.TestCase):
         decoded = bencode.decode(encoded)
         self.assertEqual(decoded, payload)
 
+    def test_encode_normalizes_keys_and_values(self) -> None:
+        encoded = bencode.encode({"b": "caf\u00e9", b"a": [True, -3]})
+        self.assertEqual(encoded, b"d1:ali1ei-3ee1:b5:caf\xc3\xa9e")
+
+    def test_encode_into_appends(self) -> None:
+        out = bytearray(b"prefix")
+        bencode.encode_into([b"x"], out)
+        self.assertEqual(out, b"prefixl1:xe")
+
+    def test_dump_streams_to_sink(self) -> None:
+        payload = {b"pieces": b"p" * (3 * bencode.FLUSH_SIZE), b"n": list(range(5000))}
+        sink = io.BytesIO()
+        bencode.dump(payload, sink)
+        self.assertEqual(sink.getvalue(), bencode.encode(payload))
+
     def test_decode_errors(self) -> None:
         with self.assertRaises(bencode.BencodeError):
             bencode.decode(b"i12")
+        with self.assertRaises(bencode.BencodeError):
+            bencode.decode(b"di1ei2ee")
+
+    def test_decode_rejects_malformed(self) -> None:
+        for payload in (b"d1:ae", b"dli1eei1ee", b"e", b"4:ab", b"i1x2e", b"l" * 5):
+            with self.subTest(payload=payload):
+                with self.assertRaises(bencode.BencodeError):
+                    bencode.decode(payload)
+
+    def test_decode_limits(self) -> None:
+        deep = b"l" * 100_000 + b"e" * 100_000
+        with self.assertRaises(bencode.BencodeError):
+            bencode.decode(deep)
+        with self.assertRaises(bencode.BencodeError):
+            bencode.decode_lazy(deep)
+        self.assertEqual(bencode.decode(b"llleee", max_depth=3), [[[]]])
+        with self.assertRaises(bencode.BencodeError):
+            bencode.decode(b"llleee", max_depth=2)
+        with self.assertRaises(bencode.BencodeError):
+            bencode.decode(b"4:spam", max_size=5)
+        with self.assertRaises(bencode.BencodeError):
+            bencode.decode(b"i" + b"9" * 1000 + b"e")
+
+    def test_decode_memoryview(self) -> None:
+        encoded = bencode.encode([b"spam", 7])
+        self.assertEqual(bencode.decode(memoryview(encoded)), [b"spam", 7])
+        self.assertEqual(bencode.decode(bytearray(encoded)), [b"spam", 7])
+
+    def test_find_span(self) -> None:
+        info = {b"pieces": b"x" * 40, b"length": 3}
+        encoded = bencode.encode({b"announce": b"http://t", b"info": info})
+        start, end = bencode.find_span(encoded, b"info")
+        self.assertEqual(encoded[start:end], bencode.encode(info))
+        start, end = bencode.find_span(encoded, b"info", b"length")
+        self.assertEqual(encoded[start:end], b"i3e")
+        with self.assertRaises(KeyError):
+            bencode.find_span(encoded, b"missing")
+
+    def test_decode_lazy(self) -> None:
+        encoded = bencode.encode(
+            {b"info": {b"name": b"a", b"files": [{b"length": 1}]}, b"n": 5}
+        )
+        payload = bencode.decode_lazy(encoded)
+        self.assertIsInstance(payload, bencode.LazyDict)
+        self.assertEqual(payload[b"n"], 5)
+        info = payload[b"info"]
+        self.assertIsInstance(info[b"name"], memoryview)
+        self.assertEqual(bytes(info[b"name"]), b"a")
+        self.assertEqual(info[b"files"], [{b"length": 1}])
+        self.assertEqual(sorted(payload), [b"info", b"n"])
+        with self.assertRaises(bencode.BencodeError):
+            bencode.decode_lazy(encoded + b"x")
 
 
 if __name__ == "__main__":
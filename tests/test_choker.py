@@ -0,0 +1,69 @@
+import random
+import unittest
+
+from choker import Choker, PeerStats
+
+
+class ChokerTests(unittest.TestCase):
+    def _choker(self, slots: int = 2, rounds: int = 3) -> Choker[str]:
+        return Choker(slots=slots, optimistic_rounds=rounds, rng=random.Random(1))
+
+    def test_unchokes_fastest_uploaders_to_us(self) -> None:
+        choker = self._choker()
+        peers = {
+            "slow": PeerStats(True, 10, 0),
+            "fast": PeerStats(True, 300, 0),
+            "medium": PeerStats(True, 200, 0),
+            "bored": PeerStats(False, 1000, 0),
+        }
+        unchoke, choke = choker.rechoke(peers)
+        self.assertEqual(choke, [])
+        self.assertEqual(set(unchoke), {"fast", "medium", "slow"})
+        self.assertEqual(choker.optimistic, "slow")
+
+    def test_rates_are_measured_per_round(self) -> None:
+        choker = self._choker(slots=1, rounds=100)
+        choker.rechoke({"a": PeerStats(True, 1000, 0), "b": PeerStats(True, 0, 0)})
+        self.assertEqual(choker.unchoked, {"a", "b"})
+        self.assertEqual(choker.optimistic, "b")
+        # "b" now gives more per round than "a", despite a lower total.
+        unchoke, choke = choker.rechoke(
+            {"a": PeerStats(True, 1010, 0), "b": PeerStats(True, 500, 0)}
+        )
+        self.assertEqual((unchoke, choke), ([], []))
+        self.assertEqual(choker.optimistic, "a")
+
+    def test_optimistic_slot_rotates(self) -> None:
+        choker = self._choker(slots=1, rounds=2)
+        peers = {key: PeerStats(True, 0, 0) for key in "abcdef"}
+        seen = set()
+        for _ in range(40):
+            choker.rechoke(peers)
+            seen.add(choker.optimistic)
+            self.assertEqual(len(choker.unchoked), 2)
+        self.assertGreater(len(seen), 2)
+
+    def test_seeding_ranks_by_upload(self) -> None:
+        choker = self._choker(slots=1, rounds=100)
+        peers = {
+            "taker": PeerStats(True, 0, 500),
+            "giver": PeerStats(True, 500, 0),
+            "idle": PeerStats(True, 0, 0),
+            "other": PeerStats(True, 0, 0),
+        }
+        choker.rechoke(peers, seeding=True)
+        self.assertIn("taker", choker.unchoked)
+        self.assertNotEqual(choker.optimistic, "taker")
+
+    def test_chokes_peers_that_lose_interest_or_leave(self) -> None:
+        choker = self._choker(slots=2)
+        choker.rechoke({"a": PeerStats(True, 0, 0), "b": PeerStats(True, 0, 0)})
+        unchoke, choke = choker.rechoke(
+            {"a": PeerStats(False, 0, 0), "c": PeerStats(True, 0, 0)}
+        )
+        self.assertEqual((unchoke, choke), (["c"], ["a"]))
+        self.assertEqual(choker.unchoked, {"c"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+from connections import BACKOFF_BASE, MAX_FAILURES, ConnectionManager
+from peers import Peer
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+PEERS = [Peer("10.0.0.1", 6881), Peer("10.0.0.2", 6881), Peer("10.0.0.3", 6881)]
+
+
+class ConnectionManagerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def _manager(self, **kwargs) -> ConnectionManager:
+        manager = ConnectionManager(clock=self.clock, **kwargs)
+        manager.add(PEERS)
+        return manager
+
+    def test_caps_dials_and_connections(self) -> None:
+        manager = self._manager(max_connections=2, max_dials=1)
+        first = manager.next_dial()
+        self.assertEqual(first, PEERS[0])
+        self.assertIsNone(manager.next_dial())
+        manager.connected(first)
+        self.assertEqual(manager.next_dial(), PEERS[1])
+        manager.connected(PEERS[1])
+        self.assertIsNone(manager.next_dial())
+        self.assertFalse(manager.accept())
+
+    def test_failed_peers_back_off_exponentially(self) -> None:
+        manager = self._manager()
+        for peer in PEERS[1:]:
+            manager.record(peer).failures = MAX_FAILURES
+        peer = PEERS[0]
+        for failures in range(1, 4):
+            self.assertEqual(manager.next_dial(), peer)
+            manager.failed(peer)
+            delay = BACKOFF_BASE * 2 ** (failures - 1)
+            self.assertEqual(manager.next_retry(), delay)
+            self.clock.now += delay - 0.1
+            self.assertIsNone(manager.next_dial())
+            self.clock.now += 0.1
+
+    def test_gives_up_after_repeated_failures(self) -> None:
+        manager = self._manager()
+        for _ in range(MAX_FAILURES):
+            for peer in PEERS:
+                manager.record(peer).retry_at = 0
+                self.assertEqual(manager.next_dial(), peer)
+                manager.failed(peer)
+        self.assertTrue(manager.exhausted)
+        self.clock.now += 1e6
+        self.assertIsNone(manager.next_dial())
+
+    def test_productive_peers_redial_first(self) -> None:
+        manager = self._manager()
+        for peer in PEERS:
+            self.assertEqual(manager.next_dial(), peer)
+            manager.connected(peer)
+        self.clock.now += 10
+        manager.closed(PEERS[0], 1000)
+        manager.closed(PEERS[1], 0)
+        manager.closed(PEERS[2], 50_000)
+        self.assertEqual(manager.next_dial(), PEERS[2])
+        self.assertEqual(manager.next_dial(), PEERS[0])
+        # The idle peer is backing off.
+        self.assertIsNone(manager.next_dial())
+
+    def test_fresh_only_skips_known_peers(self) -> None:
+        manager = self._manager()
+        peer = manager.next_dial()
+        manager.connected(peer)
+        manager.closed(peer, 100)
+        self.assertEqual(manager.next_dial(fresh_only=True), PEERS[1])
+        self.assertTrue(manager.untried)
+
+    def test_prefers_family_that_connects_first(self) -> None:
+        v6 = [Peer("2001:db8::1", 6881), Peer("2001:db8::2", 6881)]
+        manager = self._manager()
+        manager.add(v6)
+        # Families alternate until a dial succeeds...
+        first, second = manager.next_dial(), manager.next_dial()
+        self.assertEqual((first, second), (PEERS[0], v6[0]))
+        manager.failed(first)
+        manager.connected(second)
+        self.assertEqual(manager.preferred_family, v6[0].family)
+        # ...and then the winning family goes first.
+        self.assertEqual(manager.next_dial(), v6[1])
+        self.assertEqual(manager.next_dial(), PEERS[1])
+
+    def test_add_ignores_known_peers(self) -> None:
+        manager = self._manager()
+        self.assertEqual(manager.add([PEERS[0], Peer("10.0.0.4", 1)]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
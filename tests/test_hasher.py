@@ -0,0 +1,31 @@
+import hashlib
+import unittest
+
+from hasher import HashPool
+from p2p import PieceWork
+
+
+class HashPoolTests(unittest.TestCase):
+    def test_verify_matches_hash(self) -> None:
+        data = bytearray(b"x" * 40000)
+        digest = hashlib.sha1(data).digest()
+        work = PieceWork(index=0, hash_bytes=digest, length=len(data))
+        with HashPool(workers=2) as pool:
+            self.assertTrue(pool.verify(work, data).result())
+            self.assertFalse(pool.verify(work, bytes(len(data))).result())
+
+    def test_stats_count_hashed_pieces(self) -> None:
+        work = PieceWork(index=0, hash_bytes=bytes(20), length=1000)
+        with HashPool(workers=1) as pool:
+            futures = [pool.verify(work, bytes(1000)) for _ in range(3)]
+            for future in futures:
+                future.result()
+            stats = pool.stats()
+        self.assertEqual(stats.pieces, 3)
+        self.assertEqual(stats.bytes_hashed, 3000)
+        self.assertEqual(stats.queue_depth, 0)
+        self.assertGreaterEqual(stats.max_queue_depth, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
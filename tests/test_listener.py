@@ -0,0 +1,52 @@
+import hashlib
+import io
+import socket
+import threading
+import unittest
+
+from handshake import Handshake
+from listener import Listener
+
+INFO_HASH = hashlib.sha1(b"listener").digest()
+PEER_ID = b"-LS0001-" + bytes(12)
+
+
+class ListenerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.accepted: list = []
+        self.done = threading.Event()
+
+        def on_peer(sock: socket.socket, peer) -> None:
+            self.accepted.append(peer)
+            sock.close()
+            self.done.set()
+
+        self.listener = Listener(0, INFO_HASH, PEER_ID, on_peer, host="127.0.0.1")
+        self.listener.start()
+
+    def tearDown(self) -> None:
+        self.listener.close()
+
+    def _dial(self, info_hash: bytes, peer_id: bytes = bytes(20)) -> bytes:
+        with socket.create_connection(("127.0.0.1", self.listener.port), timeout=5) as sock:
+            sock.sendall(Handshake.create(info_hash, peer_id).serialize())
+            chunks = []
+            while chunk := sock.recv(4096):
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+    def test_answers_matching_handshake(self) -> None:
+        reply = self._dial(INFO_HASH)
+        res = Handshake.read(io.BytesIO(reply))
+        self.assertEqual((res.info_hash, res.peer_id), (INFO_HASH, PEER_ID))
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.accepted[0].ip, "127.0.0.1")
+
+    def test_rejects_other_torrents_and_ourselves(self) -> None:
+        self.assertEqual(self._dial(hashlib.sha1(b"other").digest()), b"")
+        self.assertEqual(self._dial(INFO_HASH, PEER_ID), b"")
+        self.assertEqual(self.accepted, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ import unittest
 
 import message
 from message import Message, MessageID
+from wire import MAX_FRAME_LENGTH
 
 
 class MessageTests(unittest.TestCase):
@@ -11,6 +12,11 @@ class MessageTests(unittest.TestCase):
         self.assertEqual(msg.msg_id, MessageID.REQUEST)
         self.assertEqual(msg.payload, b"\x00\x00\x00\x04\x00\x00\x02\x37\x00\x00\x10\xe1")
 
+    def test_format_cancel(self) -> None:
+        msg = message.format_cancel(4, 567, 4321)
+        self.assertEqual(msg.msg_id, MessageID.CANCEL)
+        self.assertEqual(msg.payload, b"\x00\x00\x00\x04\x00\x00\x02\x37\x00\x00\x10\xe1")
+
     def test_format_have(self) -> None:
         msg = message.format_have(4)
         self.assertEqual(msg.msg_id, MessageID.HAVE)
@@ -47,6 +53,28 @@ class MessageTests(unittest.TestCase):
         msg = Message(msg_id=MessageID.HAVE, payload=b"\x01\x02\x03\x04")
         self.assertEqual(msg.serialize(), b"\x00\x00\x00\x05\x04\x01\x02\x03\x04")
 
+    def test_serialize_have(self) -> None:
+        self.assertEqual(
+            message.serialize_have(4), message.format_have(4).serialize()
+        )
+
+    def test_pack_block_frames(self) -> None:
+        blocks = [(4, 567, 4321), (5, 0, 16384)]
+        buf = bytearray(3 * message.BLOCK_FRAME.size)
+        offset = message.pack_block_frames(buf, 0, MessageID.CANCEL, blocks[:1])
+        offset = message.pack_block_frames(buf, offset, MessageID.REQUEST, blocks)
+        self.assertEqual(offset, len(buf))
+        self.assertEqual(
+            bytes(buf),
+            message.format_cancel(*blocks[0]).serialize()
+            + message.format_request(*blocks[0]).serialize()
+            + message.format_request(*blocks[1]).serialize(),
+        )
+
+    def test_max_frame_length(self) -> None:
+        self.assertEqual(message.max_frame_length(8), MAX_FRAME_LENGTH)
+        self.assertEqual(message.max_frame_length(1_000_000), 125_001)
+
     def test_serialize_keep_alive(self) -> None:
         self.assertEqual(message.serialize_keep_alive(), b"\x00\x00\x00\x00")
 
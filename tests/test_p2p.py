@@ -0,0 +1,613 @@
+import hashlib
+import os
+from pathlib import Path
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+import async_p2p
+from announcer import Announcer
+from bitfield import BitField
+from choker import Choker
+from handshake import Handshake
+from message import Message, MessageID, format_cancel, format_request, read_message
+from p2p import (
+    MAX_BLOCK_SIZE,
+    PeerScheduler,
+    PieceResult,
+    PieceWork,
+    Torrent,
+    rechoke,
+)
+from peers import Peer
+from picker import PiecePicker
+from pipeline import RequestPipeline
+from resume import ResumeJournal
+from storage import FileStorage, MmapStorage
+from tracker import AnnounceResponse
+
+
+PIECE_LENGTH = 32768
+DATA = os.urandom(5 * PIECE_LENGTH + 1234)
+PIECE_HASHES = [
+    hashlib.sha1(DATA[i : i + PIECE_LENGTH]).digest()
+    for i in range(0, len(DATA), PIECE_LENGTH)
+]
+INFO_HASH = hashlib.sha1(b"test torrent").digest()
+
+
+class MemoryStorage:
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.buf = bytearray(length)
+
+    def write(self, offset: int, data: bytes) -> None:
+        self.buf[offset : offset + len(data)] = data
+
+    def read(self, offset: int, length: int) -> bytes:
+        return bytes(self.buf[offset : offset + length])
+
+    def paths(self, offset: int, length: int) -> list[str]:
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+def piece_bitfield(pieces: list[int]) -> bytes:
+    bitfield = bytearray((len(PIECE_HASHES) + 7) // 8)
+    for index in pieces:
+        bitfield[index // 8] |= 1 << (7 - index % 8)
+    return bytes(bitfield)
+
+
+def serve_pieces(
+    sock: socket.socket,
+    data: bytes,
+    bitfield: bytes,
+    max_blocks: int | None = None,
+    gate: threading.Event | None = None,
+) -> None:
+    """Answer a handshaken peer's requests until it (or we, after
+    *max_blocks* blocks) hang up; with a *gate*, stall until it is set."""
+    sock.sendall(Message(MessageID.BITFIELD, bitfield).serialize())
+    if gate is not None:
+        gate.wait(timeout=10)
+    while max_blocks is None or max_blocks > 0:
+        try:
+            msg = read_message(sock)
+            if msg is None:
+                continue
+            if msg.msg_id == MessageID.INTERESTED:
+                sock.sendall(Message(MessageID.UNCHOKE).serialize())
+            elif msg.msg_id == MessageID.REQUEST:
+                index, begin, length = struct.unpack(">III", msg.payload)
+                start = index * PIECE_LENGTH + begin
+                block = data[start : start + length]
+                payload = struct.pack(">II", index, begin) + block
+                sock.sendall(Message(MessageID.PIECE, payload).serialize())
+                if max_blocks is not None:
+                    max_blocks -= 1
+        except (EOFError, OSError):
+            # The downloader may hang up with requests still in flight.
+            return
+
+
+def start_seeder(
+    data: bytes,
+    pieces: list[int],
+    max_blocks: int | None = None,
+    gate: threading.Event | None = None,
+) -> socketserver.ThreadingTCPServer:
+    """Serve *pieces* of *data* to any peer that completes a handshake,
+    dropping each connection after *max_blocks* blocks; see serve_pieces."""
+    bitfield = piece_bitfield(pieces)
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self) -> None:
+            sock = self.request
+            hs = Handshake.read(sock)
+            sock.sendall(Handshake.create(hs.info_hash, bytes(20)).serialize())
+            serve_pieces(sock, data, bitfield, max_blocks, gate)
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def dial_seeder(port: int, data: bytes, pieces: list[int]) -> threading.Thread:
+    """Connect to a listening downloader on *port* and serve it *pieces*."""
+
+    def run() -> None:
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.02)
+        with sock:
+            sock.sendall(Handshake.create(INFO_HASH, bytes(20)).serialize())
+            Handshake.read(sock)
+            serve_pieces(sock, data, piece_bitfield(pieces))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_leecher(
+    piece: int, received: bytearray, send_bitfield: bool = True
+) -> socketserver.ThreadingTCPServer:
+    """Accept one connection, download *piece* into *received* and hang up.
+
+    Without *send_bitfield* the leecher skips its empty BITFIELD, as BEP 3
+    allows a peer with no pieces to do.
+    """
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self) -> None:
+            sock = self.request
+            hs = Handshake.read(sock)
+            sock.sendall(Handshake.create(hs.info_hash, bytes(20)).serialize())
+            if send_bitfield:
+                empty = bytes((len(PIECE_HASHES) + 7) // 8)
+                sock.sendall(Message(MessageID.BITFIELD, empty).serialize())
+            sock.sendall(Message(MessageID.INTERESTED).serialize())
+            while len(received) < PIECE_LENGTH:
+                msg = read_message(sock)
+                if msg is None:
+                    continue
+                if msg.msg_id == MessageID.UNCHOKE:
+                    for begin in range(0, PIECE_LENGTH, MAX_BLOCK_SIZE):
+                        payload = struct.pack(">III", piece, begin, MAX_BLOCK_SIZE)
+                        sock.sendall(Message(MessageID.REQUEST, payload).serialize())
+                elif msg.msg_id == MessageID.PIECE:
+                    received.extend(msg.payload[8:])
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeClient:
+    def __init__(self, piece_count: int) -> None:
+        self.choked = False
+        self.bitfield = BitField(bytearray(b"\xff" * ((piece_count + 7) // 8)))
+        self.sent: list[str] = []
+
+    def send_choke(self) -> None:
+        self.sent.append("choke")
+
+    def send_unchoke(self) -> None:
+        self.sent.append("unchoke")
+
+
+def piece_message(index: int, begin: int, length: int) -> Message:
+    return Message(MessageID.PIECE, struct.pack(">II", index, begin) + bytes(length))
+
+
+class PeerSchedulerTests(unittest.TestCase):
+    def _scheduler(
+        self, pieces: int, depth: int, picker: PiecePicker | None = None
+    ) -> PeerScheduler:
+        work = [
+            PieceWork(index=i, hash_bytes=bytes(20), length=2 * MAX_BLOCK_SIZE)
+            for i in range(pieces)
+        ]
+        if picker is None:
+            picker = PiecePicker(work, pieces, endgame_blocks=0)
+        pipeline = RequestPipeline(floor=depth, ceiling=depth)
+        return PeerScheduler(FakeClient(pieces), picker, pipeline)  # type: ignore[arg-type]
+
+    def test_requests_span_piece_boundaries(self) -> None:
+        scheduler = self._scheduler(pieces=4, depth=5)
+        requests = scheduler.next_requests()
+        self.assertEqual(len(requests), 5)
+        self.assertEqual(len({index for index, _, _ in requests}), 3)
+        self.assertEqual(scheduler.next_requests(), [])
+
+    def test_completes_piece_and_refills(self) -> None:
+        scheduler = self._scheduler(pieces=4, depth=2)
+        (first, _, _), (second, _, _) = scheduler.next_requests()
+        self.assertEqual(first, second)
+        done = scheduler.handle(piece_message(first, 0, MAX_BLOCK_SIZE))
+        self.assertEqual(done, [])
+        self.assertEqual(len(scheduler.next_requests()), 1)
+        done = scheduler.handle(piece_message(first, MAX_BLOCK_SIZE, MAX_BLOCK_SIZE))
+        self.assertEqual([progress.index for progress in done], [first])
+        self.assertNotIn(first, scheduler.pieces)
+
+    def test_choke_requeues_outstanding_blocks(self) -> None:
+        scheduler = self._scheduler(pieces=1, depth=5)
+        self.assertEqual(len(scheduler.next_requests()), 2)
+        scheduler.handle(Message(MessageID.CHOKE))
+        self.assertEqual(scheduler.next_requests(), [])
+        scheduler.handle(Message(MessageID.UNCHOKE))
+        self.assertEqual(
+            sorted(begin for _, begin, _ in scheduler.next_requests()),
+            [0, MAX_BLOCK_SIZE],
+        )
+
+    def test_release_returns_pieces_to_picker(self) -> None:
+        scheduler = self._scheduler(pieces=2, depth=5)
+        scheduler.next_requests()
+        scheduler.release()
+        self.assertTrue(scheduler.idle)
+        self.assertIsNotNone(scheduler.picker.pick(scheduler.client.bitfield))
+
+    def test_endgame_duplicates_get_private_buffers(self) -> None:
+        backing = bytearray(2 * MAX_BLOCK_SIZE)
+
+        def buffers(work: PieceWork) -> memoryview:
+            return memoryview(backing)
+
+        work = [PieceWork(index=0, hash_bytes=bytes(20), length=2 * MAX_BLOCK_SIZE)]
+        picker = PiecePicker(work, 1)
+        first, second = (
+            PeerScheduler(
+                FakeClient(1), picker, RequestPipeline(floor=2, ceiling=2), buffers  # type: ignore[arg-type]
+            )
+            for _ in range(2)
+        )
+        first.next_requests()
+        second.next_requests()
+        self.assertTrue(picker.in_endgame)
+        self.assertEqual(first.pieces[0].buf.obj, backing)
+        self.assertIsInstance(second.pieces[0].buf, bytearray)
+
+    def test_shared_buffer_ignores_blocks_after_duplicate_wins(self) -> None:
+        backing = bytearray(b"v" * 2 * MAX_BLOCK_SIZE)
+
+        def buffers(work: PieceWork) -> memoryview:
+            return memoryview(backing)
+
+        work = [PieceWork(index=0, hash_bytes=bytes(20), length=2 * MAX_BLOCK_SIZE)]
+        picker = PiecePicker(work, 1)
+        first, second = (
+            PeerScheduler(
+                FakeClient(1), picker, RequestPipeline(floor=2, ceiling=2), buffers  # type: ignore[arg-type]
+            )
+            for _ in range(2)
+        )
+        first.next_requests()
+        second.next_requests()
+        # The duplicate's copy is verified and written first.
+        self.assertTrue(picker.complete(0))
+
+        self.assertIsNone(first.block_target(0, 0, MAX_BLOCK_SIZE))
+        first.handle(piece_message(0, 0, MAX_BLOCK_SIZE))
+        self.assertEqual(backing, b"v" * 2 * MAX_BLOCK_SIZE)
+        self.assertEqual(len(first.cancellations()), 2)
+
+    def test_queues_peer_requests_until_cancelled(self) -> None:
+        scheduler = self._scheduler(pieces=1, depth=1)
+        scheduler.am_choking = False
+        for begin in (0, MAX_BLOCK_SIZE):
+            scheduler.handle(format_request(0, begin, MAX_BLOCK_SIZE))
+        scheduler.handle(format_cancel(0, 0, MAX_BLOCK_SIZE))
+        self.assertEqual(scheduler.take_uploads(), [(0, MAX_BLOCK_SIZE, MAX_BLOCK_SIZE)])
+        self.assertEqual(scheduler.take_uploads(), [])
+
+    def test_ignores_requests_while_choking(self) -> None:
+        scheduler = self._scheduler(pieces=1, depth=1)
+        scheduler.handle(format_request(0, 0, MAX_BLOCK_SIZE))
+        scheduler.am_choking = False
+        self.assertEqual(scheduler.take_uploads(), [])
+
+    def test_rechoke_unchokes_reconnected_peer(self) -> None:
+        peer = Peer("10.0.0.1", 6881)
+        choker: Choker[PeerScheduler] = Choker()
+        old = self._scheduler(pieces=1, depth=1)
+        old.peer_interested, old.downloaded = True, 1000
+        rechoke(choker, {peer: old}, seeding=False)
+        self.assertFalse(old.am_choking)
+        # The same address redialed is a new connection, choked until told.
+        new = self._scheduler(pieces=1, depth=1)
+        new.peer_interested = True
+        rechoke(choker, {peer: new}, seeding=False)
+        self.assertFalse(new.am_choking)
+        self.assertEqual(new.client.sent, ["unchoke"])  # type: ignore[attr-defined]
+
+    def test_stored_pieces_are_announced_to_every_connection(self) -> None:
+        torrent = Torrent(
+            peers=[],
+            peer_id=os.urandom(20),
+            info_hash=INFO_HASH,
+            piece_hashes=PIECE_HASHES,
+            piece_length=PIECE_LENGTH,
+            length=len(DATA),
+            name="sample.bin",
+        )
+        schedulers = [self._scheduler(pieces=1, depth=1) for _ in range(2)]
+        result = PieceResult(index=2, data=DATA[2 * PIECE_LENGTH : 3 * PIECE_LENGTH])
+        storage = MemoryStorage(len(DATA))
+        torrent.store_result(storage, None, result, 1, schedulers=schedulers)
+        for scheduler in schedulers:
+            self.assertEqual(scheduler.take_haves(), [2])
+            self.assertEqual(scheduler.take_haves(), [])
+
+    def test_endgame_cancels_pieces_finished_elsewhere(self) -> None:
+        work = [PieceWork(index=0, hash_bytes=bytes(20), length=2 * MAX_BLOCK_SIZE)]
+        picker = PiecePicker(work, 1)
+        slow = self._scheduler(pieces=1, depth=5, picker=picker)
+        fast = self._scheduler(pieces=1, depth=5, picker=picker)
+        self.assertEqual(len(slow.next_requests()), 2)
+        self.assertEqual(len(fast.next_requests()), 2)
+        fast.handle(piece_message(0, 0, MAX_BLOCK_SIZE))
+        (done,) = fast.handle(piece_message(0, MAX_BLOCK_SIZE, MAX_BLOCK_SIZE))
+        self.assertTrue(picker.complete(done.index))
+
+        cancels = slow.cancellations()
+        self.assertEqual(
+            sorted(cancels), [(0, 0, MAX_BLOCK_SIZE), (0, MAX_BLOCK_SIZE, MAX_BLOCK_SIZE)]
+        )
+        self.assertTrue(slow.idle)
+        self.assertEqual(slow.handle(piece_message(0, 0, MAX_BLOCK_SIZE)), [])
+
+
+class DownloadTests(unittest.TestCase):
+    def setUp(self) -> None:
+        all_pieces = list(range(len(PIECE_HASHES)))
+        self.servers = [
+            start_seeder(DATA, all_pieces),
+            start_seeder(DATA, all_pieces[::2]),
+        ]
+
+    def tearDown(self) -> None:
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _torrent(self) -> Torrent:
+        peers = [Peer(ip="127.0.0.1", port=s.server_address[1]) for s in self.servers]
+        return Torrent(
+            peers=peers,
+            peer_id=os.urandom(20),
+            info_hash=INFO_HASH,
+            piece_hashes=PIECE_HASHES,
+            piece_length=PIECE_LENGTH,
+            length=len(DATA),
+            name="sample.bin",
+        )
+
+    def test_threaded_download(self) -> None:
+        storage = MemoryStorage(len(DATA))
+        self._torrent().download(storage)
+        self.assertEqual(bytes(storage.buf), DATA)
+
+    def test_asyncio_download(self) -> None:
+        storage = MemoryStorage(len(DATA))
+        async_p2p.download(self._torrent(), storage)
+        self.assertEqual(bytes(storage.buf), DATA)
+
+    def test_storage_failure_does_not_hang(self) -> None:
+        class FailingStorage(MemoryStorage):
+            def write(self, offset: int, data: bytes) -> None:
+                time.sleep(0.2)  # Let verified pieces fill the results queue.
+                raise OSError("disk full")
+
+        errors: list = []
+
+        def run() -> None:
+            try:
+                self._torrent().download(FailingStorage(len(DATA)))
+            except OSError as exc:
+                errors.append(exc)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive(), "download hung after a storage error")
+        self.assertEqual([str(e) for e in errors], ["disk full"])
+        # Neither the dialer nor its workers may outlive the download.
+        lingering = [
+            t.name
+            for t in threading.enumerate()
+            if t.name in ("choker", "dialer") or t.name.startswith("peer ")
+        ]
+        self.assertEqual(lingering, [])
+
+    def test_mmap_download(self) -> None:
+        for download in (Torrent.download, async_p2p.download):
+            with self.subTest(download=download.__qualname__):
+                with tempfile.TemporaryDirectory() as tmpdir:
+                    path = Path(tmpdir) / "out.bin"
+                    with MmapStorage(str(path), len(DATA)) as storage:
+                        download(self._torrent(), storage)
+                    self.assertEqual(path.read_bytes(), DATA)
+
+
+class ReconnectTests(unittest.TestCase):
+    def test_redials_peers_that_hang_up(self) -> None:
+        for download in (Torrent.download, async_p2p.download):
+            with self.subTest(download=download.__qualname__):
+                seeder = start_seeder(DATA, list(range(len(PIECE_HASHES))), max_blocks=6)
+                try:
+                    torrent = Torrent(
+                        peers=[Peer(ip="127.0.0.1", port=seeder.server_address[1])],
+                        peer_id=os.urandom(20),
+                        info_hash=INFO_HASH,
+                        piece_hashes=PIECE_HASHES,
+                        piece_length=PIECE_LENGTH,
+                        length=len(DATA),
+                        name="sample.bin",
+                    )
+                    storage = MemoryStorage(len(DATA))
+                    download(torrent, storage)
+                    self.assertEqual(bytes(storage.buf), DATA)
+                finally:
+                    seeder.shutdown()
+                    seeder.server_close()
+
+
+class AnnounceTests(unittest.TestCase):
+    def test_adds_peers_from_background_announces(self) -> None:
+        seeder = start_seeder(DATA, list(range(len(PIECE_HASHES))))
+        seeder_peer = Peer(ip="127.0.0.1", port=seeder.server_address[1])
+        try:
+            for download in (Torrent.download, async_p2p.download):
+                with self.subTest(download=download.__qualname__):
+                    events: list = []
+
+                    def tracker(url, info_hash, peer_id, port, transfer, event, timeout):
+                        events.append((event, transfer.left))
+                        return AnnounceResponse([seeder_peer])
+
+                    torrent = Torrent(
+                        peers=[],
+                        peer_id=os.urandom(20),
+                        info_hash=INFO_HASH,
+                        piece_hashes=PIECE_HASHES,
+                        piece_length=PIECE_LENGTH,
+                        length=len(DATA),
+                        name="sample.bin",
+                        announcer=Announcer(
+                            [["http://t"]], INFO_HASH, bytes(20), 0, tracker
+                        ),
+                    )
+                    storage = MemoryStorage(len(DATA))
+                    download(torrent, storage)
+                    self.assertEqual(bytes(storage.buf), DATA)
+                    self.assertEqual(events[0], ("", len(DATA)))
+                    self.assertEqual(events[-1], ("stopped", 0))
+        finally:
+            seeder.shutdown()
+            seeder.server_close()
+
+
+class InboundTests(unittest.TestCase):
+    def test_downloads_from_peers_that_dial_in(self) -> None:
+        for download in (Torrent.download, async_p2p.download):
+            with self.subTest(download=download.__qualname__):
+                port = free_port()
+                seeders = [
+                    dial_seeder(port, DATA, list(range(len(PIECE_HASHES))))
+                    for _ in range(2)
+                ]
+                torrent = Torrent(
+                    peers=[],
+                    peer_id=os.urandom(20),
+                    info_hash=INFO_HASH,
+                    piece_hashes=PIECE_HASHES,
+                    piece_length=PIECE_LENGTH,
+                    length=len(DATA),
+                    name="sample.bin",
+                    port=port,
+                )
+                storage = MemoryStorage(len(DATA))
+                # Sessions still open at the end are cancelled quietly.
+                with self.assertNoLogs("asyncio", level="ERROR"):
+                    download(torrent, storage)
+                self.assertEqual(bytes(storage.buf), DATA)
+                for seeder in seeders:
+                    seeder.join(timeout=5)
+
+
+class SeedTests(unittest.TestCase):
+    def test_seeds_requested_piece(self) -> None:
+        for download in (Torrent.download, async_p2p.download):
+            with self.subTest(download=download.__qualname__):
+                received = bytearray()
+                leecher = start_leecher(1, received)
+                try:
+                    with tempfile.TemporaryDirectory() as tmpdir:
+                        self._seed(download, str(Path(tmpdir) / "out.bin"), leecher)
+                finally:
+                    leecher.shutdown()
+                    leecher.server_close()
+                self.assertEqual(bytes(received), DATA[PIECE_LENGTH : 2 * PIECE_LENGTH])
+
+    def test_seeds_leecher_without_bitfield(self) -> None:
+        for download in (Torrent.download, async_p2p.download):
+            with self.subTest(download=download.__qualname__):
+                received = bytearray()
+                leecher = start_leecher(1, received, send_bitfield=False)
+                try:
+                    with tempfile.TemporaryDirectory() as tmpdir:
+                        self._seed(download, str(Path(tmpdir) / "out.bin"), leecher)
+                finally:
+                    leecher.shutdown()
+                    leecher.server_close()
+                self.assertEqual(bytes(received), DATA[PIECE_LENGTH : 2 * PIECE_LENGTH])
+
+    def test_uploads_while_downloading(self) -> None:
+        last = len(PIECE_HASHES) - 1
+        for download in (Torrent.download, async_p2p.download):
+            with self.subTest(download=download.__qualname__):
+                received = bytearray()
+                leecher = start_leecher(1, received)
+                # Has only the piece we lack, and sits on it until released.
+                gate = threading.Event()
+                seeder = start_seeder(DATA, [last], gate=gate)
+                try:
+                    with tempfile.TemporaryDirectory() as tmpdir:
+                        path = str(Path(tmpdir) / "out.bin")
+                        thread = threading.Thread(
+                            target=self._seed,
+                            args=(download, path, leecher, seeder, (last,)),
+                        )
+                        thread.start()
+                        deadline = time.monotonic() + 5
+                        while len(received) < PIECE_LENGTH:
+                            if time.monotonic() > deadline:
+                                break
+                            time.sleep(0.02)
+                        got = bytes(received)
+                        gate.set()
+                        thread.join(timeout=10)
+                        self.assertFalse(thread.is_alive())
+                finally:
+                    gate.set()
+                    for server in (leecher, seeder):
+                        server.shutdown()
+                        server.server_close()
+                self.assertEqual(got, DATA[PIECE_LENGTH : 2 * PIECE_LENGTH])
+
+    def _seed(
+        self,
+        download,
+        path: str,
+        leecher: socketserver.TCPServer,
+        seeder: socketserver.TCPServer | None = None,
+        missing: tuple[int, ...] = (),
+    ) -> None:
+        journal = ResumeJournal.load(path, INFO_HASH, len(PIECE_HASHES))
+        with FileStorage(path, len(DATA)) as storage, journal:
+            storage.write(0, DATA)
+            journal.save()
+            for index in range(len(PIECE_HASHES)):
+                if index not in missing:
+                    journal.mark(index)
+            servers = [leecher] if seeder is None else [leecher, seeder]
+            torrent = Torrent(
+                peers=[Peer(ip="127.0.0.1", port=s.server_address[1]) for s in servers],
+                peer_id=os.urandom(20),
+                info_hash=INFO_HASH,
+                piece_hashes=PIECE_HASHES,
+                piece_length=PIECE_LENGTH,
+                length=len(DATA),
+                name="sample.bin",
+                seed=not missing,
+                choke_interval=0.05,
+            )
+            # Returns once the leecher has its piece and disconnects.
+            download(torrent, storage, journal)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 
-from peers import Peer, parse_compact_peers
+import socket
+
+from peers import Peer, parse_compact_peers, parse_compact_peers6, parse_peer_dicts
 
 
 class PeerTests(unittest.TestCase):
@@ -21,6 +23,41 @@ class PeerTests(unittest.TestCase):
         with self.assertRaises(ValueError):
             parse_compact_peers(bytes([127, 0, 0, 1, 0x00]))
 
+    def test_parse_compact_ipv6(self) -> None:
+        payload = bytes(15) + bytes([1, 0x1A, 0xE1])
+        (peer,) = parse_compact_peers6(payload)
+        self.assertEqual((peer.ip, peer.port), ("::1", 6881))
+        self.assertEqual(peer.family, socket.AF_INET6)
+        self.assertEqual(str(peer), "[::1]:6881")
+        with self.assertRaises(ValueError):
+            parse_compact_peers6(payload[:-1])
+
+    def test_parse_dictionary_peers(self) -> None:
+        peers = parse_peer_dicts(
+            [
+                {b"peer id": b"x" * 20, b"ip": b"192.0.2.1", b"port": 6881},
+                {b"ip": b"2001:db8::1", b"port": 6882},
+                {b"ip": b"tracker.example.org", b"port": 6883},
+                {b"ip": b"192.0.2.2", b"port": 70000},
+                {b"ip": b"192.0.2.3"},
+                b"junk",
+            ]
+        )
+        self.assertEqual(
+            peers, [Peer("192.0.2.1", 6881), Peer("2001:db8::1", 6882)]
+        )
+
+    def test_stores_packed_address(self) -> None:
+        peer = Peer("192.0.2.1", 6881)
+        self.assertEqual(peer.packed, bytes([192, 0, 2, 1]))
+        self.assertEqual(peer, Peer(bytes([192, 0, 2, 1]), 6881))
+        self.assertFalse(hasattr(peer, "__dict__"))
+
+    def test_mapped_ipv4_is_ipv4(self) -> None:
+        peer = Peer("::ffff:192.0.2.1", 6881)
+        self.assertEqual(peer, Peer("192.0.2.1", 6881))
+        self.assertEqual(peer.family, socket.AF_INET)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,124 @@
+import threading
+import unittest
+
+from bitfield import BitField
+from p2p import PieceWork
+from picker import PiecePicker
+
+
+def work(count: int) -> list[PieceWork]:
+    return [PieceWork(index=i, hash_bytes=bytes(20), length=4) for i in range(count)]
+
+
+def bitfield(*indexes: int) -> BitField:
+    bf = BitField(bytearray(1))
+    for index in indexes:
+        bf.set_piece(index)
+    return bf
+
+
+class PiecePickerTests(unittest.TestCase):
+    def test_picks_rarest_piece_peer_has(self) -> None:
+        picker = PiecePicker(work(4), 4, endgame_blocks=0)
+        picker.add_peer(bitfield(0, 1, 2))
+        picker.add_peer(bitfield(0, 1))
+        picker.add_peer(bitfield(1))
+        self.assertEqual(picker.pick(bitfield(0, 1, 2)).index, 2)
+        self.assertEqual(picker.pick(bitfield(0, 1, 2)).index, 0)
+        self.assertEqual(picker.pick(bitfield(0, 1, 2)).index, 1)
+        self.assertIsNone(picker.pick(bitfield(0, 1, 2)))
+        self.assertEqual(picker.pick(bitfield(3)).index, 3)
+
+    def test_have_updates_availability(self) -> None:
+        picker = PiecePicker(work(2), 2)
+        peer = bitfield(0, 1)
+        picker.add_peer(peer)
+        picker.add_have(0)
+        picker.add_have(99)
+        self.assertEqual(picker.availability(0), 2)
+        self.assertEqual(picker.pick(peer).index, 1)
+        picker.remove_peer(peer)
+        self.assertEqual(picker.availability(0), 1)
+        self.assertEqual(picker.availability(1), 0)
+
+    def test_requeue_and_complete(self) -> None:
+        picker = PiecePicker(work(1), 1, endgame_blocks=0)
+        piece = picker.pick(bitfield(0))
+        self.assertIsNone(picker.pick(bitfield(0)))
+        picker.requeue(piece)
+        piece = picker.pick(bitfield(0))
+        self.assertFalse(picker.done)
+        self.assertTrue(picker.complete(piece.index))
+        self.assertTrue(picker.done)
+        self.assertTrue(picker.is_complete(piece.index))
+
+    def test_wait_pick_wakes_on_requeue(self) -> None:
+        picker = PiecePicker(work(1), 1, endgame_blocks=0)
+        piece = picker.pick(bitfield(0))
+        timer = threading.Timer(0.05, picker.requeue, args=(piece,))
+        timer.start()
+        self.assertEqual(picker.wait_pick(bitfield(0), timeout=5).index, 0)
+        timer.join()
+
+    def test_wait_pick_returns_none_when_done(self) -> None:
+        picker = PiecePicker(work(1), 1)
+        picker.complete(picker.pick(bitfield(0)).index)
+        self.assertIsNone(picker.wait_pick(bitfield(0), timeout=5))
+
+    def test_endgame_duplicates_assigned_pieces(self) -> None:
+        picker = PiecePicker(work(3), 3, endgame_blocks=2)
+        first = picker.pick(bitfield(0, 1, 2))
+        second = picker.pick(bitfield(0, 1, 2))
+        third = picker.pick(bitfield(0, 1, 2))
+        # Three blocks remain, above the threshold: no duplicates yet.
+        self.assertIsNone(picker.pick(bitfield(0, 1, 2)))
+        self.assertFalse(picker.in_endgame)
+
+        self.assertTrue(picker.complete(first.index))
+        duplicate = picker.pick(bitfield(0, 1, 2), exclude={second.index})
+        self.assertTrue(picker.in_endgame)
+        self.assertEqual(duplicate.index, third.index)
+        # The piece now has two holders; the first copy to verify wins.
+        self.assertTrue(picker.complete(third.index))
+        self.assertFalse(picker.complete(third.index))
+
+    def test_endgame_counts_only_blocks_still_missing(self) -> None:
+        pieces = [PieceWork(i, bytes(20), length=4 << 20) for i in range(2)]
+        picker = PiecePicker(pieces, 2, endgame_blocks=64)
+        first = picker.pick(bitfield(0, 1))
+        second = picker.pick(bitfield(0, 1))
+        # Both 256-block pieces are assigned but nothing has arrived yet.
+        self.assertIsNone(picker.pick(bitfield(0, 1)))
+        for _ in range(255):
+            picker.block_received(first.index)
+        for _ in range(192):
+            picker.block_received(second.index)
+        self.assertIsNone(picker.pick(bitfield(0, 1)))
+        picker.block_received(second.index)
+        # 1 + 63 blocks are still missing.
+        self.assertIsNotNone(picker.pick(bitfield(0, 1), exclude={second.index}))
+        self.assertTrue(picker.in_endgame)
+
+    def test_requeue_forgets_received_blocks(self) -> None:
+        picker = PiecePicker(work(2), 2, endgame_blocks=1)
+        first = picker.pick(bitfield(0, 1))
+        picker.block_received(first.index)
+        picker.requeue(first)
+        picker.pick(bitfield(0, 1))
+        picker.pick(bitfield(0, 1))
+        # The requeued piece's block has to be fetched again: 2 remain.
+        self.assertIsNone(picker.pick(bitfield(0, 1)))
+        self.assertFalse(picker.in_endgame)
+
+    def test_endgame_requeue_keeps_piece_assigned(self) -> None:
+        picker = PiecePicker(work(1), 1)
+        piece = picker.pick(bitfield(0))
+        self.assertIs(picker.pick(bitfield(0)), piece)
+        picker.requeue(piece)
+        self.assertFalse(picker.is_complete(piece.index))
+        picker.requeue(piece)
+        self.assertIs(picker.pick(bitfield(0)), piece)
+
+
+if __name__ == "__main__":
+    unittest.main()
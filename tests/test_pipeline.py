@@ -0,0 +1,97 @@
+import collections
+import unittest
+
+from pipeline import RequestPipeline
+
+
+BLOCK = 16384
+
+
+def run_link(pipeline: RequestPipeline, rtt: float, bandwidth: float, rounds: int) -> None:
+    """Simulate a link where the peer returns one pipeline's worth per RTT."""
+    now = 0.0
+    begin = 0
+    for _ in range(rounds):
+        depth = pipeline.depth
+        for i in range(depth):
+            pipeline.on_request(0, begin + i * BLOCK, now)
+        # Blocks arrive back to back once the first one has crossed the path.
+        spread = depth * BLOCK / bandwidth
+        for i in range(depth):
+            arrival = now + rtt + (i + 1) * BLOCK / bandwidth
+            pipeline.on_block(0, begin + i * BLOCK, BLOCK, arrival)
+        now += rtt + spread
+        begin += depth * BLOCK
+
+
+def run_queue(
+    pipeline: RequestPipeline, rtt: float, bandwidth: float, duration: float
+) -> list[int]:
+    """Simulate a peer serving requests one at a time over a bottleneck link,
+    refilling to ``pipeline.depth`` after every block; returns depths seen."""
+    now = free_at = 0.0
+    begin = 0
+    inflight: collections.deque = collections.deque()
+    depths = []
+    while now < duration:
+        while len(inflight) < pipeline.depth:
+            pipeline.on_request(0, begin, now)
+            free_at = max(now + rtt / 2, free_at) + BLOCK / bandwidth
+            inflight.append((free_at + rtt / 2, begin))
+            begin += BLOCK
+        now, done = inflight.popleft()
+        pipeline.on_block(0, done, BLOCK, now)
+        depths.append(pipeline.depth)
+    return depths
+
+
+class RequestPipelineTests(unittest.TestCase):
+    def test_starts_at_floor(self) -> None:
+        pipeline = RequestPipeline(floor=3, ceiling=10)
+        self.assertEqual(pipeline.depth, 3)
+
+    def test_invalid_bounds(self) -> None:
+        with self.assertRaises(ValueError):
+            RequestPipeline(floor=0)
+        with self.assertRaises(ValueError):
+            RequestPipeline(floor=10, ceiling=5)
+
+    def test_grows_on_long_fat_link(self) -> None:
+        pipeline = RequestPipeline(floor=5, ceiling=500)
+        # 200 ms RTT at 10 MiB/s: the bandwidth-delay product is 128 blocks.
+        run_link(pipeline, rtt=0.2, bandwidth=10 * 1024 * 1024, rounds=40)
+        self.assertGreater(pipeline.depth, 128)
+        self.assertLessEqual(pipeline.depth, 500)
+
+    def test_stays_shallow_on_short_link(self) -> None:
+        pipeline = RequestPipeline(floor=5, ceiling=500)
+        # 1 ms RTT at 1 MiB/s: well under one block in flight.
+        run_link(pipeline, rtt=0.001, bandwidth=1024 * 1024, rounds=40)
+        self.assertEqual(pipeline.depth, 5)
+
+    def test_respects_ceiling(self) -> None:
+        pipeline = RequestPipeline(floor=5, ceiling=20)
+        run_link(pipeline, rtt=0.2, bandwidth=10 * 1024 * 1024, rounds=40)
+        self.assertEqual(pipeline.depth, 20)
+
+    def test_own_queue_does_not_inflate_min_rtt(self) -> None:
+        pipeline = RequestPipeline(floor=5, ceiling=250)
+        # 50 ms at 2 MiB/s: the bandwidth-delay product is 6.4 blocks.
+        depths = run_queue(pipeline, rtt=0.05, bandwidth=2 * 1024 * 1024, duration=60)
+        assert pipeline.min_rtt is not None
+        self.assertLess(pipeline.min_rtt, 0.06)
+        self.assertLessEqual(max(depths), 16)
+        self.assertGreater(depths[-1], 5)
+
+    def test_reset_forgets_outstanding(self) -> None:
+        pipeline = RequestPipeline()
+        pipeline.on_request(0, 0, 0.0)
+        pipeline.on_request(0, BLOCK, 0.0)
+        pipeline.on_cancel(0, 0)
+        self.assertEqual(pipeline.outstanding, 1)
+        pipeline.reset()
+        self.assertEqual(pipeline.outstanding, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from resume import ResumeJournal
+from storage import FileEntry, FileStorage, MultiFileStorage
+
+
+INFO_HASH = bytes(range(20))
+
+
+class ResumeJournalTests(unittest.TestCase):
+    def _write_pieces(self, data_path: str, indexes: list[int]) -> None:
+        journal = ResumeJournal.load(data_path, INFO_HASH, 10)
+        with FileStorage(data_path, 40) as storage, journal:
+            journal.save()
+            for index in indexes:
+                storage.write(index * 4, b"abcd")
+                journal.mark(index)
+
+    def test_roundtrip(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = str(Path(tmpdir) / "out.bin")
+            self._write_pieces(data_path, [0, 3, 9])
+
+            journal = ResumeJournal.load(data_path, INFO_HASH, 10)
+            self.assertEqual(
+                [i for i in range(10) if journal.has_piece(i)], [0, 3, 9]
+            )
+            self.assertEqual(journal.completed(), 3)
+            # 41-byte header followed by a 2-byte bitfield for 10 pieces.
+            self.assertEqual(os.path.getsize(journal.path), 41 + 2)
+
+    def test_info_hash_mismatch_discards(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = str(Path(tmpdir) / "out.bin")
+            self._write_pieces(data_path, [1])
+            journal = ResumeJournal.load(data_path, bytes(20), 10)
+            self.assertEqual(journal.completed(), 0)
+
+    def test_modified_data_file_discards(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = str(Path(tmpdir) / "out.bin")
+            self._write_pieces(data_path, [1])
+            stat = os.stat(data_path)
+            os.utime(data_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            journal = ResumeJournal.load(data_path, INFO_HASH, 10)
+            self.assertEqual(journal.completed(), 0)
+
+    def test_in_place_writes_keep_journal(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = str(Path(tmpdir) / "out.bin")
+            self._write_pieces(data_path, [1, 4])
+            # A mapped write to a piece not yet marked bumps the mtime.
+            stat = os.stat(data_path)
+            os.utime(data_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            journal = ResumeJournal.load(data_path, INFO_HASH, 10, check_mtime=False)
+            self.assertEqual(journal.completed(), 2)
+
+            os.truncate(data_path, 30)
+            journal = ResumeJournal.load(data_path, INFO_HASH, 10, check_mtime=False)
+            self.assertEqual(journal.completed(), 0)
+
+    def test_multi_file_stamp(self) -> None:
+        files = [FileEntry("a.bin", 6, 0), FileEntry("b.bin", 34, 6)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = str(Path(tmpdir) / "dataset")
+            data_files = [os.path.join(root, entry.path) for entry in files]
+            journal = ResumeJournal.load(root, INFO_HASH, 10, data_files)
+            with MultiFileStorage(root, files) as storage, journal:
+                journal.save()
+                storage.write(4, b"abcd")
+                journal.mark(1, storage.paths(4, 4))
+
+            journal = ResumeJournal.load(root, INFO_HASH, 10, data_files)
+            self.assertEqual(journal.completed(), 1)
+
+            stat = os.stat(data_files[1])
+            os.utime(data_files[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            journal = ResumeJournal.load(root, INFO_HASH, 10, data_files)
+            self.assertEqual(journal.completed(), 0)
+
+    def test_remove(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = str(Path(tmpdir) / "out.bin")
+            self._write_pieces(data_path, [2])
+            journal = ResumeJournal.load(data_path, INFO_HASH, 10)
+            journal.remove()
+            self.assertFalse(os.path.exists(journal.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
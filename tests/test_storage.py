@@ -0,0 +1,110 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from storage import (
+    FileEntry,
+    FileSpan,
+    FileStorage,
+    MmapStorage,
+    MultiFileStorage,
+    SpanMapper,
+)
+
+FILES = [
+    FileEntry("a.bin", 3, 0),
+    FileEntry("empty.txt", 0, 3),
+    FileEntry(os.path.join("sub", "b.bin"), 5, 3),
+    FileEntry("c.bin", 2, 8),
+]
+
+
+class FileStorageTests(unittest.TestCase):
+    def test_preallocates_and_writes_at_offsets(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "out.bin"
+            with FileStorage(str(path), 10) as storage:
+                self.assertEqual(os.path.getsize(path), 10)
+                storage.write(6, b"WXYZ")
+                storage.write(0, memoryview(b"abc"))
+                self.assertEqual(storage.read(6, 4), b"WXYZ")
+            self.assertEqual(path.read_bytes(), b"abc\x00\x00\x00WXYZ")
+
+    def test_reopen_preserves_contents(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "out.bin"
+            path.write_bytes(b"0123456789extra")
+            with FileStorage(str(path), 10) as storage:
+                self.assertEqual(storage.read(0, 10), b"0123456789")
+            self.assertEqual(path.read_bytes(), b"0123456789")
+
+    def test_rejects_out_of_range(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with FileStorage(str(Path(tmpdir) / "out.bin"), 4) as storage:
+                with self.assertRaises(ValueError):
+                    storage.write(2, b"abc")
+                with self.assertRaises(ValueError):
+                    storage.read(-1, 1)
+
+
+class MmapStorageTests(unittest.TestCase):
+    def test_piece_views_write_in_place(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "out.bin"
+            with MmapStorage(str(path), 10) as storage:
+                self.assertEqual(os.path.getsize(path), 10)
+                view = storage.piece_view(4, 3)
+                view[:] = b"xyz"
+                storage.write(4, view)
+                storage.write(0, b"ab")
+                self.assertEqual(storage.read(0, 7), b"ab\x00\x00xyz")
+                with self.assertRaises(ValueError):
+                    storage.piece_view(8, 3)
+                del view
+            self.assertEqual(path.read_bytes(), b"ab\x00\x00xyz\x00\x00\x00")
+
+    def test_sparse_and_empty(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "sparse.bin"
+            with MmapStorage(str(path), 1 << 24, sparse=True):
+                pass
+            self.assertEqual(os.path.getsize(path), 1 << 24)
+            self.assertLess(os.stat(path).st_blocks * 512, 1 << 24)
+            with MmapStorage(str(Path(tmpdir) / "empty.bin"), 0) as storage:
+                self.assertEqual(storage.read(0, 0), b"")
+
+
+class SpanMapperTests(unittest.TestCase):
+    def test_splits_ranges_at_file_boundaries(self) -> None:
+        mapper = SpanMapper(FILES)
+        self.assertEqual(mapper.length, 10)
+        self.assertEqual(mapper.spans(0, 2), [FileSpan(0, 0, 2)])
+        self.assertEqual(
+            mapper.spans(2, 7),
+            [FileSpan(0, 2, 1), FileSpan(2, 0, 5), FileSpan(3, 0, 1)],
+        )
+        self.assertEqual(mapper.spans(8, 2), [FileSpan(3, 0, 2)])
+        with self.assertRaises(ValueError):
+            mapper.spans(9, 2)
+
+
+class MultiFileStorageTests(unittest.TestCase):
+    def test_writes_across_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir) / "dataset"
+            with MultiFileStorage(str(root), FILES) as storage:
+                storage.write(0, b"0123456789")
+                self.assertEqual(storage.read(2, 4), b"2345")
+                self.assertEqual(
+                    storage.paths(2, 2),
+                    [str(root / "a.bin"), str(root / "sub" / "b.bin")],
+                )
+            self.assertEqual((root / "a.bin").read_bytes(), b"012")
+            self.assertEqual((root / "empty.txt").read_bytes(), b"")
+            self.assertEqual((root / "sub" / "b.bin").read_bytes(), b"34567")
+            self.assertEqual((root / "c.bin").read_bytes(), b"89")
+
+
+if __name__ == "__main__":
+    unittest.main()
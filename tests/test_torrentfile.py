@@ -1,9 +1,11 @@
 import hashlib
+import os
 from pathlib import Path
 import tempfile
 import unittest
 
 import bencode
+from storage import FileEntry
 from torrentfile import TorrentFile, open_torrent
 
 
@@ -32,6 +34,84 @@ class TorrentFileTests(unittest.TestCase):
         self.assertEqual(torrent.name, "sample.bin")
         self.assertEqual(torrent.piece_hashes, [b"01234567890123456789"])
 
+    def test_announce_list_tiers(self) -> None:
+        info = {b"name": b"a", b"length": 1, b"piece length": 4, b"pieces": b"0" * 20}
+        data = {
+            b"announce": b"http://a",
+            b"announce-list": [[b"http://a", b"http://b"], [], [b"udp://c:80"]],
+            b"info": info,
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "tiers.torrent"
+            path.write_bytes(bencode.encode(data))
+            torrent = open_torrent(str(path))
+        self.assertEqual(
+            torrent.tracker_tiers(), [["http://a", "http://b"], ["udp://c:80"]]
+        )
+        torrent.announce_list = []
+        self.assertEqual(torrent.tracker_tiers(), [["http://a"]])
+
+    def test_info_hash_uses_raw_encoding(self) -> None:
+        # Keys out of order: re-encoding the info dict would sort them.
+        info = (
+            b"d4:name1:a6:lengthi8e12:piece lengthi4e"
+            b"6:pieces20:01234567890123456789e"
+        )
+        data = b"d8:announce14:http://tracker4:info" + info + b"e"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "unsorted.torrent"
+            path.write_bytes(data)
+            torrent = open_torrent(str(path))
+        self.assertEqual(torrent.info_hash, hashlib.sha1(info).digest())
+        self.assertEqual(torrent.length, 8)
+
+    def test_open_multi_file_torrent(self) -> None:
+        info = {
+            b"name": b"dataset",
+            b"piece length": 4,
+            b"pieces": b"0" * 60,
+            b"files": [
+                {b"length": 5, b"path": [b"train", b"a.bin"]},
+                {b"length": 0, b"path": [b"README"]},
+                {b"length": 6, b"path": [b"b.bin"]},
+            ],
+        }
+        data = {b"announce": b"http://tracker", b"info": info}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "dataset.torrent"
+            path.write_bytes(bencode.encode(data))
+            torrent = open_torrent(str(path))
+        self.assertTrue(torrent.is_multi_file)
+        self.assertEqual(torrent.length, 11)
+        self.assertEqual(
+            torrent.files,
+            [
+                FileEntry(os.path.join("train", "a.bin"), 5, 0),
+                FileEntry("README", 0, 5),
+                FileEntry("b.bin", 6, 5),
+            ],
+        )
+        self.assertEqual(
+            torrent.data_files("out"),
+            [os.path.join("out", entry.path) for entry in torrent.files],
+        )
+
+    def test_rejects_escaping_file_paths(self) -> None:
+        for components in ([b"..", b"etc"], [b"a/b"], []):
+            info = {
+                b"name": b"evil",
+                b"piece length": 4,
+                b"pieces": b"0" * 20,
+                b"files": [{b"length": 1, b"path": components}],
+            }
+            data = bencode.encode({b"announce": b"http://tracker", b"info": info})
+            with self.subTest(components=components):
+                with tempfile.TemporaryDirectory() as tmpdir:
+                    path = Path(tmpdir) / "evil.torrent"
+                    path.write_bytes(data)
+                    with self.assertRaises(ValueError):
+                        open_torrent(str(path))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,15 +1,68 @@
+import contextlib
+import gzip
 import http.server
 import socketserver
 import threading
 import unittest
+from typing import Iterator
 
-from tracker import build_tracker_url, request_peers
+from bencode import BencodeError
+from peers import Peer
+from tracker import (
+    DEFAULT_INTERVAL,
+    HTTPTrackerClient,
+    SwarmStats,
+    Transfer,
+    announce,
+    build_tracker_url,
+    parse_announce,
+    request_peers,
+    scrape,
+    scrape_url,
+)
 
 
 INFO_HASH = bytes([216, 247, 57, 206, 195, 40, 149, 108, 204, 91, 191, 31, 134, 217, 253, 207, 219, 168, 206, 182])
 PEER_ID = bytes(range(1, 21))
 
 
+@contextlib.contextmanager
+def serve(
+    payload: bytes, paths: list | None = None, keep_alive: bool = False
+) -> Iterator[str]:
+    """Run an HTTP tracker answering every request with *payload*, recording
+    the requested paths in *paths*. Bodies are gzipped for clients that
+    accept it."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" if keep_alive else "HTTP/1.0"
+
+        def do_GET(self):  # type: ignore[override]
+            if paths is not None:
+                paths.append(self.path)
+            body = payload
+            self.send_response(200)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(payload)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pragma: no cover - silence logs
+            return
+
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as server:
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.server_address
+        try:
+            yield f"http://{host}:{port}"
+        finally:
+            server.shutdown()
+
+
 class TrackerTests(unittest.TestCase):
     def test_build_tracker_url(self) -> None:
         url = build_tracker_url(
@@ -30,27 +83,89 @@ class TrackerTests(unittest.TestCase):
             + b"e"
         )
 
-        class Handler(http.server.BaseHTTPRequestHandler):
-            def do_GET(self):  # type: ignore[override]
-                self.send_response(200)
-                self.end_headers()
-                self.wfile.write(payload)
+        with serve(payload) as announce:
+            peers = request_peers(announce, INFO_HASH, PEER_ID, 6882, 351272960)
+        self.assertEqual(len(peers), 2)
+        self.assertEqual(peers[0].ip, "192.0.2.123")
+        self.assertEqual(peers[0].port, 6881)
+        self.assertEqual(peers[1].ip, "127.0.0.1")
+        self.assertEqual(peers[1].port, 6889)
 
-            def log_message(self, format, *args):  # pragma: no cover - silence logs
-                return
+    def test_announce_reports_transfer_and_intervals(self) -> None:
+        payload = b"d8:intervali900e12:min intervali60e5:peers0:e"
+        paths: list = []
+        with serve(payload, paths) as url:
+            res = announce(
+                url, INFO_HASH, PEER_ID, 6882, Transfer(10, 20, 30), event="started"
+            )
+        self.assertEqual((res.peers, res.interval, res.min_interval), ([], 900, 60))
+        for param in ("uploaded=10", "downloaded=20", "left=30", "event=started"):
+            self.assertIn(param, paths[0])
 
-        with socketserver.TCPServer(("127.0.0.1", 0), Handler) as server:
-            thread = threading.Thread(target=server.serve_forever, daemon=True)
-            thread.start()
-            host, port = server.server_address
-            announce = f"http://{host}:{port}"
-            peers = request_peers(announce, INFO_HASH, PEER_ID, 6882, 351272960)
-            self.assertEqual(len(peers), 2)
-            self.assertEqual(peers[0].ip, "192.0.2.123")
-            self.assertEqual(peers[0].port, 6881)
-            self.assertEqual(peers[1].ip, "127.0.0.1")
-            self.assertEqual(peers[1].port, 6889)
-            server.shutdown()
+    def test_parse_announce_defaults_and_failures(self) -> None:
+        res = parse_announce(b"d5:peers0:e")
+        self.assertEqual((res.interval, res.min_interval), (DEFAULT_INTERVAL, None))
+        with self.assertRaisesRegex(ValueError, "unregistered torrent"):
+            parse_announce(b"d14:failure reason20:unregistered torrente")
+
+    def test_parse_announce_ipv6_and_dictionary_peers(self) -> None:
+        res = parse_announce(
+            b"d5:peersld2:ip8:10.0.0.14:porti6881eed2:ip11:example.org4:porti1ee"
+            b"e6:peers618:" + bytes(15) + bytes([1, 0x1A, 0xE1]) + b"e"
+        )
+        self.assertEqual(res.peers, [Peer("10.0.0.1", 6881), Peer("::1", 6881)])
+        with self.assertRaisesRegex(ValueError, "missing peers"):
+            parse_announce(b"d8:intervali900ee")
+
+    def test_client_reuses_keep_alive_connections(self) -> None:
+        client = HTTPTrackerClient()
+        try:
+            with serve(b"hello", keep_alive=True) as url:
+                for _ in range(3):
+                    self.assertEqual(client.get(url + "/announce"), b"hello")
+            self.assertEqual(client.connections_opened, 1)
+        finally:
+            client.close()
+
+    def test_client_redials_dropped_connections(self) -> None:
+        client = HTTPTrackerClient()
+        try:
+            with serve(b"one", keep_alive=True) as url:
+                client.get(url)
+            # The pooled connection's server is gone.
+            with serve(b"two", keep_alive=True) as url:
+                self.assertEqual(client.get(url), b"two")
+        finally:
+            client.close()
+
+    def test_scrape_url(self) -> None:
+        self.assertEqual(
+            scrape_url("http://t.example/x/announce.php?passkey=1"),
+            "http://t.example/x/scrape.php",
+        )
+        with self.assertRaises(ValueError):
+            scrape_url("http://t.example/a")
+
+    def test_scrape_many_torrents(self) -> None:
+        other = bytes(20)
+        payload = (
+            b"d5:filesd20:" + INFO_HASH + b"d8:completei5e10:downloadedi50e"
+            b"10:incompletei10ee20:" + other + b"d8:completei1eeee"
+        )
+        paths: list = []
+        with serve(payload, paths) as url:
+            stats = scrape(url + "/announce", [INFO_HASH, other])
+        self.assertEqual(
+            stats, {INFO_HASH: SwarmStats(5, 50, 10), other: SwarmStats(1, 0, 0)}
+        )
+        self.assertTrue(paths[0].startswith("/scrape?"))
+        self.assertEqual(paths[0].count("info_hash="), 2)
+
+    def test_request_peers_rejects_deep_nesting(self) -> None:
+        payload = b"d5:peers" + b"l" * 50_000 + b"e" * 50_000 + b"e"
+        with serve(payload) as announce:
+            with self.assertRaises(BencodeError):
+                request_peers(announce, INFO_HASH, PEER_ID, 6882, 0)
 
 
 if __name__ == "__main__":
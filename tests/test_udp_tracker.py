@@ -0,0 +1,151 @@
+import contextlib
+import socket
+import socketserver
+import struct
+import threading
+import unittest
+from typing import Iterator
+
+from tracker import SwarmStats, Transfer, request_peers
+from udp_tracker import (
+    ANNOUNCE,
+    CONNECT,
+    ERROR,
+    PROTOCOL_ID,
+    SCRAPE,
+    UDPTrackerClient,
+)
+
+INFO_HASH = bytes(range(20))
+PEER_ID = bytes(range(20, 40))
+CONNECTION_ID = 0x1122334455667788
+PEERS = bytes([192, 0, 2, 1, 0x1A, 0xE1, 127, 0, 0, 1, 0x1A, 0xE9])
+
+
+class StandIn:
+    """Minimal BEP 15 tracker recording what it was sent."""
+
+    def __init__(self, drop: int = 0, error: str = "", peers: bytes = PEERS) -> None:
+        self.drop = drop
+        self.error = error
+        self.peers = peers
+        self.requests: list = []
+        self.announces: list = []
+
+    def reply(self, data: bytes) -> bytes | None:
+        conn_id, action, txid = struct.unpack_from(">QII", data)
+        self.requests.append(action)
+        if self.drop:
+            self.drop -= 1
+            return None
+        if action == CONNECT:
+            assert conn_id == PROTOCOL_ID
+            return struct.pack(">IIQ", CONNECT, txid, CONNECTION_ID)
+        assert conn_id == CONNECTION_ID
+        if self.error:
+            return struct.pack(">II", ERROR, txid) + self.error.encode()
+        if action == ANNOUNCE:
+            self.announces.append(struct.unpack_from(">20s20sQQQIIIiH", data, 16))
+            return struct.pack(">IIIII", ANNOUNCE, txid, 900, 3, 7) + self.peers
+        if action == SCRAPE:
+            body = b"".join(
+                struct.pack(">III", 10 + i, 20 + i, 30 + i)
+                for i in range((len(data) - 16) // 20)
+            )
+            return struct.pack(">II", SCRAPE, txid) + body
+        raise AssertionError(action)
+
+
+@contextlib.contextmanager
+def serve(tracker: StandIn, host: str = "127.0.0.1") -> Iterator[str]:
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self) -> None:
+            data, sock = self.request
+            reply = tracker.reply(data)
+            if reply is not None:
+                sock.sendto(reply, self.client_address)
+
+    class Server(socketserver.UDPServer):
+        address_family = socket.AF_INET6 if ":" in host else socket.AF_INET
+
+    with Server((host, 0), Handler) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        port = server.server_address[1]
+        netloc = f"[{host}]" if ":" in host else host
+        try:
+            yield f"udp://{netloc}:{port}/announce"
+        finally:
+            server.shutdown()
+
+
+class UDPTrackerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = UDPTrackerClient(base_timeout=0.05, max_retries=3)
+
+    def test_announce(self) -> None:
+        tracker = StandIn()
+        with serve(tracker) as url:
+            res = self.client.announce(
+                url, INFO_HASH, PEER_ID, 6881, Transfer(1, 2, 3), "started"
+            )
+        self.assertEqual(res.interval, 900)
+        self.assertEqual(
+            [str(peer) for peer in res.peers], ["192.0.2.1:6881", "127.0.0.1:6889"]
+        )
+        fields = tracker.announces[0]
+        self.assertEqual(fields[:2], (INFO_HASH, PEER_ID))
+        # downloaded, left, uploaded, event
+        self.assertEqual(fields[2:6], (2, 3, 1, 2))
+        self.assertEqual(fields[-1], 6881)
+
+    @unittest.skipUnless(socket.has_ipv6, "IPv6 unavailable")
+    def test_announce_over_ipv6_returns_ipv6_peers(self) -> None:
+        tracker = StandIn(peers=bytes(15) + bytes([1, 0x1A, 0xE1]))
+        with serve(tracker, "::1") as url:
+            res = self.client.announce(url, INFO_HASH, PEER_ID, 6881, Transfer())
+        self.assertEqual([str(peer) for peer in res.peers], ["[::1]:6881"])
+
+    def test_reuses_connection_id(self) -> None:
+        tracker = StandIn()
+        with serve(tracker) as url:
+            for _ in range(2):
+                self.client.announce(url, INFO_HASH, PEER_ID, 6881, Transfer())
+            self.client.scrape(url, [INFO_HASH])
+        self.assertEqual(tracker.requests, [CONNECT, ANNOUNCE, ANNOUNCE, SCRAPE])
+
+    def test_retransmits_lost_datagrams(self) -> None:
+        tracker = StandIn(drop=2)
+        with serve(tracker) as url:
+            res = self.client.announce(url, INFO_HASH, PEER_ID, 6881, Transfer())
+        self.assertEqual(len(res.peers), 2)
+        self.assertEqual(tracker.requests, [CONNECT, CONNECT, CONNECT, ANNOUNCE])
+
+    def test_gives_up_after_retries(self) -> None:
+        tracker = StandIn(drop=100)
+        with serve(tracker) as url:
+            with self.assertRaises(TimeoutError):
+                self.client.announce(url, INFO_HASH, PEER_ID, 6881, Transfer())
+        self.assertEqual(len(tracker.requests), 4)
+
+    def test_tracker_error(self) -> None:
+        with serve(StandIn(error="unregistered torrent")) as url:
+            with self.assertRaisesRegex(ValueError, "unregistered torrent"):
+                self.client.announce(url, INFO_HASH, PEER_ID, 6881, Transfer())
+
+    def test_scrape(self) -> None:
+        other = bytes(20)
+        with serve(StandIn()) as url:
+            stats = self.client.scrape(url, [INFO_HASH, other])
+        self.assertEqual(
+            stats, {INFO_HASH: SwarmStats(10, 20, 30), other: SwarmStats(11, 21, 31)}
+        )
+
+    def test_request_peers_dispatches_on_scheme(self) -> None:
+        with serve(StandIn()) as url:
+            peers = request_peers(url, INFO_HASH, PEER_ID, 6881, 0)
+        self.assertEqual(len(peers), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
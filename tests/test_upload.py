@@ -0,0 +1,57 @@
+from pathlib import Path
+import socket
+import tempfile
+import unittest
+
+from bitfield import BitField
+from message import MessageID, read_message
+from storage import FileEntry, FileStorage, MultiFileStorage
+from upload import MAX_REQUEST_LENGTH, PieceServer, piece_header, send_block
+
+
+DATA = bytes(range(256)) * 40
+
+
+class PieceServerTests(unittest.TestCase):
+    def _server(self, storage, have: bytes = b"\xff") -> PieceServer:
+        return PieceServer(storage, 4096, len(DATA), BitField(bytearray(have)))
+
+    def test_validates_requests(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with FileStorage(str(Path(tmpdir) / "out.bin"), len(DATA)) as storage:
+                server = self._server(storage, have=b"\x80")
+                self.assertEqual(server.block_ranges(0, 16, 32), [(storage.fd, 16, 32)])
+                self.assertEqual(server.uploaded, 32)
+                # Piece 1 is not verified yet.
+                self.assertIsNone(server.block_ranges(1, 0, 16))
+                for index, begin, length in (
+                    (0, 0, 0),
+                    (0, 0, MAX_REQUEST_LENGTH + 1),
+                    (3, 0, 16),
+                    (2, 1536, 1024),
+                    (0, -1, 16),
+                ):
+                    with self.subTest(request=(index, begin, length)):
+                        with self.assertRaises(ValueError):
+                            server.block_ranges(index, begin, length)
+
+    def test_send_block_spans_files(self) -> None:
+        files = [FileEntry("a.bin", 5000, 0), FileEntry("b.bin", len(DATA) - 5000, 5000)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with MultiFileStorage(tmpdir, files) as storage:
+                storage.write(0, DATA)
+                server = self._server(storage)
+                ranges = server.block_ranges(1, 512, 1024)
+                self.assertEqual(len(ranges), 2)
+                left, right = socket.socketpair()
+                with left, right:
+                    left.settimeout(5)
+                    send_block(left, 1, 512, ranges)
+                    msg = read_message(right)
+        self.assertEqual(msg.msg_id, MessageID.PIECE)
+        self.assertEqual(bytes(msg.payload[:8]), piece_header(1, 512, 0)[5:])
+        self.assertEqual(bytes(msg.payload[8:]), DATA[4096 + 512 : 4096 + 1536])
+
+
+if __name__ == "__main__":
+    unittest.main()
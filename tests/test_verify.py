@@ -0,0 +1,74 @@
+import hashlib
+from pathlib import Path
+import tempfile
+import unittest
+
+from storage import FileEntry
+from verify import verify_file, verify_files
+
+
+PIECE_LENGTH = 4
+DATA = b"abcdefghij"
+HASHES = [
+    hashlib.sha1(DATA[i : i + PIECE_LENGTH]).digest()
+    for i in range(0, len(DATA), PIECE_LENGTH)
+]
+
+
+class VerifyTests(unittest.TestCase):
+    def _verify(self, contents: bytes, workers: int = 2):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "data.bin"
+            path.write_bytes(contents)
+            return verify_file(str(path), HASHES, PIECE_LENGTH, len(DATA), workers)
+
+    def test_all_pieces_good(self) -> None:
+        report = self._verify(DATA)
+        self.assertTrue(report.ok)
+        self.assertEqual(report.total_pieces, 3)
+        self.assertEqual(report.bytes_checked, len(DATA))
+
+    def test_reports_corrupt_piece(self) -> None:
+        report = self._verify(b"abcdXfghij")
+        self.assertEqual(report.bad_pieces, [1])
+
+    def test_truncated_file(self) -> None:
+        report = self._verify(DATA[:6])
+        self.assertEqual(report.bad_pieces, [1, 2])
+        self.assertEqual(report.bytes_checked, PIECE_LENGTH)
+
+    def test_empty_file(self) -> None:
+        report = self._verify(b"")
+        self.assertEqual(report.bad_pieces, [0, 1, 2])
+        self.assertEqual(report.bytes_checked, 0)
+
+    def test_missing_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for path in (Path(tmpdir) / "missing.bin", Path(tmpdir)):
+                report = verify_file(str(path), HASHES, PIECE_LENGTH, len(DATA))
+                self.assertFalse(report.ok)
+                self.assertEqual(report.missing_files, [str(path)])
+                self.assertEqual(report.bytes_checked, 0)
+
+    def test_multi_file_pieces_span_files(self) -> None:
+        files = [
+            FileEntry("a.bin", 3, 0),
+            FileEntry("empty", 0, 3),
+            FileEntry("sub/b.bin", 7, 3),
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / "sub").mkdir()
+            (root / "a.bin").write_bytes(DATA[:3])
+            (root / "sub" / "b.bin").write_bytes(DATA[3:])
+            report = verify_files(str(root), files, HASHES, PIECE_LENGTH, workers=2)
+            self.assertTrue(report.ok)
+            self.assertEqual(report.bytes_checked, len(DATA))
+
+            (root / "a.bin").unlink()
+            report = verify_files(str(root), files, HASHES, PIECE_LENGTH, workers=2)
+            self.assertEqual(report.bad_pieces, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
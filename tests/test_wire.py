@@ -0,0 +1,118 @@
+import io
+import struct
+import unittest
+
+from wire import MAX_FRAME_LENGTH, FrameReader, read_exact
+
+
+class ChunkedSocket:
+    """Socket stand-in that returns at most *chunk* bytes per call."""
+
+    def __init__(self, data: bytes, chunk: int) -> None:
+        self.data = memoryview(data)
+        self.chunk = chunk
+        self.calls = 0
+
+    def recv_into(self, buffer: memoryview) -> int:
+        self.calls += 1
+        size = min(len(buffer), self.chunk, len(self.data))
+        buffer[:size] = self.data[:size]
+        self.data = self.data[size:]
+        return size
+
+
+class FakeSink:
+    def block_target(self, index: int, begin: int, length: int):
+        return memoryview(bytearray(length))
+
+    def block_received(self, index: int, begin: int, length: int) -> None:
+        pass
+
+
+def frame(body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + body
+
+
+class ReadExactTests(unittest.TestCase):
+    def test_read_exact(self) -> None:
+        self.assertEqual(read_exact(io.BytesIO(b"abcdef"), 4), b"abcd")
+
+    def test_read_exact_eof(self) -> None:
+        with self.assertRaises(EOFError):
+            read_exact(io.BytesIO(b"ab"), 4)
+
+
+class FrameReaderTests(unittest.TestCase):
+    def test_many_frames_per_recv(self) -> None:
+        data = b"".join(frame(bytes([4, i])) for i in range(10)) + b"\x00" * 4
+        sock = ChunkedSocket(data, chunk=1 << 20)
+        reader = FrameReader(sock)
+        for i in range(10):
+            self.assertEqual(bytes(reader.read_frame()), bytes([4, i]))
+        self.assertIsNone(reader.read_frame())
+        self.assertEqual(sock.calls, 1)
+
+    def test_frames_split_across_recvs_and_compaction(self) -> None:
+        bodies = [bytes([7]) + bytes([i]) * 50 for i in range(20)]
+        sock = ChunkedSocket(b"".join(frame(b) for b in bodies), chunk=33)
+        reader = FrameReader(sock, size=128)
+        for body in bodies:
+            self.assertEqual(bytes(reader.read_frame()), body)
+        self.assertGreater(reader.bytes_copied, 0)
+
+    def test_oversized_frame(self) -> None:
+        body = bytes(range(256)) * 4
+        sock = ChunkedSocket(frame(body) + frame(b"\x01"), chunk=100)
+        reader = FrameReader(sock, size=64)
+        self.assertEqual(bytes(reader.read_frame()), body)
+        self.assertEqual(bytes(reader.read_frame()), b"\x01")
+
+    def test_piece_lands_in_sink(self) -> None:
+        class Sink:
+            def __init__(self) -> None:
+                self.buf = bytearray(10000)
+                self.received: list[tuple[int, int, int]] = []
+
+            def block_target(self, index: int, begin: int, length: int):
+                if index != 3:
+                    return None
+                return memoryview(self.buf)[begin : begin + length]
+
+            def block_received(self, index: int, begin: int, length: int) -> None:
+                self.received.append((index, begin, length))
+
+        block = bytes(range(256)) * 20
+        piece = frame(bytes([7]) + struct.pack(">II", 3, 100) + block)
+        other = frame(bytes([7]) + struct.pack(">II", 4, 0) + b"xy")
+        have = frame(b"\x04\x00\x00\x00\x01")
+        # Direct recv_into, a small buffered remainder, and fully buffered.
+        for chunk, size in ((16, 64), (2000, 2048), (1 << 20, 1 << 16)):
+            sink = Sink()
+            reader = FrameReader(ChunkedSocket(piece + other + have, chunk), size=size)
+            self.assertIsNone(reader.read_frame(sink))
+            self.assertEqual(sink.received, [(3, 100, len(block))])
+            self.assertEqual(bytes(sink.buf[100 : 100 + len(block)]), block)
+            # Blocks the sink declines come back as ordinary frames.
+            self.assertEqual(bytes(reader.read_frame(sink)), other[4:])
+            self.assertEqual(bytes(reader.read_frame(sink)), have[4:])
+
+    def test_rejects_oversized_length_prefix(self) -> None:
+        header = struct.pack(">I", MAX_FRAME_LENGTH + 1)
+        reader = FrameReader(ChunkedSocket(header + b"\x05", chunk=1 << 20))
+        with self.assertRaisesRegex(ValueError, "exceeds"):
+            reader.read_frame()
+        # PIECE headers are checked before the sink is asked for a target.
+        reader = FrameReader(ChunkedSocket(header + bytes([7]) + bytes(8), chunk=64))
+        with self.assertRaisesRegex(ValueError, "exceeds"):
+            reader.read_frame(FakeSink())
+        reader = FrameReader(ChunkedSocket(frame(bytes(100)), chunk=40), max_frame=100)
+        self.assertEqual(len(reader.read_frame()), 100)
+
+    def test_eof(self) -> None:
+        reader = FrameReader(ChunkedSocket(b"\x00\x00", chunk=10))
+        with self.assertRaises(EOFError):
+            reader.read_frame()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,15 +3,23 @@
 from __future__ import annotations
 
 import hashlib
+import logging
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List
 
+import async_p2p
 import p2p
-from bencode import decode, encode
-from tracker import request_peers
+from announcer import Announcer
+from bencode import LazyDict, decode_lazy
+from resume import ResumeJournal
+from storage import FileEntry, FileStorage, MmapStorage, MultiFileStorage
+from tracker import Transfer
+from verify import VerifyReport, verify_file, verify_files
 
 PORT = 6881
+ENGINES = ("threads", "asyncio")
+STORAGE_BACKENDS = ("pwrite", "mmap")
 
 
 @dataclass
@@ -22,12 +30,72 @@ class TorrentFile:
     piece_length: int
     length: int
     name: str
+    # Layout of a multi-file torrent; empty for single-file torrents, whose
+    # payload is written to the output path itself.
+    files: List[FileEntry] = field(default_factory=list)
+    # BEP 12 tracker tiers; empty when the torrent only has `announce`.
+    announce_list: List[List[str]] = field(default_factory=list)
 
-    def download_to_file(self, path: str) -> None:
+    @property
+    def is_multi_file(self) -> bool:
+        return bool(self.files)
+
+    def tracker_tiers(self) -> List[List[str]]:
+        return self.announce_list or [[self.announce]]
+
+    def bytes_left(self, journal: ResumeJournal) -> int:
+        """Size of the pieces *journal* does not have yet."""
+        left = 0
+        for index in range(len(self.piece_hashes)):
+            if not journal.has_piece(index):
+                begin = index * self.piece_length
+                left += min(self.piece_length, self.length - begin)
+        return left
+
+    def data_files(self, path: str) -> List[str]:
+        """Paths the payload occupies when downloaded to *path*."""
+        if not self.files:
+            return [path]
+        return [os.path.join(path, entry.path) for entry in self.files]
+
+    def open_storage(
+        self, path: str, backend: str = "pwrite", sparse: bool = False
+    ) -> FileStorage | MmapStorage | MultiFileStorage:
+        if backend not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend {backend!r}")
+        if self.files:
+            if backend == "mmap":
+                logging.info("Multi-file torrents are written with pwrite, not mmap")
+            return MultiFileStorage(path, self.files, sparse)
+        if backend == "mmap":
+            return MmapStorage(path, self.length, sparse)
+        return FileStorage(path, self.length, sparse)
+
+    def download_to_file(
+        self,
+        path: str,
+        engine: str = "threads",
+        storage: str = "pwrite",
+        sparse: bool = False,
+        seed: bool = False,
+    ) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown download engine {engine!r}")
         peer_id = os.urandom(20)
-        peers = request_peers(
-            self.announce, self.info_hash, peer_id, PORT, self.length
+        # Load before opening the storage: preallocation touches the file's
+        # mtime, which the journal uses to detect outside modification.
+        # A mapped file is dirtied by every block, so there only the size
+        # can be trusted.
+        in_place = storage == "mmap" and not self.files
+        journal = ResumeJournal.load(
+            path,
+            self.info_hash,
+            len(self.piece_hashes),
+            self.data_files(path),
+            check_mtime=not in_place,
         )
+        announcer = Announcer(self.tracker_tiers(), self.info_hash, peer_id, PORT)
+        peers = announcer.announce_all(Transfer(left=self.bytes_left(journal)))
         torrent = p2p.Torrent(
             peers=peers,
             peer_id=peer_id,
@@ -36,29 +104,87 @@ class TorrentFile:
             piece_length=self.piece_length,
             length=self.length,
             name=self.name,
+            seed=seed,
+            port=PORT,
+            announcer=announcer,
+        )
+        with self.open_storage(path, storage, sparse) as output, journal:
+            journal.save()
+            if engine == "asyncio":
+                async_p2p.download(torrent, output, journal)
+            else:
+                torrent.download(output, journal)
+        journal.remove()
+
+    def verify(self, path: str, workers: int | None = None) -> VerifyReport:
+        if self.files:
+            return verify_files(
+                path, self.files, self.piece_hashes, self.piece_length, workers
+            )
+        return verify_file(
+            path, self.piece_hashes, self.piece_length, self.length, workers
         )
-        data = torrent.download()
-        with open(path, "wb") as handle:
-            handle.write(data)
 
 
-def _split_piece_hashes(pieces_blob: bytes) -> List[bytes]:
+def _split_piece_hashes(pieces_blob: bytes | memoryview) -> List[bytes]:
     hash_len = 20
     if len(pieces_blob) % hash_len != 0:
         raise ValueError("Received malformed pieces")
     return [
-        pieces_blob[i : i + hash_len] for i in range(0, len(pieces_blob), hash_len)
+        bytes(pieces_blob[i : i + hash_len]) for i in range(0, len(pieces_blob), hash_len)
     ]
 
 
-def _to_torrent_file(payload: dict) -> TorrentFile:
-    announce = payload[b"announce"].decode("utf-8")
+def _file_path(components: List[bytes | memoryview]) -> str:
+    """Join the path components of a file entry, refusing to escape the root."""
+    parts = [str(part, "utf-8") for part in components]
+    if not parts:
+        raise ValueError("File entry has an empty path")
+    for part in parts:
+        if part in ("", ".", "..") or "/" in part or "\\" in part or "\0" in part:
+            raise ValueError(f"Unsafe path component {part!r} in torrent")
+    return os.path.join(*parts)
+
+
+def _parse_files(entries: List[dict]) -> List[FileEntry]:
+    files: List[FileEntry] = []
+    offset = 0
+    for entry in entries:
+        length = int(entry[b"length"])
+        if length < 0:
+            raise ValueError("File entry has a negative length")
+        files.append(FileEntry(_file_path(entry[b"path"]), length, offset))
+        offset += length
+    return files
+
+
+def _parse_announce_list(tiers: List[List[bytes | memoryview]]) -> List[List[str]]:
+    parsed = []
+    for tier in tiers:
+        urls = [str(url, "utf-8") for url in tier]
+        if urls:
+            parsed.append(urls)
+    return parsed
+
+
+def _to_torrent_file(payload: LazyDict) -> TorrentFile:
+    announce = str(payload[b"announce"], "utf-8")
     info = payload[b"info"]
-    info_hash = hashlib.sha1(encode(info)).digest()
+    # Hash the info dict exactly as encoded in the file rather than a
+    # re-encoding, which would differ for torrents with unsorted keys.
+    info_hash = hashlib.sha1(payload.raw(b"info")).digest()
     pieces = _split_piece_hashes(info[b"pieces"])
     piece_length = int(info[b"piece length"])
-    length = int(info[b"length"])
-    name = info[b"name"].decode("utf-8")
+    name = str(info[b"name"], "utf-8")
+    files: List[FileEntry] = []
+    if b"files" in info:
+        files = _parse_files(info[b"files"])
+        length = sum(entry.length for entry in files)
+    else:
+        length = int(info[b"length"])
+    announce_list: List[List[str]] = []
+    if b"announce-list" in payload:
+        announce_list = _parse_announce_list(payload[b"announce-list"])
     return TorrentFile(
         announce=announce,
         info_hash=info_hash,
@@ -66,14 +192,16 @@ def _to_torrent_file(payload: dict) -> TorrentFile:
         piece_length=piece_length,
         length=length,
         name=name,
+        files=files,
+        announce_list=announce_list,
     )
 
 
 def open_torrent(path: str) -> TorrentFile:
     with open(path, "rb") as handle:
         data = handle.read()
-    payload = decode(data)
-    if not isinstance(payload, dict):
+    payload = decode_lazy(data)
+    if not isinstance(payload, LazyDict):
         raise ValueError("Invalid torrent file")
     return _to_torrent_file(payload)
 
@@ -1,17 +1,62 @@
-"""HTTP tracker requests."""
+"""Tracker requests: HTTP here, UDP in :mod:`udp_tracker`."""
 
 from __future__ import annotations
 
+import http.client
+import threading
 import urllib.parse
-import urllib.request
-from typing import List
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from bencode import decode
-from peers import Peer, parse_compact_peers
+from peers import Peer, parse_compact_peers, parse_compact_peers6, parse_peer_dicts
+
+# Responses are untrusted: cap their size and nesting before decoding.
+MAX_RESPONSE_SIZE = 4 * 1024 * 1024
+MAX_RESPONSE_DEPTH = 8
+# Used when a tracker does not say how often to announce.
+DEFAULT_INTERVAL = 1800
+TIMEOUT = 15
+# Idle keep-alive connections kept per tracker host.
+MAX_IDLE_PER_HOST = 4
+
+
+@dataclass
+class Transfer:
+    """Totals reported to the tracker, in bytes, for this session."""
+
+    uploaded: int = 0
+    downloaded: int = 0
+    left: int = 0
+
+
+@dataclass
+class SwarmStats:
+    """Scrape counters for one torrent."""
+
+    seeders: int
+    completed: int
+    leechers: int
+
+
+@dataclass
+class AnnounceResponse:
+    peers: List[Peer]
+    # Seconds until the next regular announce, and the floor for early ones.
+    interval: int = DEFAULT_INTERVAL
+    min_interval: Optional[int] = None
 
 
 def build_tracker_url(
-    announce: str, info_hash: bytes, peer_id: bytes, port: int, left: int
+    announce: str,
+    info_hash: bytes,
+    peer_id: bytes,
+    port: int,
+    left: int,
+    uploaded: int = 0,
+    downloaded: int = 0,
+    event: str = "",
 ) -> str:
     parsed = urllib.parse.urlparse(announce)
     base = parsed._replace(query="")
@@ -19,25 +64,231 @@ def build_tracker_url(
         ("info_hash", urllib.parse.quote_from_bytes(info_hash)),
         ("peer_id", urllib.parse.quote_from_bytes(peer_id)),
         ("port", str(port)),
-        ("uploaded", "0"),
-        ("downloaded", "0"),
+        ("uploaded", str(uploaded)),
+        ("downloaded", str(downloaded)),
         ("compact", "1"),
         ("left", str(left)),
     ]
+    if event:
+        params.append(("event", event))
     query = "&".join(f"{key}={value}" for key, value in params)
     return urllib.parse.urlunparse(base._replace(query=query))
 
 
+def _interval(payload: dict, key: bytes) -> Optional[int]:
+    value = payload.get(key)
+    if isinstance(value, int) and value > 0:
+        return value
+    return None
+
+
+def parse_announce(data: bytes) -> AnnounceResponse:
+    payload = decode(data, max_depth=MAX_RESPONSE_DEPTH, max_size=MAX_RESPONSE_SIZE)
+    if not isinstance(payload, dict):
+        raise ValueError("Tracker response is not a dictionary")
+    failure = payload.get(b"failure reason")
+    if isinstance(failure, bytes):
+        reason = failure.decode("utf-8", "replace")
+        raise ValueError(f"Tracker refused announce: {reason}")
+    peers_value = payload.get(b"peers")
+    peers6_value = payload.get(b"peers6")
+    if peers_value is None and peers6_value is None:
+        raise ValueError("Tracker response missing peers")
+    peers: List[Peer] = []
+    if isinstance(peers_value, bytes):
+        peers.extend(parse_compact_peers(peers_value))
+    elif isinstance(peers_value, list):
+        peers.extend(parse_peer_dicts(peers_value))
+    elif peers_value is not None:
+        raise ValueError("Tracker response has malformed peers")
+    if isinstance(peers6_value, bytes):
+        peers.extend(parse_compact_peers6(peers6_value))
+    return AnnounceResponse(
+        peers=peers,
+        interval=_interval(payload, b"interval") or DEFAULT_INTERVAL,
+        min_interval=_interval(payload, b"min interval"),
+    )
+
+
+def scrape_url(announce_url: str) -> str:
+    """The scrape URL for an HTTP announce URL, by the usual convention of
+    replacing ``announce`` at the start of the last path segment."""
+    parsed = urllib.parse.urlparse(announce_url)
+    head, _, last = parsed.path.rpartition("/")
+    if not last.startswith("announce"):
+        raise ValueError(f"Tracker {announce_url!r} does not support scrape")
+    path = f"{head}/scrape{last[len('announce'):]}"
+    return urllib.parse.urlunparse(parsed._replace(path=path, query=""))
+
+
+def _int(value: object) -> int:
+    return value if isinstance(value, int) else 0
+
+
+def parse_scrape(data: bytes) -> Dict[bytes, SwarmStats]:
+    payload = decode(data, max_depth=MAX_RESPONSE_DEPTH, max_size=MAX_RESPONSE_SIZE)
+    if not isinstance(payload, dict):
+        raise ValueError("Scrape response is not a dictionary")
+    files = payload.get(b"files")
+    if not isinstance(files, dict):
+        raise ValueError("Scrape response missing files")
+    stats: Dict[bytes, SwarmStats] = {}
+    for info_hash, entry in files.items():
+        if isinstance(entry, dict):
+            stats[info_hash] = SwarmStats(
+                seeders=_int(entry.get(b"complete")),
+                completed=_int(entry.get(b"downloaded")),
+                leechers=_int(entry.get(b"incomplete")),
+            )
+    return stats
+
+
+def _gunzip(data: bytes) -> bytes:
+    # Bounded, so a tiny gzip bomb cannot expand past the response cap;
+    # decode() rejects anything that reaches it.
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return inflater.decompress(data, MAX_RESPONSE_SIZE + 1)
+
+
+Origin = Tuple[str, str, int]
+
+
+class HTTPTrackerClient:
+    """HTTP tracker requests over pooled keep-alive connections.
+
+    Idle connections are kept per scheme/host/port, so periodic announces
+    and scrapes to the same tracker skip TCP and TLS setup. Responses may
+    be gzip-compressed. Thread-safe: each request checks a connection out
+    of the pool and returns it only if the response left it reusable.
+    """
+
+    def __init__(self, max_idle: int = MAX_IDLE_PER_HOST) -> None:
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: Dict[Origin, List[http.client.HTTPConnection]] = {}
+        self.connections_opened = 0
+
+    def _checkout(
+        self, origin: Origin, timeout: float
+    ) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                conn = idle.pop()
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.connections_opened += 1
+        scheme, host, port = origin
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def _checkin(self, origin: Origin, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def get(self, url: str, timeout: Optional[float] = None) -> bytes:
+        """GET *url* and return its (decompressed) body."""
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError(f"Not an HTTP tracker URL: {url!r}")
+        default_port = 443 if parsed.scheme == "https" else 80
+        origin = (parsed.scheme, parsed.hostname, parsed.port or default_port)
+        target = urllib.parse.urlunsplit(("", "", parsed.path or "/", parsed.query, ""))
+        while True:
+            conn, reused = self._checkout(origin, timeout or TIMEOUT)
+            try:
+                conn.request("GET", target, headers={"Accept-Encoding": "gzip"})
+                response = conn.getresponse()
+                data = response.read(MAX_RESPONSE_SIZE + 1)
+            except (OSError, http.client.HTTPException) as exc:
+                conn.close()
+                if reused:
+                    # The tracker may have dropped the idle connection.
+                    continue
+                if isinstance(exc, OSError):
+                    raise
+                raise OSError(f"HTTP error from tracker: {exc}") from exc
+            if response.isclosed() and not response.will_close:
+                self._checkin(origin, conn)
+            else:
+                conn.close()
+            if response.status != 200:
+                raise ValueError(f"Tracker returned HTTP {response.status}")
+            if response.getheader("Content-Encoding", "").lower() == "gzip":
+                data = _gunzip(data)
+            return data
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+# Shared so that every announce and scrape reuses the same connections.
+_http = HTTPTrackerClient()
+
+
+def announce(
+    url: str,
+    info_hash: bytes,
+    peer_id: bytes,
+    port: int,
+    transfer: Transfer,
+    event: str = "",
+    timeout: Optional[float] = None,
+) -> AnnounceResponse:
+    """Announce to the HTTP or UDP tracker at *url*.
+
+    *timeout* bounds the whole request; by default HTTP trackers get
+    :data:`TIMEOUT` seconds and UDP ones the BEP 15 retransmit schedule.
+    """
+    if url.startswith("udp://"):
+        # udp_tracker builds on this module's types.
+        import udp_tracker
+
+        return udp_tracker.announce(
+            url, info_hash, peer_id, port, transfer, event, timeout
+        )
+    url = build_tracker_url(
+        url,
+        info_hash,
+        peer_id,
+        port,
+        transfer.left,
+        transfer.uploaded,
+        transfer.downloaded,
+        event,
+    )
+    return parse_announce(_http.get(url, timeout))
+
+
+def scrape(
+    url: str, info_hashes: Sequence[bytes], timeout: Optional[float] = None
+) -> Dict[bytes, SwarmStats]:
+    """Fetch swarm counters for many torrents from the tracker announcing at
+    *url*, in as few requests as the protocol allows."""
+    if url.startswith("udp://"):
+        import udp_tracker
+
+        return udp_tracker.scrape(url, info_hashes, timeout)
+    query = "&".join(
+        f"info_hash={urllib.parse.quote_from_bytes(info_hash)}"
+        for info_hash in info_hashes
+    )
+    return parse_scrape(_http.get(f"{scrape_url(url)}?{query}", timeout))
+
+
 def request_peers(
-    announce: str, info_hash: bytes, peer_id: bytes, port: int, left: int
+    announce_url: str, info_hash: bytes, peer_id: bytes, port: int, left: int
 ) -> List[Peer]:
-    url = build_tracker_url(announce, info_hash, peer_id, port, left)
-    with urllib.request.urlopen(url, timeout=15) as response:
-        data = response.read()
-    payload = decode(data)
-    peers_value = payload.get(b"peers")
-    if not isinstance(peers_value, (bytes, bytearray)):
-        raise ValueError("Tracker response missing compact peers")
-    return parse_compact_peers(bytes(peers_value))
+    return announce(announce_url, info_hash, peer_id, port, Transfer(left=left)).peers
 
 
@@ -0,0 +1,204 @@
+"""UDP tracker protocol (BEP 15)."""
+
+from __future__ import annotations
+
+import random
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from peers import parse_compact_peers, parse_compact_peers6
+from tracker import DEFAULT_INTERVAL, AnnounceResponse, SwarmStats, Transfer
+
+PROTOCOL_ID = 0x41727101980
+CONNECT, ANNOUNCE, SCRAPE, ERROR = range(4)
+EVENTS = {"": 0, "completed": 1, "started": 2, "stopped": 3}
+# A connection ID may be reused for this many seconds after it was issued.
+CONNECTION_TTL = 60.0
+# Requests are retransmitted after BASE_TIMEOUT * 2 ** n seconds, n <= MAX_RETRIES.
+BASE_TIMEOUT = 15.0
+MAX_RETRIES = 8
+# Info hashes per scrape request; more would not fit a 1500-byte datagram.
+MAX_SCRAPE_HASHES = 74
+MAX_DATAGRAM = 65536
+
+_HEADER = struct.Struct(">QII")
+_RESPONSE = struct.Struct(">II")
+_ANNOUNCE = struct.Struct(">20s20sQQQIIIiH")
+_ANNOUNCE_RESPONSE = struct.Struct(">III")
+_SCRAPE_ENTRY = struct.Struct(">III")
+
+Address = Tuple[str, int]
+
+
+def _address(url: str) -> Address:
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme != "udp" or not parsed.hostname or parsed.port is None:
+        raise ValueError(f"Not a UDP tracker URL: {url!r}")
+    return parsed.hostname, parsed.port
+
+
+class UDPTrackerClient:
+    """Connect/announce/scrape over UDP with connection-ID caching.
+
+    Each tracker's connection ID is kept for :data:`CONNECTION_TTL` seconds
+    so back-to-back announces and scrapes skip the connect round trip.
+    Lost datagrams are retransmitted on the BEP 15 schedule of
+    ``base_timeout * 2 ** n`` seconds, after which :class:`TimeoutError`
+    is raised. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        base_timeout: float = BASE_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.base_timeout = base_timeout
+        self.max_retries = max_retries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connections: Dict[Address, Tuple[int, float]] = {}
+
+    def _cached(self, address: Address) -> Optional[int]:
+        with self._lock:
+            entry = self._connections.get(address)
+            if entry is None or self._clock() - entry[1] >= CONNECTION_TTL:
+                return None
+            return entry[0]
+
+    def _exchange(
+        self, sock: socket.socket, conn_id: int, action: int, body: bytes, wait: float
+    ) -> bytes:
+        """Send one request and return its response body, ignoring stray
+        datagrams; raises socket.timeout after *wait* seconds."""
+        txid = random.getrandbits(32)
+        sock.send(_HEADER.pack(conn_id, action, txid) + body)
+        deadline = self._clock() + wait
+        while True:
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                raise socket.timeout("timed out")
+            sock.settimeout(remaining)
+            data = sock.recv(MAX_DATAGRAM)
+            if len(data) < _RESPONSE.size:
+                continue
+            got_action, got_txid = _RESPONSE.unpack_from(data)
+            if got_txid != txid:
+                continue
+            if got_action == ERROR:
+                message = data[_RESPONSE.size :].decode("utf-8", "replace")
+                raise ValueError(f"Tracker error: {message}")
+            if got_action != action:
+                raise ValueError(f"Expected action {action}, got {got_action}")
+            return data[_RESPONSE.size :]
+
+    def _request(
+        self, url: str, action: int, body: bytes, timeout: Optional[float]
+    ) -> Tuple[bytes, int]:
+        """Return the response body and the address family it came over."""
+        address = _address(url)
+        family, kind, proto, _, sockaddr = socket.getaddrinfo(
+            *address, type=socket.SOCK_DGRAM
+        )[0]
+        deadline = None if timeout is None else self._clock() + timeout
+        with socket.socket(family, kind, proto) as sock:
+            sock.connect(sockaddr)
+            for attempt in range(self.max_retries + 1):
+                wait = self.base_timeout * 2**attempt
+                if deadline is not None:
+                    wait = min(wait, deadline - self._clock())
+                    if wait <= 0:
+                        break
+                try:
+                    conn_id = self._cached(address)
+                    if conn_id is None:
+                        reply = self._exchange(sock, PROTOCOL_ID, CONNECT, b"", wait)
+                        if len(reply) < 8:
+                            raise ValueError("Short connect response")
+                        (conn_id,) = struct.unpack_from(">Q", reply)
+                        with self._lock:
+                            self._connections[address] = (conn_id, self._clock())
+                    reply = self._exchange(sock, conn_id, action, body, wait)
+                    return reply, family
+                except socket.timeout:
+                    continue
+        raise TimeoutError(f"No response from UDP tracker {url}")
+
+    def announce(
+        self,
+        url: str,
+        info_hash: bytes,
+        peer_id: bytes,
+        port: int,
+        transfer: Transfer,
+        event: str = "",
+        timeout: Optional[float] = None,
+    ) -> AnnounceResponse:
+        body = _ANNOUNCE.pack(
+            info_hash,
+            peer_id,
+            transfer.downloaded,
+            transfer.left,
+            transfer.uploaded,
+            EVENTS[event],
+            0,  # Let the tracker use the source address.
+            random.getrandbits(32),
+            -1,  # Default number of peers.
+            port,
+        )
+        reply, family = self._request(url, ANNOUNCE, body, timeout)
+        if len(reply) < _ANNOUNCE_RESPONSE.size:
+            raise ValueError("Short announce response")
+        interval, _, _ = _ANNOUNCE_RESPONSE.unpack_from(reply)
+        # Peers come in the address family of the tracker connection.
+        peers_bin = reply[_ANNOUNCE_RESPONSE.size :]
+        if family == socket.AF_INET6:
+            peers = parse_compact_peers6(peers_bin)
+        else:
+            peers = parse_compact_peers(peers_bin)
+        return AnnounceResponse(
+            peers=peers,
+            interval=interval or DEFAULT_INTERVAL,
+        )
+
+    def scrape(
+        self, url: str, info_hashes: Sequence[bytes], timeout: Optional[float] = None
+    ) -> Dict[bytes, SwarmStats]:
+        stats: Dict[bytes, SwarmStats] = {}
+        for start in range(0, len(info_hashes), MAX_SCRAPE_HASHES):
+            batch = list(info_hashes[start : start + MAX_SCRAPE_HASHES])
+            reply, _ = self._request(url, SCRAPE, b"".join(batch), timeout)
+            if len(reply) < _SCRAPE_ENTRY.size * len(batch):
+                raise ValueError("Short scrape response")
+            for index, info_hash in enumerate(batch):
+                seeders, completed, leechers = _SCRAPE_ENTRY.unpack_from(
+                    reply, index * _SCRAPE_ENTRY.size
+                )
+                stats[info_hash] = SwarmStats(seeders, completed, leechers)
+        return stats
+
+
+# Shared so that connection IDs are reused across announces.
+_client = UDPTrackerClient()
+
+
+def announce(
+    url: str,
+    info_hash: bytes,
+    peer_id: bytes,
+    port: int,
+    transfer: Transfer,
+    event: str = "",
+    timeout: Optional[float] = None,
+) -> AnnounceResponse:
+    return _client.announce(url, info_hash, peer_id, port, transfer, event, timeout)
+
+
+def scrape(
+    url: str, info_hashes: Sequence[bytes], timeout: Optional[float] = None
+) -> Dict[bytes, SwarmStats]:
+    return _client.scrape(url, info_hashes, timeout)
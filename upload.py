@@ -0,0 +1,115 @@
+"""Serving verified pieces to peers that request them."""
+
+from __future__ import annotations
+
+import os
+import select
+import socket
+import struct
+from typing import List, Optional
+
+from bitfield import BitField
+from message import MessageID
+from storage import FileRange, Storage
+
+# Requests above this are refused; 16 KiB is standard and no mainstream
+# client asks for more than 128 KiB.
+MAX_REQUEST_LENGTH = 128 * 1024
+# Length prefix, ID, index and begin: everything of a PIECE frame but the block.
+PIECE_HEADER = struct.Struct(">IBII")
+
+
+def piece_header(index: int, begin: int, length: int) -> bytes:
+    size = PIECE_HEADER.size - 4 + length
+    return PIECE_HEADER.pack(size, MessageID.PIECE, index, begin)
+
+
+def _wait_writable(sock: socket.socket) -> None:
+    _, writable, _ = select.select([], [sock], [], sock.gettimeout())
+    if not writable:
+        raise socket.timeout("Timed out sending block")
+
+
+def sendfile(sock: socket.socket, fd: int, offset: int, count: int) -> None:
+    """Send *count* bytes of *fd* from *offset* without copying them to user space.
+
+    Sockets with a timeout are non-blocking underneath, so a full send
+    buffer is waited out with select. Falls back to pread + sendall where
+    ``os.sendfile`` is unavailable.
+    """
+    if not hasattr(os, "sendfile"):  # pragma: no cover - non-POSIX platforms
+        while count:
+            chunk = os.pread(fd, min(count, 1 << 20), offset)
+            if not chunk:
+                raise EOFError("File ended before the requested range")
+            sock.sendall(chunk)
+            offset += len(chunk)
+            count -= len(chunk)
+        return
+    while count:
+        try:
+            sent = os.sendfile(sock.fileno(), fd, offset, count)
+        except BlockingIOError:
+            _wait_writable(sock)
+            continue
+        if sent == 0:
+            raise EOFError("File ended before the requested range")
+        offset += sent
+        count -= sent
+
+
+def send_block(
+    sock: socket.socket, index: int, begin: int, ranges: List[FileRange]
+) -> None:
+    """Write a PIECE frame: the 13-byte header, then the block via sendfile."""
+    length = sum(count for _, _, count in ranges)
+    sock.sendall(piece_header(index, begin, length))
+    for fd, offset, count in ranges:
+        sendfile(sock, fd, offset, count)
+
+
+class PieceServer:
+    """Answers block requests from the verified pieces in *storage*.
+
+    *have* is the bitfield of pieces written and verified so far; it is
+    shared with the download so pieces become servable as they complete.
+    """
+
+    def __init__(
+        self, storage: Storage, piece_length: int, length: int, have: BitField
+    ) -> None:
+        self.storage = storage
+        self.piece_length = piece_length
+        self.length = length
+        self.have = have
+        self.uploaded = 0
+
+    @property
+    def piece_count(self) -> int:
+        return -(-self.length // self.piece_length)
+
+    def has_any(self) -> bool:
+        return any(self.have.data)
+
+    def add_piece(self, index: int) -> None:
+        self.have.set_piece(index)
+
+    def block_ranges(
+        self, index: int, begin: int, length: int
+    ) -> Optional[List[FileRange]]:
+        """Where to read a requested block from, or None if we lack the piece.
+
+        Raises ValueError for requests no well-behaved peer would send.
+        """
+        if not 0 < length <= MAX_REQUEST_LENGTH:
+            raise ValueError(f"Refusing request of {length} bytes")
+        if not 0 <= index < self.piece_count:
+            raise ValueError(f"Request for unknown piece {index}")
+        piece_start = index * self.piece_length
+        piece_size = min(self.piece_length, self.length - piece_start)
+        if begin < 0 or begin + length > piece_size:
+            raise ValueError(f"Request {begin}+{length} outside piece {index}")
+        if not self.have.has_piece(index):
+            return None
+        self.uploaded += length
+        return self.storage.file_ranges(piece_start + begin, length)
@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 
-from typing import BinaryIO, Protocol
+import struct
+from typing import BinaryIO, Optional, Protocol
 
 
 class Reader(Protocol):
@@ -26,3 +27,159 @@ def read_exact(stream: BinaryIO | Reader, size: int) -> bytes:
     return bytes(chunks)
 
 
+
+class FrameSocket(Protocol):
+    def recv_into(self, buffer: memoryview) -> int:  # pragma: no cover - protocol
+        ...
+
+
+class BlockSink(Protocol):
+    """Receiver that lets PIECE blocks land directly in their final buffer."""
+
+    def block_target(
+        self, index: int, begin: int, length: int
+    ) -> Optional[memoryview]:  # pragma: no cover - protocol
+        ...
+
+    def block_received(
+        self, index: int, begin: int, length: int
+    ) -> None:  # pragma: no cover - protocol
+        ...
+
+
+# Large enough to hold several 16 KiB PIECE frames, so one recv_into can
+# pick up many messages at once.
+RECV_BUFFER_SIZE = 256 * 1024
+# Block remainders at least this large are received straight into the
+# destination; smaller ones are cheaper to pick up with a buffer refill.
+DIRECT_RECV_MIN = 4096
+# Longest frame accepted by default: a PIECE carrying a 16 KiB block. The
+# length prefix is untrusted, so anything longer is refused before any
+# buffer is sized from it.
+MAX_FRAME_LENGTH = 9 + 16 * 1024
+# message.MessageID.PIECE; wire sits below the message layer.
+PIECE_ID = 7
+_LENGTH = struct.Struct(">I")
+_FRAME_HEADER = struct.Struct(">IB")
+# length, ID, piece index, block offset
+_PIECE_HEADER = struct.Struct(">IBII")
+
+
+class FrameReader:
+    """Per-connection receive buffer for length-prefixed peer wire frames.
+
+    Data is read with ``recv_into`` straight into a fixed buffer, and frames
+    are handed out as memoryviews into it, so a single syscall can yield
+    many frames without copying them. A returned view is only valid until
+    the next call to :meth:`read_frame`. Frames longer than *max_frame*
+    raise ValueError.
+    """
+
+    def __init__(
+        self,
+        sock: FrameSocket,
+        size: int = RECV_BUFFER_SIZE,
+        max_frame: int = MAX_FRAME_LENGTH,
+    ) -> None:
+        self.sock = sock
+        self.max_frame = max_frame
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self.syscalls = 0
+        self.bytes_copied = 0
+
+    @property
+    def buffered(self) -> int:
+        return self._end - self._start
+
+    def _recv(self, view: memoryview) -> int:
+        received = self.sock.recv_into(view)
+        self.syscalls += 1
+        if not received:
+            raise EOFError("Unexpected EOF while reading from stream")
+        return received
+
+    def _check_length(self, length: int) -> None:
+        if length > self.max_frame:
+            raise ValueError(
+                f"Frame of {length} bytes exceeds the {self.max_frame}-byte limit"
+            )
+
+    def _fill(self, needed: int) -> None:
+        """Buffer at least *needed* bytes past the read cursor."""
+        if self._start + needed > len(self._buf):
+            # Slide the partial frame to the front to make room.
+            pending = self._end - self._start
+            self._view[:pending] = self._view[self._start : self._end]
+            self.bytes_copied += pending
+            self._start, self._end = 0, pending
+        while self._end - self._start < needed:
+            self._end += self._recv(self._view[self._end :])
+
+    def _consume(self, size: int) -> memoryview:
+        view = self._view[self._start : self._start + size]
+        self._start += size
+        if self._start == self._end:
+            self._start = self._end = 0
+        return view
+
+    def read_exact(self, size: int) -> memoryview:
+        """Return the next *size* bytes; oversized reads get their own buffer."""
+        if size <= len(self._buf):
+            self._fill(size)
+            return self._consume(size)
+        out = bytearray(size)
+        view = memoryview(out)
+        have = self.buffered
+        view[:have] = self._consume(have)
+        self.bytes_copied += have
+        while have < size:
+            have += self._recv(view[have:])
+        return view
+
+    def _read_into(self, dest: memoryview) -> None:
+        have = min(self.buffered, len(dest))
+        dest[:have] = self._consume(have)
+        self.bytes_copied += have
+        remaining = len(dest) - have
+        if remaining >= DIRECT_RECV_MIN:
+            while have < len(dest):
+                have += self._recv(dest[have:])
+        elif remaining:
+            dest[have:] = self.read_exact(remaining)
+            self.bytes_copied += remaining
+
+    def _read_block(self, sink: BlockSink) -> bool:
+        """Land a PIECE block in *sink*'s buffer; False if it is not one."""
+        self._fill(_FRAME_HEADER.size)
+        length, msg_id = _FRAME_HEADER.unpack_from(self._buf, self._start)
+        if msg_id != PIECE_ID or length <= 9:
+            return False
+        self._check_length(length)
+        self._fill(_PIECE_HEADER.size)
+        _, _, index, begin = _PIECE_HEADER.unpack_from(self._buf, self._start)
+        size = length - 9
+        dest = sink.block_target(index, begin, size)
+        if dest is None:
+            return False
+        self._consume(_PIECE_HEADER.size)
+        self._read_into(dest)
+        sink.block_received(index, begin, size)
+        return True
+
+    def read_frame(self, sink: Optional[BlockSink] = None) -> Optional[memoryview]:
+        """Return the next frame body (ID byte and payload), or None for keep-alive.
+
+        With a *sink*, PIECE blocks it accepts are written straight into the
+        view it supplies, reported through ``block_received`` and returned
+        as None, so no intermediate payload is built for them.
+        """
+        if sink is not None and self._read_block(sink):
+            return None
+        (length,) = _LENGTH.unpack(self.read_exact(4))
+        if length == 0:
+            return None
+        self._check_length(length)
+        return self.read_exact(length)